@@ -0,0 +1,188 @@
+import random
+import re
+import sys
+import threading
+import time
+import types
+
+from napalm.base.base import NetworkDriver
+
+# Name the driver is registered under, napalm.get_network_driver(DRIVER)
+DRIVER = "benchios"
+
+
+class Profile:
+    """
+    How the simulated routers behave.
+
+    Latencies are in seconds and get +/- jitter applied per call. A share of
+    calls (failure_rate) raise a timeout the scheduler treats as transient,
+    and a share of routers (drift) change their running config between
+    reads so diffs have something to find.
+    """
+
+    def __init__(self, open=0.5, cli=0.05, cli_per_command=0.005, get_config=0.15,
+                 get_facts=0.1, commit=0.5, config_lines=300, failure_rate=0.0,
+                 drift=0.1, jitter=0.2, seed=None):
+        self.open = open
+        self.cli = cli
+        self.cli_per_command = cli_per_command
+        self.get_config = get_config
+        self.get_facts = get_facts
+        self.commit = commit
+        self.config_lines = config_lines
+        self.failure_rate = failure_rate
+        self.drift = drift
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self, seconds):
+        with self._lock:
+            factor = self.random.uniform(1 - self.jitter, 1 + self.jitter)
+            fail = self.random.random() < self.failure_rate
+        time.sleep(seconds * factor)
+        if fail:
+            raise FakeTimeout("Timed-out reading channel, data not available")
+
+    def chance(self, p):
+        with self._lock:
+            return self.random.random() < p
+
+
+class FakeTimeout(TimeoutError):
+    pass
+
+
+class Fleet:
+    """
+    Simulated device state keyed by management IP: hostname, running config,
+    and the OSPF neighbors and routes each router will report.
+    """
+
+    def __init__(self, profile=None):
+        self.profile = profile or Profile()
+        self.routers = {}
+        self.commits = 0
+        self._lock = threading.Lock()
+
+    def add(self, host, hostname, neighbors=(), routes=()):
+        lines = [f"hostname {hostname}", "!"]
+        for i in range(self.profile.config_lines):
+            lines.append(f"interface Vlan{i}" if i % 3 == 0 else f" description bench line {i}")
+        self.routers[host] = {
+            'hostname': hostname,
+            'config': "\n".join(lines) + "\n",
+            'neighbors': list(neighbors),
+            'routes': list(routes),
+            'version': 0,
+        }
+
+    def running_config(self, host):
+        router = self.routers[host]
+        with self._lock:
+            if self.profile.chance(self.profile.drift):
+                router['version'] += 1
+            version = router['version']
+        return router['config'] + f"! revision {version}\n" if version else router['config']
+
+    def commit(self, host, candidate):
+        with self._lock:
+            self.routers[host]['config'] += candidate
+            self.commits += 1
+
+
+# Fleet the registered driver talks to, set by install()
+fleet = Fleet()
+
+PING_RE = re.compile(r"^ping (\S+) repeat (\d+)")
+
+
+class BenchIOSDriver(NetworkDriver):
+    """A NAPALM driver that answers from the simulated fleet after a delay"""
+
+    def __init__(self, hostname, username, password, timeout=60, optional_args=None):
+        self.hostname = hostname
+        self.alive = False
+        self.candidate = None
+
+    def open(self):
+        fleet.profile.delay(fleet.profile.open)
+        if self.hostname not in fleet.routers:
+            raise ConnectionRefusedError(f"No such device {self.hostname}")
+        self.alive = True
+
+    def close(self):
+        self.alive = False
+
+    def is_alive(self):
+        return {'is_alive': self.alive}
+
+    def get_config(self, retrieve="all", full=False, sanitized=False, format="text"):
+        fleet.profile.delay(fleet.profile.get_config)
+        return {'running': fleet.running_config(self.hostname), 'startup': '', 'candidate': ''}
+
+    def get_facts(self):
+        fleet.profile.delay(fleet.profile.get_facts)
+        return {'hostname': fleet.routers[self.hostname]['hostname'], 'uptime': 3600}
+
+    def get_interfaces_counters(self):
+        fleet.profile.delay(fleet.profile.cli)
+        return {}
+
+    def cli(self, commands, encoding="text"):
+        fleet.profile.delay(fleet.profile.cli + fleet.profile.cli_per_command * len(commands))
+        router = fleet.routers[self.hostname]
+        output = {}
+
+        for command in commands:
+            ping = PING_RE.match(command)
+            if command == "show ip ospf neighbor":
+                output[command] = "Neighbor ID     Pri   State           Dead Time   Address         Interface\n" + "".join(
+                    f"{nbr:<15} 1   FULL/DR         00:00:33    10.0.0.2        FastEthernet0/0\n"
+                    for nbr in router['neighbors'])
+            elif command == "show ip route ospf":
+                output[command] = "".join(
+                    f"O IA     {route}/32 [110/2] via 10.0.0.2, 00:00:10, FastEthernet0/0\n"
+                    for route in router['routes'])
+            elif ping:
+                count = int(ping.group(2))
+                output[command] = (
+                    f"Sending {count}, 100-byte ICMP Echos to {ping.group(1)}, timeout is 2 seconds:\n"
+                    f"{'!' * count}\n"
+                    f"Success rate is 100 percent ({count}/{count}), round-trip min/avg/max = 1/2/4 ms\n"
+                )
+            else:
+                output[command] = ""
+
+        return output
+
+    def load_merge_candidate(self, filename=None, config=None):
+        self.candidate = config
+
+    def compare_config(self):
+        running = fleet.routers[self.hostname]['config'].splitlines()
+        return "\n".join(f"+{line}" for line in (self.candidate or "").splitlines()
+                         if line not in running)
+
+    def discard_config(self):
+        self.candidate = None
+
+    def commit_config(self, message="", revert_in=None):
+        fleet.profile.delay(fleet.profile.commit)
+        fleet.commit(self.hostname, self.candidate)
+        self.candidate = None
+
+    def rollback(self):
+        fleet.profile.delay(fleet.profile.commit)
+
+
+def install(new_fleet):
+    """Register the fake driver with NAPALM and point it at a fleet"""
+    global fleet
+    fleet = new_fleet
+
+    module = types.ModuleType(f"napalm_{DRIVER}")
+    module.BenchIOSDriver = BenchIOSDriver
+    sys.modules[module.__name__] = module
+    return DRIVER
@@ -0,0 +1,303 @@
+"""
+Benchmark the device operations against a simulated fleet.
+
+    python -m bench.run --sizes 4,100,1000
+
+Every router is a BenchIOSDriver that sleeps for configurable latencies,
+so the numbers show how the code scales with fleet size, not how fast any
+real device is. Nothing in the repo is patched outside the run.
+"""
+import argparse
+import contextlib
+import io
+import ipaddress
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from prettytable import PrettyTable
+
+import diffconfig
+import getconfig
+import ospfconfig
+from bench import fakeios
+from tools import connectivity, scheduler, sessionpool, snapshotstore
+
+SIZES = (4, 100, 1000)
+
+OPERATIONS = ('get_config', 'diff_config', 'configure_ospf', 'configure_ospf_two_phase',
+              'ping_loopbacks_from_r1', 'verify_reachability')
+
+# Operations that push OSPF, each run against a fleet that has none yet
+CONFIGURE_OPERATIONS = ('configure_ospf', 'configure_ospf_two_phase')
+
+# Progress statuses that mark a device's result as ready
+DONE_STATUSES = {'done', 'configured', 'unchanged', 'failed', 'aborted', 'rolled_back'}
+
+
+def build_configs(count):
+    """Router configs for a ring of routers, each linked to the next by a /30"""
+    subnets = ipaddress.ip_network("172.16.0.0/12").subnets(new_prefix=30)
+    links = [next(subnets) for _ in range(count if count > 2 else 1)]
+
+    configs = []
+    for i in range(count):
+        if count > 2:
+            # Link i to the next router, link i-1 back to the previous one
+            ports = [(links[i], 1), (links[i - 1], 2)]
+        else:
+            ports = [(links[0], i + 1)]
+
+        router_id = str(ipaddress.ip_address("10.255.0.1") + i)
+        configs.append({
+            'router': f"R{i + 1}",
+            'hostname': f"R{i + 1}",
+            'ip_address': str(ipaddress.ip_address("10.100.0.1") + i),
+            'username': 'bench',
+            'password': 'bench',
+            'ospf_process_id': 1,
+            'router_id': router_id,
+            'loopback_ip': router_id,
+            'loopback_mask': '255.255.255.255',
+            'interfaces': [{
+                'name': f"FastEthernet{port}/0",
+                'ip': str(net[side]),
+                'mask': str(net.netmask),
+                'area': 0,
+            } for port, (net, side) in enumerate(ports)],
+        })
+    return configs
+
+
+def build_fleet(configs, profile):
+    """A fleet whose routers report the adjacencies and routes the configs imply"""
+    fleet = fakeios.Fleet(profile)
+    neighbors = ospfconfig.expected_neighbors(configs)
+    loopbacks = [config['loopback_ip'] for config in configs]
+
+    for config in configs:
+        fleet.add(
+            config['ip_address'],
+            config['hostname'],
+            neighbors=sorted(neighbors[config['router']]),
+            routes=[ip for ip in loopbacks if ip != config['loopback_ip']],
+        )
+    return fleet
+
+
+@contextlib.contextmanager
+def simulated(root, fleet):
+    """
+    Point the session pool at the fake driver, give the run its own
+    scheduler, snapshot store and database, treat every device as reachable
+    and run from a scratch directory. Everything is put back afterwards.
+    """
+    saved = (sessionpool.pool, scheduler.scheduler, snapshotstore.store,
+             connectivity.check_reachability, connectivity.sweep, ospfconfig.DB_PATH,
+             ospfconfig._db, os.getcwd())
+
+    sessionpool.pool = sessionpool.SessionPool(driver=fakeios.install(fleet))
+    scheduler.scheduler = scheduler.DeviceScheduler()
+    snapshotstore.store = snapshotstore.SnapshotStore(Path(root) / "configs")
+
+    def check_reachability(hosts, on_result=None):
+        for host in hosts:
+            if on_result is not None:
+                on_result(host, True)
+        return {host: True for host in hosts}
+
+    def sweep(targets, on_result=None, **kwargs):
+        results = {}
+        for host in connectivity.expand_hosts(targets):
+            results[host] = {'reachable': True, 'rtt_ms': 1.0, 'loss': 0.0, 'error': None}
+            if on_result is not None:
+                on_result(host, results[host])
+        return results
+
+    connectivity.check_reachability = check_reachability
+    connectivity.sweep = sweep
+    ospfconfig.DB_PATH = str(Path(root) / "ospf_config.db")
+    ospfconfig._db = threading.local()
+    os.chdir(root)
+    ospfconfig.init_db()
+
+    try:
+        yield
+    finally:
+        sessionpool.pool.close_all()
+        (sessionpool.pool, scheduler.scheduler, snapshotstore.store,
+         connectivity.check_reachability, connectivity.sweep, ospfconfig.DB_PATH,
+         ospfconfig._db, cwd) = saved
+        os.chdir(cwd)
+
+
+class Recorder:
+    """Progress callback that notes when each device's result became ready"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.ready = {}
+        self.failed = set()
+
+    def __call__(self, device=None, status=None, **detail):
+        if status in DONE_STATUSES and device not in self.ready:
+            self.ready[device] = time.perf_counter() - self.start
+        if status == 'failed' or ' error: ' in str(detail.get('result', '')):
+            self.failed.add(device)
+
+
+def quantile(values, q):
+    if len(values) < 2:
+        return values[0] if values else None
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+
+def run_operation(name, configs):
+    recorder = Recorder()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        if name == 'get_config':
+            getconfig.get_config(progress=recorder)
+            count = len(configs)
+        elif name == 'diff_config':
+            diffconfig.diff_config(progress=recorder)
+            count = len(configs)
+        elif name == 'configure_ospf':
+            ospfconfig.configure_ospf(configs, progress=recorder)
+            count = len(configs)
+        elif name == 'configure_ospf_two_phase':
+            ospfconfig.configure_ospf(configs, progress=recorder, two_phase=True)
+            count = len(configs)
+        elif name in ('ping_loopbacks_from_r1', 'verify_reachability'):
+            result = getattr(ospfconfig, name)(configs)
+            count = len(result['results'])
+            recorder.failed = {row['router'] for row in result['results'] if row['status'] != 'Success'}
+        else:
+            raise ValueError(f"Unknown operation {name}")
+
+    wall = time.perf_counter() - recorder.start
+    latencies = sorted(recorder.ready.values()) or [wall]
+
+    return {
+        'operation': name,
+        'routers': len(configs),
+        'count': count,
+        'wall': wall,
+        'throughput': count / wall if wall else None,
+        'p50': quantile(latencies, 50),
+        'p99': quantile(latencies, 99),
+        'errors': len(recorder.failed),
+    }
+
+
+def run_size(size, operations, profile, cold=False):
+    configs = build_configs(size)
+    fleet = build_fleet(configs, profile)
+
+    with tempfile.TemporaryDirectory() as root:
+        (Path(root) / "config").mkdir()
+        with open(Path(root) / "config" / "sshInfo.json", "w") as f:
+            json.dump({'routers': [{
+                'device_type': 'cisco_ios',
+                'host': config['ip_address'],
+                'username': config['username'],
+                'password': config['password'],
+            } for config in configs]}, f)
+
+        results = []
+        with simulated(root, fleet):
+            # diff_config needs a baseline snapshot to compare against
+            if 'diff_config' in operations and 'get_config' not in operations:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    getconfig.get_config()
+
+            for name in operations:
+                if name in CONFIGURE_OPERATIONS:
+                    # Otherwise a second configure run finds nothing left to push
+                    fakeios.install(build_fleet(configs, profile))
+                    with ospfconfig.get_db() as conn:
+                        conn.execute('DELETE FROM applied_ospf')
+                if cold:
+                    sessionpool.pool.close_all()
+                    sessionpool.pool = sessionpool.SessionPool(driver=fakeios.DRIVER)
+                results.append(run_operation(name, configs))
+                print(f"  {name} x{size}: {results[-1]['wall']:.2f}s", file=sys.stderr)
+
+    return results
+
+
+def print_results(results):
+    table = PrettyTable()
+    table.field_names = ["Operation", "Routers", "Wall (s)", "Throughput (/s)",
+                         "p50 (s)", "p99 (s)", "Errors"]
+    for r in results:
+        table.add_row([
+            r['operation'],
+            r['routers'],
+            f"{r['wall']:.2f}",
+            f"{r['throughput']:.1f}",
+            f"{r['p50']:.3f}",
+            f"{r['p99']:.3f}",
+            r['errors'],
+        ])
+    print(table)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark device operations against a simulated fleet")
+    parser.add_argument('--sizes', default=",".join(map(str, SIZES)),
+                        help="comma separated fleet sizes")
+    parser.add_argument('--ops', default=",".join(OPERATIONS),
+                        help=f"comma separated operations out of {', '.join(OPERATIONS)}")
+    parser.add_argument('--cold', action='store_true',
+                        help="start every operation with an empty session pool")
+    parser.add_argument('--json', metavar='FILE', help="also write the results as JSON")
+
+    latency = parser.add_argument_group("simulated device")
+    latency.add_argument('--open', type=float, default=0.5, help="session open latency (s)")
+    latency.add_argument('--cli', type=float, default=0.05, help="latency per cli() call (s)")
+    latency.add_argument('--cli-per-command', type=float, default=0.005,
+                         help="extra cli() latency per command (s)")
+    latency.add_argument('--get-config', type=float, default=0.15, help="get_config() latency (s)")
+    latency.add_argument('--get-facts', type=float, default=0.1, help="get_facts() latency (s)")
+    latency.add_argument('--commit', type=float, default=0.5, help="commit_config() latency (s)")
+    latency.add_argument('--config-lines', type=int, default=300, help="running config size")
+    latency.add_argument('--failure-rate', type=float, default=0.0,
+                         help="share of device calls that time out")
+    latency.add_argument('--drift', type=float, default=0.1,
+                         help="share of config reads that return a changed config")
+    latency.add_argument('--seed', type=int, default=None)
+
+    args = parser.parse_args(argv)
+    sizes = [int(size) for size in args.sizes.split(",")]
+    operations = [op for op in args.ops.split(",") if op]
+    for op in operations:
+        if op not in OPERATIONS:
+            parser.error(f"unknown operation {op}")
+
+    profile = fakeios.Profile(
+        open=args.open, cli=args.cli, cli_per_command=args.cli_per_command,
+        get_config=args.get_config, get_facts=args.get_facts, commit=args.commit,
+        config_lines=args.config_lines, failure_rate=args.failure_rate,
+        drift=args.drift, seed=args.seed,
+    )
+
+    results = []
+    for size in sizes:
+        results.extend(run_size(size, operations, profile, cold=args.cold))
+
+    print_results(results)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,10 +1,6 @@
-import napalm
-from tools import sshInfo, validateIP, connectivity
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime, timezone
-import difflib
-import os
-from pathlib import Path
+from concurrent.futures import as_completed
+
+from tools import sshInfo, validateIP, connectivity, sessionpool, snapshotstore, configdiff, jobs, scheduler, metrics, factscache
 
 def compare_configs(device):
     host = device['host']
@@ -14,50 +10,74 @@ def compare_configs(device):
         return host, "invalid ip"
 
     # Reachability check
-    reachable = connectivity.check_reachability([host])
+    with metrics.span('reachability', host):
+        reachable = connectivity.check_reachability([host])
     if not reachable[host]:
         return host, "unreachable"
 
-    try:
-        driver = napalm.get_network_driver('ios')
-        with driver(
-            hostname=host,
-            username=device['username'],
-            password=device['password'],
-        ) as dev:
+    # Device errors propagate so the scheduler can retry transient ones
+    with sessionpool.session(host, device['username'], device['password']) as dev:
+        with metrics.span('get_config', host):
             running_cfg = dev.get_config()['running']
-            hostname = dev.get_facts()['hostname']
-
-            dir_path = Path("configs")
-            latest_file = max(dir_path.glob(f"{hostname}_*.txt"), key=os.path.getmtime)
-
-            stored_cfg = latest_file.read_text()
-
-            # Convert to line lists
-            running_lines = running_cfg.splitlines(keepends=True)
-            stored_lines = stored_cfg.splitlines(keepends=True)
-
-            diff = difflib.unified_diff(
-                stored_lines,
-                running_lines,
-                fromfile=f"{latest_file}",
-                tofile=f"{hostname}_running"
-            )
-
-            diff_text = "".join(diff)
-
-        return hostname, diff_text if diff_text else "no changes"
-
-    except Exception as e:
-        return f"{host} error: {e}"
-
-def diff_config():
+        # Read from the config just fetched, or the facts cache, not get_facts()
+        with metrics.span('hostname', host):
+            hostname = factscache.cache.hostname(host, dev, running_cfg)
+
+    latest = snapshotstore.store.latest(hostname)
+    if latest is None:
+        return hostname, f"{host} error: no saved config for {hostname}"
+
+    ts, digest = latest
+
+    # Unchanged configs hash the same, no need to load the baseline
+    if configdiff.digest(running_cfg) == digest:
+        return hostname, "no changes"
+
+    with metrics.span('snapshot_read', host):
+        baseline = snapshotstore.store.get(digest)
+
+    with metrics.span('diff', host):
+        diff_text = configdiff.diff_configs(
+            baseline,
+            running_cfg,
+            fromfile=f"{hostname}_{ts}",
+            tofile=f"{hostname}_running",
+            old_digest=digest
+        )
+
+    return hostname, diff_text if diff_text else "no changes"
+
+def iter_diffs(progress=None, priority=scheduler.INTERACTIVE):
+    """
+    Diff every device in the inventory against its latest snapshot, yielding
+    (hostname, diff) as each one finishes.
+    """
     hosts = sshInfo.load_ssh_info("config/sshInfo.json")
 
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        results = executor.map(compare_configs, hosts)
+    def run(device):
+        jobs.report(progress, device['host'], 'running')
+        return compare_configs(device)
+
+    futures = scheduler.submit_all(lambda d: d['host'], run, hosts, priority=priority)
+    pending = dict(zip(futures, hosts))
 
-    return results
+    try:
+        for future in as_completed(pending):
+            device = pending[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = device['host'], f"{device['host']} error: {e}"
+            jobs.report(progress, device['host'], 'done', result=result)
+            yield result
+    finally:
+        # The consumer went away (e.g. the browser closed the page), drop queued work
+        for future in pending:
+            future.cancel()
+
+def diff_config(progress=None, priority=scheduler.INTERACTIVE):
+    """Diff every device, returns (hostname, diff) pairs in completion order"""
+    return list(iter_diffs(progress, priority))
 
 
 if __name__ == "__main__":
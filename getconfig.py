@@ -1,7 +1,6 @@
-import napalm
-from tools import sshInfo, validateIP, connectivity
-from concurrent.futures import ThreadPoolExecutor
-from datetime import datetime, timezone
+from concurrent.futures import as_completed
+
+from tools import sshInfo, validateIP, connectivity, sessionpool, snapshotstore, jobs, scheduler, metrics, factscache
 
 def process_config(device):
     host = device['host']
@@ -11,39 +10,56 @@ def process_config(device):
         return host, "invalid ip"
 
     # Reachability check
-    reachable = connectivity.check_reachability([host])
+    with metrics.span('reachability', host):
+        reachable = connectivity.check_reachability([host])
     if not reachable[host]:
         return host, "unreachable"
 
-    try:
-        driver = napalm.get_network_driver('ios')
-        with driver(
-            hostname=host,
-            username=device['username'],
-            password=device['password'],
-        ) as dev:
+    # Device errors propagate so the scheduler can retry transient ones
+    with sessionpool.session(host, device['username'], device['password']) as dev:
+        with metrics.span('get_config', host):
             cfg = dev.get_config()
+        # Read from the config just fetched, or the facts cache, not get_facts()
+        with metrics.span('hostname', host):
+            hostname = factscache.cache.hostname(host, dev, cfg['running'])
 
-            # Save in a file based on hostname and ISO8601 format
-            hostname = dev.get_facts()['hostname']
-            ts = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
-            fname = f"{hostname}_{ts}.txt"
+    # Snapshot by hostname and ISO8601 timestamp, content stored once per hash
+    with metrics.span('snapshot_write', host):
+        ts, digest = snapshotstore.store.put(hostname, cfg["running"])
 
-            with open("configs/" + fname, "w") as f:
-                f.write(cfg["running"])
+    return f"{hostname}_{ts} ({digest[:12]})"
 
-        return fname
+def iter_configs(progress=None, priority=scheduler.INTERACTIVE):
+    """
+    Snapshot every device in the inventory, yielding (host, result) as each
+    one finishes, so a slow device doesn't hold up the others' results.
+    """
+    hosts = sshInfo.load_ssh_info("config/sshInfo.json")
 
-    except Exception as e:
-        return f"{host} error: {e}"
+    def run(device):
+        jobs.report(progress, device['host'], 'running')
+        return process_config(device)
 
-def get_config():
-    hosts = sshInfo.load_ssh_info("config/sshInfo.json")
+    futures = scheduler.submit_all(lambda d: d['host'], run, hosts, priority=priority)
+    pending = dict(zip(futures, hosts))
 
-    with ThreadPoolExecutor(max_workers=10) as executor:
-        files = executor.map(process_config, hosts)
+    try:
+        for future in as_completed(pending):
+            device = pending[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = f"{device['host']} error: {e}"
+            jobs.report(progress, device['host'], 'done', result=result)
+            yield device['host'], result
+    finally:
+        # The consumer went away (e.g. the browser closed the page), drop queued work
+        for future in pending:
+            future.cancel()
 
-    return list(files)
+def get_config(progress=None, priority=scheduler.INTERACTIVE):
+    """Snapshot every device, returns the results in completion order"""
+    return [result for _, result in iter_configs(progress, priority)]
 
 
 if __name__ == "__main__":
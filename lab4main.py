@@ -1,5 +1,5 @@
-from flask import Flask, render_template, redirect, url_for, request
-from tools import sshInfo, validateIP, connectivity
+from flask import Flask, Response, render_template, redirect, url_for, request, jsonify, g
+from tools import sshInfo, validateIP, connectivity, jobs, metrics, scheduler, sessionpool, topology
 from concurrent.futures import ThreadPoolExecutor
 import threading
 import time
@@ -7,20 +7,117 @@ import getconfig
 import ospfconfig
 import diffconfig
 import migration
+import ospfbulk
+import codecs
 
 device_status = {}
 
+def run_apply_ospf_config(progress=None, two_phase=False):
+    """Job body for /apply_ospf_config"""
+    configs = ospfconfig.fetch_all_configs()
+
+    if not configs or len(configs) < 4:
+        raise ValueError("Not all routers configured. Please start over.")
+
+    configured = ospfconfig.configure_ospf(configs, progress=progress, two_phase=two_phase)
+    ping_results = verify_configured(configs, configured)
+
+    return {'configured': configured, 'ping_results': ping_results}
+
+def verify_configured(configs, configured):
+    """Ping the loopbacks the configs predict, unless configuring them failed"""
+    if not configured:
+        return {'success': False, 'results': [],
+                'error': 'OSPF configuration failed, reachability was not verified'}
+    return ospfconfig.verify_reachability(configs, model=topology.Topology(configs))
+
+def run_plan_ospf_config(progress=None):
+    """Job body for /plan_ospf_config"""
+    return ospfconfig.plan_ospf(ospfconfig.fetch_all_configs(), progress=progress)
+
+def run_diff_config(progress=None):
+    """Job body for /diff_config"""
+    return diffconfig.diff_config(progress=progress)
+
+# Long-running operations that can be started as background jobs
+JOB_KINDS = {
+    'get_config': getconfig.get_config,
+    'diff_config': run_diff_config,
+    'apply_ospf_config': run_apply_ospf_config,
+    'plan_ospf_config': run_plan_ospf_config,
+    'migrate': migration.migrate,
+}
+
+# Page titles while a job runs, and how its finished result is shown
+JOB_TITLES = {
+    'get_config': "Retrieving Configs",
+    'diff_config': "Comparing Configs",
+    'apply_ospf_config': "Applying OSPF",
+    'plan_ospf_config': "Planning OSPF",
+    'migrate': "Migrating",
+}
+JOB_VIEWS = {
+    'get_config': lambda result: render_template("get_config.html", files=result),
+    'diff_config': lambda result: render_template("diff_config.html", diff_results=result),
+    'apply_ospf_config': lambda result: render_template('ospf_results.html',
+                                                        ping_results=result['ping_results']),
+    'plan_ospf_config': jsonify,
+    'migrate': lambda result: render_template("migrate.html", result=result),
+}
+
+def start_job(kind, **kwargs):
+    """
+    Submit a job and answer with its ID and URLs: JSON for API clients, a
+    page that follows its progress over SSE for browsers.
+    """
+    job = jobs.manager.submit(kind, JOB_KINDS[kind], **kwargs)
+    links = {
+        'id': job.id,
+        'status_url': url_for('job_status', job_id=job.id),
+        'events_url': url_for('job_events', job_id=job.id),
+        'view_url': url_for('job_view', job_id=job.id),
+    }
+
+    if request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json':
+        return jsonify(links), 202
+    return render_template("job.html", job=job, title=JOB_TITLES[kind], **links), 202
+
 def create_app():
     app = Flask(__name__)
 
+    # Reachability sweeps run up to connectivity.MAX_CONCURRENCY pings at once
+    connectivity.raise_fd_limit()
+
+    @app.before_request
+    def start_request_trace():
+        g.request_start = time.perf_counter()
+        # ?trace=1 records every device stage this request runs, see /traces/<id>
+        if request.args.get('trace'):
+            g.trace, g.trace_token = metrics.begin_trace(f"{request.method} {request.path}")
+
+    @app.after_request
+    def finish_request_trace(response):
+        metrics.registry.observe('http_request_seconds', time.perf_counter() - g.request_start,
+                                 "Time taken to build each response", endpoint=request.endpoint or 'unknown')
+        if 'trace' in g:
+            response.headers['X-Trace-Id'] = g.trace.id
+        return response
+
+    @app.teardown_request
+    def end_request_trace(exc):
+        # Streamed responses tear down twice, once per context push
+        token = g.pop('trace_token', None)
+        if token is not None:
+            metrics.end_trace(token)
+
     @app.route("/")
     def home():
         return render_template("index.html")
 
     @app.route("/get_config")
     def get_config():
-        files = getconfig.get_config()
-        return render_template("get_config.html", files=files)
+        # Devices are polled in a job, the page shows each one as it finishes
+        return start_job('get_config')
 
     @app.route("/ospf_config")
     def ospf_config():
@@ -52,6 +149,51 @@ def create_app():
         router_config = ospfconfig.get_router_template_data(router)
         return render_template('ospf_config_form.html', **router_config)
 
+    @app.route("/ospf_config/import", methods=['POST'])
+    def import_ospf_config():
+        """Bulk load router definitions from an uploaded CSV, JSON, JSON Lines or YAML file"""
+        upload = request.files.get('file')
+        filename = upload.filename if upload else ''
+        fmt = request.args.get('format')
+
+        try:
+            fmt = fmt or ospfbulk.detect_format(filename)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if fmt not in ospfbulk.FORMATS:
+            return jsonify({'error': f'Unknown format: {fmt}'}), 400
+
+        raw = upload.stream if upload else request.stream
+        stream = codecs.getreader('utf-8')(raw)
+
+        try:
+            count = ospfbulk.import_configs(stream, fmt)
+        except ospfbulk.BulkImportError as e:
+            return jsonify({'error': str(e), 'records': e.errors}), 400
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        return jsonify({'imported': count})
+
+    @app.route("/ospf_config/export")
+    def export_ospf_config():
+        """Stream the stored router definitions as CSV, JSON, JSON Lines or YAML"""
+        fmt = request.args.get('format', 'json')
+        if fmt not in ospfbulk.FORMATS:
+            return jsonify({'error': f'Unknown format: {fmt}'}), 400
+
+        mimetypes = {
+            'csv': 'text/csv',
+            'json': 'application/json',
+            'jsonl': 'application/x-ndjson',
+            'yaml': 'application/yaml',
+        }
+        return Response(
+            ospfbulk.export_configs(fmt),
+            mimetype=mimetypes[fmt],
+            headers={'Content-Disposition': f'attachment; filename=ospf_config.{fmt}'},
+        )
+
     @app.route("/apply_ospf_config")
     def apply_ospf_config():
         """Final step - validate IPs, configure OSPF, and test connectivity"""
@@ -61,21 +203,96 @@ def create_app():
         if not configs or len(configs) < 4:
             return "Error: Not all routers configured. Please start over.", 400
 
-        ospfconfig.configure_ospf(configs)
-        
-        ping_results = ospfconfig.ping_loopbacks_from_r1(configs)
-        
-        return render_template('ospf_results.html', ping_results=ping_results)
+        # ?two_phase=1 commits every router together, rolling back on any failure
+        two_phase = request.args.get('two_phase', '').lower() in ('1', 'true', 'yes', 'on')
+        return start_job('apply_ospf_config', two_phase=two_phase)
+
+    @app.route("/plan_ospf_config")
+    def plan_ospf_config():
+        """Dry run - show which routers /apply_ospf_config would change"""
+        configs = ospfconfig.fetch_all_configs()
+        return jsonify(ospfconfig.plan_ospf(configs))
+
+    @app.route("/ospf_topology")
+    def ospf_topology():
+        """Adjacencies, routes and verification pings predicted from the stored configs"""
+        topology.model.sync(ospfconfig.fetch_all_configs())
+        return jsonify(topology.model.to_dict())
 
     @app.route("/diff_config")
     def diff_config():
-        diff_results = diffconfig.diff_config()
-        return render_template("diff_config.html", diff_results=diff_results)
+        return start_job('diff_config')
 
     @app.route("/migrate")
     def migrate():
-        result = migration.migrate()
-        return render_template("migrate.html", result=result)
+        return start_job('migrate')
+
+    @app.route("/jobs/<kind>", methods=['POST'])
+    def submit_job(kind):
+        """Start a long-running operation in the background and return its job ID"""
+        if kind not in JOB_KINDS:
+            return jsonify({'error': f'Unknown job kind: {kind}'}), 404
+        return start_job(kind)
+
+    @app.route("/jobs")
+    def list_jobs():
+        return jsonify([job.to_dict(include_result=False) for job in jobs.manager.list()])
+
+    @app.route("/jobs/<job_id>")
+    def job_status(job_id):
+        job = jobs.manager.get(job_id)
+        if job is None:
+            return jsonify({'error': 'Unknown job'}), 404
+        return jsonify(job.to_dict())
+
+    @app.route("/jobs/<job_id>/view")
+    def job_view(job_id):
+        """A finished job's result on its usual page, or its progress page until then"""
+        job = jobs.manager.get(job_id)
+        if job is None:
+            return "Unknown job", 404
+        if job.status != 'done':
+            return render_template("job.html", job=job, title=JOB_TITLES[job.kind],
+                                   events_url=url_for('job_events', job_id=job.id),
+                                   view_url=url_for('job_view', job_id=job.id))
+        return JOB_VIEWS[job.kind](job.result)
+
+    @app.route("/jobs/<job_id>/events")
+    def job_events(job_id):
+        """Server-Sent Events stream of a job's per-device progress"""
+        if jobs.manager.get(job_id) is None:
+            return jsonify({'error': 'Unknown job'}), 404
+
+        # Resume after the last event a reconnecting EventSource saw
+        since = request.headers.get('Last-Event-ID', request.args.get('since', -1))
+        try:
+            since = int(since) + 1
+        except ValueError:
+            since = 0
+
+        return Response(
+            jobs.manager.stream(job_id, since=since),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+        )
+
+    @app.route("/metrics")
+    def prometheus_metrics():
+        """Stage timings and scheduler/session pool state in Prometheus text format"""
+        for key, value in scheduler.scheduler.stats().items():
+            metrics.registry.set(f'scheduler_{key}', value, "Device scheduler state")
+        for key, value in sessionpool.pool.stats().items():
+            metrics.registry.set(f'session_pool_{key}', value, "Pooled device sessions")
+
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    @app.route("/traces/<trace_id>")
+    def request_trace(trace_id):
+        """Spans recorded for a request made with ?trace=1, including any job it started"""
+        trace = metrics.get_trace(trace_id)
+        if trace is None:
+            return jsonify({'error': 'Unknown trace'}), 404
+        return jsonify(trace.to_dict())
 
     return app
 
@@ -1,137 +1,327 @@
-import napalm
+import contextvars
+import json
 import time
-from tools import sshInfo
-import threading
-import sys
-
-def cont_ping(host):
-    try:
-        driver = napalm.get_network_driver("ios")
-        device = driver(
-            hostname=host['host'],
-            username=host['username'],
-            password=host['password'],
-            optional_args={'read_timeout_override': 120}
-        )
-        device.open()
-
-        start = time.time()
-
-        # Issue the ping command
-        while (time.time() - start) < 120:
+from concurrent.futures import ThreadPoolExecutor
+
+from tools import sshInfo, sessionpool, jobs, outage, countersampler, metrics, connectivity, scheduler
+
+# Plan run by migrate() unless another one is given
+PLAN_PATH = "config/migration_plan.json"
+
+# Seconds to wait for the probe target to answer again after the last step
+RECOVERY_TIMEOUT = 60
+
+# Consecutive probe replies that count as the target being back
+RECOVERY_REPLIES = 5
+
+# Checks run at once across a plan's devices and interfaces. They mostly
+# wait on the shared counter sampler, so this can be generous.
+CHECK_WORKERS = 256
+
+def check_interface_traffic(host, interface):
+    """
+    True if the interface carries traffic, answered from the shared counter
+    sampler. The first check of an interface waits for two samples, later
+    ones for the next poll, so the answer never predates the check. Counts
+    as busy if no counters could be read.
+    """
+    sampler = countersampler.sampler
+    start = time.monotonic()
+    sampler.watch(host, [interface])
+    print(f"Checking for interface traffic on {host['host']}, {interface}")
+
+    if not sampler.wait_for_samples(host['host'], interface, since=start):
+        print("failed to check interface traffic, no counters for", interface)
+        return True
+
+    rates = sampler.rates(host['host'], interface)
+    if rates is None:
+        print("failed to check interface traffic, counters for", interface, "are stale")
+        return True
+    print(f"{interface}: rx {rates['rx_pps']:.1f} pps, tx {rates['tx_pps']:.1f} pps "
+          f"over {rates['seconds']:.0f}s")
+    return not sampler.is_idle(host['host'], interface)
+
+def check_reachable(device, interface=None):
+    reachable = connectivity.check_reachability([device['host']])[device['host']]
+    return reachable, "reachable" if reachable else "unreachable"
+
+def check_interface_idle(device, interface):
+    busy = check_interface_traffic(device, interface)
+    return not busy, "traffic present" if busy else "idle"
+
+# Checks a plan can name, with whether they run once per device or once per
+# target interface. probe_recovered is a post-check on the plan's probe.
+CHECKS = {
+    'reachable': ('device', check_reachable),
+    'interface_idle': ('interface', check_interface_idle),
+}
+PROBE_CHECK = 'probe_recovered'
+
+def load_plan(path=PLAN_PATH, hosts=None):
+    """
+    Read a migration plan and resolve its devices against sshInfo.json.
+
+    A plan names its targets (device management IP and interface), the
+    pre-checks that must pass before anything changes, the steps applied to
+    every target (config lines, where {interface} is replaced by the target
+    interface, or a wait in seconds),
+    the post-checks, the abort conditions and the steps that undo a partial
+    change. See config/migration_plan.json.
+
+    Raises:
+        ValueError: if the plan is incomplete or names an unknown device or check
+    """
+    with open(path) as f:
+        plan = json.load(f)
+
+    hosts = hosts if hosts is not None else sshInfo.load_ssh_info("config/sshInfo.json")
+    devices = {host['host']: host for host in hosts}
+
+    def device(host):
+        if host not in devices:
+            raise ValueError(f"unknown device {host}")
+        return devices[host]
+
+    if not plan.get('targets') or not plan.get('steps'):
+        raise ValueError("a plan needs targets and steps")
+
+    plan.setdefault('name', path)
+    plan.setdefault('pre_checks', [])
+    plan.setdefault('post_checks', [])
+    plan.setdefault('on_abort', [])
+    plan['abort'] = {'on_pre_check_failure': 'abort', 'max_outage': None} | plan.get('abort', {})
+    if plan['abort']['on_pre_check_failure'] not in ('abort', 'skip'):
+        raise ValueError("on_pre_check_failure must be abort or skip")
+
+    for name in plan['pre_checks'] + plan['post_checks']:
+        if name not in CHECKS and name != PROBE_CHECK:
+            raise ValueError(f"unknown check {name}")
+    if PROBE_CHECK in plan['pre_checks'] or (PROBE_CHECK in plan['post_checks'] and not plan.get('probe')):
+        raise ValueError(f"{PROBE_CHECK} is a post-check and needs a probe")
+
+    for step in plan['steps'] + plan['on_abort']:
+        if 'name' not in step or ('config' in step) == ('wait' in step):
+            raise ValueError(f"step {step.get('name')} needs a name and either config or wait")
+        if 'config' in step and not isinstance(step['config'], str):
+            raise ValueError(f"step {step['name']} config must be a string")
+        if 'wait' in step and (not isinstance(step['wait'], (int, float)) or step['wait'] < 0):
+            raise ValueError(f"step {step['name']} wait must be a number of seconds")
+
+    plan['targets'] = [{'device': device(t['device']), 'interface': t['interface']} for t in plan['targets']]
+    if plan.get('probe'):
+        plan['probe'] = {'recovery_timeout': RECOVERY_TIMEOUT} | plan['probe']
+        plan['probe']['source'] = device(plan['probe']['source'])
+
+    return plan
+
+def run_checks(names, targets, stage, progress=None):
+    """
+    Run the named checks across all targets at once. Device checks run once
+    per device. Returns one row per check run.
+    """
+    work = []
+    for name in names:
+        scope, fn = CHECKS[name]
+        if scope == 'device':
+            devices = {t['device']['host']: t['device'] for t in targets}
+            work += [(name, fn, device, None) for device in devices.values()]
+        else:
+            work += [(name, fn, t['device'], t['interface']) for t in targets]
+
+    def run(name, fn, device, interface):
+        start = time.monotonic()
+        try:
+            with metrics.span(f"{stage}_{name}", device['host']):
+                ok, detail = fn(device, interface)
+        except Exception as e:
+            ok, detail = False, str(e)
+
+        jobs.report(progress, device['host'], stage, check=name, interface=interface, ok=ok, detail=detail)
+        return {'check': name, 'device': device['host'], 'interface': interface, 'ok': ok,
+                'detail': detail, 'elapsed': round(time.monotonic() - start, 2)}
+
+    if not work:
+        return []
+    with ThreadPoolExecutor(max_workers=min(len(work), CHECK_WORKERS)) as pool:
+        futures = [pool.submit(contextvars.copy_context().run, run, *item) for item in work]
+    return [future.result() for future in futures]
+
+def apply_config(device, config):
+    with sessionpool.session(
+        device['host'],
+        device['username'],
+        device['password'],
+        optional_args={'read_timeout_override': 120}
+    ) as session:
+        session.load_merge_candidate(config=config)
+        session.commit_config()
+
+def run_step(step, targets, progress=None, should_abort=None):
+    """
+    Apply one step to every target at once, one commit per device. A wait
+    step sleeps, but gives up early once should_abort() is true.
+
+    Returns the step's name, elapsed seconds and the devices it failed on.
+    """
+    name = step['name']
+    start = time.monotonic()
+    failed = {}
+
+    if 'wait' in step:
+        jobs.report(progress, None, 'step', step=name, wait=step['wait'])
+        deadline = start + step['wait']
+        while time.monotonic() < deadline and not (should_abort and should_abort()):
+            time.sleep(min(0.5, max(0, deadline - time.monotonic())))
+    else:
+        # Interface lines for each target, device-wide lines (banners) once
+        configs = {}
+        for target in targets:
+            device, chunks = configs.setdefault(target['device']['host'], (target['device'], []))
+            # Not str.format, config lines may contain braces of their own
+            chunk = step['config'].replace('{interface}', target['interface'])
+            if chunk not in chunks:
+                chunks.append(chunk)
+
+        def apply(device, config):
+            with metrics.span(f"migration_{name}", device['host']):
+                apply_config(device, config)
+
+        # Steps commit, and a commit that timed out may still have been applied
+        futures = {host: scheduler.submit(host, apply, device, "".join(chunks), retries=0)
+                   for host, (device, chunks) in configs.items()}
+        for host, future in futures.items():
             try:
-                ping_cmd = "ping 30.0.0.1 repeat 1"
-                output = device.cli([ping_cmd])
-                result = output[ping_cmd]
-
-                success = "!" in result or "Success rate is 100" in result
-
-                if success:
-                    print(result.splitlines()[3])
-                if not success:
-                    print("Ping FAILED!")
-
-                # Ping once a second
-                time.sleep(1)
+                future.result()
+                jobs.report(progress, host, 'step', step=name, ok=True)
             except Exception as e:
-                print("Could not ping device:", e)
-
-        device.close()
-
-    except Exception as e:
-        print("Failed to connect to device and ping")
-
-def check_interface_traffic(host):
-    try:
-        driver = napalm.get_network_driver("ios")
-        device = driver(
-            hostname=host['host'],
-            username=host['username'],
-            password=host['password'],
-            optional_args={'read_timeout_override': 120}
-        )
-        device.open()
-
-        hostname = device.get_facts()['hostname']
-        print(f"Checking for interface traffic on {hostname}, FastEthernet1/0")
-        counters = device.get_interfaces_counters()['FastEthernet1/0']
-
-        start_count_tx = counters['tx_unicast_packets']
-        start_count_rx = counters['rx_unicast_packets']
-
-        time.sleep(10)
-
-        counters = device.get_interfaces_counters()['FastEthernet1/0']
-
-        end_count_tx = counters['tx_unicast_packets']
-        end_count_rx = counters['rx_unicast_packets']
-
-        traffic_present = False
-        if end_count_tx - start_count_tx > 100 or end_count_rx - start_count_rx > 100:
-            traffic_present = True
-
-        device.close()
-
-    except Exception as e:
-        print("failed to check interface traffic", e)
-
-    return traffic_present
-
-def shutdown_iface(host):
+                failed[host] = str(e)
+                jobs.report(progress, host, 'step', step=name, ok=False, error=str(e))
+
+    elapsed = round(time.monotonic() - start, 2)
+    print(f"Step {name}: {elapsed}s" + (f", failed on {', '.join(sorted(failed))}" if failed else ""))
+    return {'name': name, 'elapsed': elapsed, 'failed': failed}
+
+def answering(sampler, replies=RECOVERY_REPLIES):
+    """True if the last few probes all got a reply"""
+    samples = sampler.ring.samples()
+    return len(samples) >= replies and all(rtt is not None for _, rtt in samples[-replies:])
+
+def current_outage(sampler):
+    """Seconds the probe target has been unanswered, 0 if it is answering"""
+    outages = sampler.ring.outages()
+    if not outages or outages[-1]['end'] is not None:
+        return 0
+    return time.time() - outages[-1]['start']
+
+def migrate(progress=None, plan=PLAN_PATH):
+    """
+    Run a migration plan: pre-checks across every target at once, then each
+    step on all targets in parallel, then post-checks. Aborts by returning
+    a result with success False, after running the plan's on_abort steps if
+    anything was already changed.
+
+    Returns:
+        Dict with success, message, the check rows, step timings and, if
+        the plan has a probe, the ping summary and longest outage.
+    """
     try:
-        driver = napalm.get_network_driver("ios")
-        device = driver(
-            hostname=host['host'],
-            username=host['username'],
-            password=host['password'],
-            optional_args={'read_timeout_override': 120}
-        )
-        device.open()
-
-        # Shutdown interface
-        shutdown_config = f"interface f1/0\n shutdown\n"
-        device.load_merge_candidate(config=shutdown_config)
-        device.commit_config()
-        print(f"Interface f1/0 shutdown, banner configured. Waiting 10s before turning back on...")
-
-        # Configure banner
-        banner_config = "banner motd ^Change made for migration in Lab 6^\n"
-        device.load_merge_candidate(config=banner_config)
-        device.commit_config()
-        time.sleep(10)
-
-        no_shutdown_config = f"interface f1/0\n no shutdown\n"
-        device.load_merge_candidate(config=no_shutdown_config)
-        device.commit_config()
-        print(f"Interface f1/0 brought back up")
-
-        device.close()
-
-    except Exception as e:
-        print("Failed to shutdown interface", e)
-
-
-def migrate():
-    host = sshInfo.load_ssh_info("config/sshInfo.json")
-
-    # Start continuous ping in background thread
-    ping_thread = threading.Thread(
-        target=cont_ping, 
-        daemon=True,
-        args=(host[0],)
-    )
-    ping_thread.start()
-
-    if check_interface_traffic(host[3]):
-        print("Traffic present, cannot continue")
-        sys.exit()
-
-    shutdown_iface(host[3])
-
-    print("Successfully migrated!")
+        plan = load_plan(plan) if isinstance(plan, str) else plan
+    except (OSError, ValueError) as e:
+        print("Invalid migration plan:", e)
+        return {'success': False, 'message': f"Invalid migration plan: {e}"}
+
+    targets = plan['targets']
+    max_outage = plan['abort']['max_outage']
+    result = {'success': False, 'plan': plan['name'], 'checks': [], 'steps': [], 'skipped': [],
+              'ping': None, 'outage': None}
+
+    # Sample reachability of the far side for the whole change window
+    sampler = None
+    if plan.get('probe'):
+        probe = plan['probe']
+        sampler = outage.sampler_for(probe['source'], probe['target']).start()
+        jobs.report(progress, probe['source']['host'], 'pinging', mode=sampler.mode)
+
+    def outage_exceeded():
+        return sampler is not None and max_outage is not None and current_outage(sampler) > max_outage
+
+    def finish(message, success=False):
+        # stop() waits at most outage.STOP_TIMEOUT, a remote burst in flight ends on its own
+        if sampler is not None:
+            result['ping'] = sampler.stop()
+            result['outage'] = result['ping']['outage']
+        # Stop polling the counters the idle checks asked for
+        if 'interface_idle' in plan['pre_checks'] + plan['post_checks']:
+            for t in plan['targets']:
+                countersampler.sampler.unwatch(t['device']['host'], [t['interface']])
+        if result['outage']:
+            print(f"Outage to {plan['probe']['target']}: {result['outage']['duration']}s, "
+                  f"{result['outage']['lost']} probes lost")
+        print(message)
+        return result | {'success': success, 'message': message}
+
+    def abort(message):
+        if result['steps']:
+            print("Aborting, undoing the change...")
+            for step in plan['on_abort']:
+                result['steps'].append(run_step(step, targets, progress) | {'on_abort': True})
+        return finish(message)
+
+    checks = run_checks(plan['pre_checks'], targets, 'pre_check', progress)
+    result['checks'] += checks
+    failed = [c for c in checks if not c['ok']]
+    if failed and plan['abort']['on_pre_check_failure'] == 'abort':
+        return abort(f"{len(failed)} pre-check(s) failed, e.g. {failed[0]['check']} on "
+                     f"{failed[0]['device']} {failed[0]['interface'] or ''}: {failed[0]['detail']}".strip())
+    if failed:
+        bad_devices = {c['device'] for c in failed if c['interface'] is None}
+        bad_targets = {(c['device'], c['interface']) for c in failed}
+        result['skipped'] = [{'device': t['device']['host'], 'interface': t['interface']} for t in targets
+                             if t['device']['host'] in bad_devices
+                             or (t['device']['host'], t['interface']) in bad_targets]
+        skipped = {(t['device'], t['interface']) for t in result['skipped']}
+        targets = [t for t in targets if (t['device']['host'], t['interface']) not in skipped]
+        if not targets:
+            return abort("No targets passed the pre-checks")
+        print(f"Skipping {len(skipped)} target(s) that failed pre-checks")
+
+    for step in plan['steps']:
+        outcome = run_step(step, targets, progress, should_abort=outage_exceeded)
+        result['steps'].append(outcome)
+        if outcome['failed']:
+            return abort(f"Step {step['name']} failed on {', '.join(sorted(outcome['failed']))}")
+        if outage_exceeded():
+            return abort(f"Outage to {plan['probe']['target']} longer than {max_outage}s")
+
+    post = []
+    if sampler is not None:
+        # Keep sampling until the target answers again so the outage has an end
+        deadline = time.monotonic() + plan['probe']['recovery_timeout']
+        with metrics.span('recovery_wait', plan['probe']['target']):
+            while not answering(sampler) and time.monotonic() < deadline and sampler.error is None:
+                time.sleep(0.5)
+
+        if PROBE_CHECK in plan['post_checks']:
+            recovered = answering(sampler)
+            longest = sampler.ring.summary()['outage']
+            ok = recovered and (max_outage is None or not longest or (longest['duration'] or 0) <= max_outage)
+            detail = "answering" if recovered else "not answering"
+            if longest and longest['duration'] is not None:
+                detail += f", longest outage {longest['duration']}s"
+            post.append({'check': PROBE_CHECK, 'device': plan['probe']['target'], 'interface': None,
+                         'ok': ok, 'detail': detail, 'elapsed': None})
+
+    names = [name for name in plan['post_checks'] if name != PROBE_CHECK]
+    post += run_checks(names, targets, 'post_check', progress)
+    result['checks'] += post
+    failed = [c for c in post if not c['ok']]
+    if failed:
+        return finish(f"{len(failed)} post-check(s) failed, e.g. {failed[0]['check']} on "
+                      f"{failed[0]['device']}: {failed[0]['detail']}")
+
+    return finish("Migrated successfully", success=True)
 
-    return {'success': True, 'message': 'Migrated successfully'}
-    
 
 if __name__ == "__main__":
-    migrate()
\ No newline at end of file
+    migrate()
@@ -0,0 +1,373 @@
+import argparse
+import csv
+import ipaddress
+import json
+import sys
+from itertools import islice
+from pathlib import Path
+
+import ospfconfig
+from tools import addressplan, validateIP
+
+# Rows validated per batch while streaming an import
+BATCH_SIZE = 1000
+
+# Characters read at a time while streaming a JSON array
+JSON_CHUNK = 1 << 16
+
+FORMATS = ('csv', 'json', 'jsonl', 'yaml')
+
+INTERFACE_COLUMNS = ('interface', 'interface_ip', 'interface_mask', 'interface_area')
+CSV_COLUMNS = ospfconfig.ROUTER_COLUMNS + INTERFACE_COLUMNS
+
+
+class BulkImportError(Exception):
+    """Raised when an import file fails validation, carrying every error found"""
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} invalid record(s)")
+        self.errors = errors
+
+
+def detect_format(filename):
+    """Guess the format of a file from its extension"""
+    suffix = Path(filename).suffix.lower().lstrip('.')
+    if suffix in ('yml', 'yaml'):
+        return 'yaml'
+    if suffix in ('ndjson', 'jsonl'):
+        return 'jsonl'
+    if suffix in FORMATS:
+        return suffix
+    raise ValueError(f"Cannot tell the format of {filename}, expected one of {', '.join(FORMATS)}")
+
+
+def _read_csv(stream):
+    """One row per interface, consecutive rows with the same router are merged"""
+    config = None
+    for row in csv.DictReader(stream):
+        if config is None or row['router'] != config['router']:
+            if config is not None:
+                yield config
+            config = {col: row.get(col) for col in ospfconfig.ROUTER_COLUMNS}
+            config['interfaces'] = []
+
+        if row.get('interface'):
+            config['interfaces'].append({
+                'name': row['interface'],
+                'ip': row.get('interface_ip'),
+                'mask': row.get('interface_mask'),
+                'area': row.get('interface_area'),
+            })
+
+    if config is not None:
+        yield config
+
+
+def _read_json(stream):
+    """
+    Yield the routers of a JSON array, or of the "routers" array in an
+    object, one at a time, so the whole document is never held in memory.
+    """
+    decoder = json.JSONDecoder()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def fill():
+        nonlocal buf, pos, eof
+        chunk = stream.read(JSON_CHUNK)
+        buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+        return bool(chunk)
+
+    def peek():
+        """The next non-whitespace character, '' at the end of the input"""
+        nonlocal pos
+        while True:
+            while pos < len(buf) and buf[pos].isspace():
+                pos += 1
+            if pos < len(buf):
+                return buf[pos]
+            if not fill():
+                return ''
+
+    def expect(chars):
+        nonlocal pos
+        char = peek()
+        if not char or char not in chars:
+            raise ValueError(f"expected {' or '.join(chars)}, found {char or 'end of input'}")
+        pos += 1
+        return char
+
+    def value():
+        nonlocal pos
+        while True:
+            peek()
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # Most likely cut off at the end of the buffer, read on
+                if not fill():
+                    raise
+                continue
+            # A number or literal ending at the buffer's end may continue in the next chunk
+            if end == len(buf) and not eof:
+                fill()
+                continue
+            pos = end
+            return item
+
+    if expect('[{') == '{':
+        end = peek() == '}'
+        while not end:
+            key = value()
+            expect(':')
+            if key == 'routers':
+                expect('[')
+                break
+            value()
+            end = expect(',}') == '}'
+        if end:
+            raise ValueError("no routers array")
+
+    if peek() == ']':
+        return
+    while True:
+        yield value()
+        if expect(',]') == ']':
+            return
+
+
+def _read_jsonl(stream):
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _read_yaml(stream):
+    import yaml
+
+    # Either one document holding a list of routers or one document per router
+    for doc in yaml.safe_load_all(stream):
+        if doc is None:
+            continue
+        if isinstance(doc, dict) and 'routers' in doc:
+            doc = doc['routers']
+        yield from doc if isinstance(doc, list) else [doc]
+
+
+READERS = {
+    'csv': _read_csv,
+    'json': _read_json,
+    'jsonl': _read_jsonl,
+    'yaml': _read_yaml,
+}
+
+
+def _valid_mask(mask):
+    try:
+        ipaddress.IPv4Network(f"0.0.0.0/{mask}")
+        return True
+    except ValueError:
+        return False
+
+
+def validate_config(config):
+    """Returns a list of problems with one router config, empty if it is valid"""
+    errors = []
+
+    for col in ('router', 'ip_address', 'username', 'password', 'router_id', 'loopback_ip'):
+        if not config.get(col):
+            errors.append(f"missing {col}")
+
+    for col in ('ip_address', 'loopback_ip'):
+        if config.get(col) and not validateIP.validate_ip(str(config[col])):
+            errors.append(f"invalid {col} {config[col]}")
+
+    try:
+        int(config.get('ospf_process_id') or 1)
+    except (TypeError, ValueError):
+        errors.append(f"invalid ospf_process_id {config.get('ospf_process_id')}")
+
+    if not config.get('interfaces'):
+        errors.append("no interfaces")
+
+    for iface in config.get('interfaces') or []:
+        name = iface.get('name')
+        if not validateIP.validate_ip(str(iface.get('ip'))):
+            errors.append(f"{name}: invalid ip {iface.get('ip')}")
+        if not _valid_mask(iface.get('mask')):
+            errors.append(f"{name}: invalid mask {iface.get('mask')}")
+        if iface.get('area') in (None, ''):
+            errors.append(f"{name}: missing area")
+
+    return errors
+
+
+def _normalize(config):
+    config = {col: config.get(col) for col in ospfconfig.ROUTER_COLUMNS} | {
+        'interfaces': [
+            {key: iface.get(key) for key in ('name', 'ip', 'mask', 'area')}
+            for iface in config.get('interfaces') or []
+        ],
+    }
+    config['ospf_process_id'] = int(config['ospf_process_id'] or 1)
+    config['hostname'] = config['hostname'] or config['router']
+    config['loopback_mask'] = config['loopback_mask'] or '255.255.255.255'
+    return config
+
+
+def validate_fleet(configs):
+    """
+    Check the address plan the import would leave in the database, the
+    imported routers together with the stored ones they don't replace.
+    Returns errors in the same shape as import_configs, record None.
+    """
+    imported = {config['router'] for config in configs}
+    fleet = [config for config in ospfconfig.fetch_all_configs()
+             if config['router'] not in imported] + configs
+
+    by_router = {}
+    for p in addressplan.validate_plan(fleet):
+        error = f"{p['interface']}: {p['error']}" if p['interface'] else p['error']
+        by_router.setdefault(p['router'], []).append(error)
+
+    return [{'record': None, 'router': router, 'errors': problems}
+            for router, problems in by_router.items()]
+
+
+def import_configs(stream, fmt):
+    """
+    Stream-parse router definitions, validate them in batches and store them
+    in a single transaction. Nothing is written unless every record is valid
+    and the resulting fleet address plan is consistent.
+
+    Args:
+        stream: text file object to read from
+        fmt: one of FORMATS
+
+    Returns:
+        Number of routers imported.
+    """
+    records = READERS[fmt](stream)
+    configs = []
+    errors = []
+    index = 0
+
+    while True:
+        try:
+            batch = list(islice(records, BATCH_SIZE))
+        except Exception as e:
+            raise ValueError(f"could not parse {fmt} input: {e}") from e
+        if not batch:
+            break
+
+        for config in batch:
+            index += 1
+            if not isinstance(config, dict):
+                errors.append({'record': index, 'router': None, 'errors': ["not a router object"]})
+                continue
+
+            problems = validate_config(config)
+            if problems:
+                errors.append({'record': index, 'router': config.get('router'), 'errors': problems})
+            elif not errors:
+                configs.append(_normalize(config))
+
+    if errors:
+        raise BulkImportError(errors)
+
+    errors = validate_fleet(configs)
+    if errors:
+        raise BulkImportError(errors)
+
+    return ospfconfig.upsert_routers(configs)
+
+
+def export_configs(fmt):
+    """Yield the stored router definitions as chunks of text in the given format"""
+    configs = ospfconfig.fetch_all_configs()
+
+    if fmt == 'csv':
+        class _Line:
+            def write(self, text):
+                return text
+
+        writer = csv.writer(_Line())
+        yield writer.writerow(CSV_COLUMNS)
+        for config in configs:
+            router = [config[col] for col in ospfconfig.ROUTER_COLUMNS]
+            for iface in config['interfaces']:
+                yield writer.writerow(router + [iface['name'], iface['ip'], iface['mask'], iface['area']])
+
+    elif fmt == 'jsonl':
+        for config in configs:
+            yield json.dumps(config) + "\n"
+
+    elif fmt == 'json':
+        yield "[\n"
+        for i, config in enumerate(configs):
+            yield ("," if i else "") + json.dumps(config) + "\n"
+        yield "]\n"
+
+    elif fmt == 'yaml':
+        import yaml
+
+        for config in configs:
+            yield yaml.safe_dump(config, explicit_start=True, sort_keys=False)
+
+    else:
+        raise ValueError(f"Unknown format {fmt}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Bulk import/export of router OSPF definitions")
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    imp = sub.add_parser('import', help="load routers from a file")
+    imp.add_argument('file')
+    imp.add_argument('--format', choices=FORMATS)
+
+    exp = sub.add_parser('export', help="write stored routers to a file, or - for stdout")
+    exp.add_argument('file')
+    exp.add_argument('--format', choices=FORMATS)
+
+    args = parser.parse_args(argv)
+
+    ospfconfig.init_db()
+
+    if args.command == 'import':
+        try:
+            fmt = args.format or detect_format(args.file)
+            with open(args.file, newline='') as f:
+                count = import_configs(f, fmt)
+        except ValueError as e:
+            print(f"Import failed: {e}", file=sys.stderr)
+            return 1
+        except BulkImportError as e:
+            for error in e.errors:
+                print(f"record {error['record']} ({error['router']}): {'; '.join(error['errors'])}",
+                      file=sys.stderr)
+            print(f"Import failed: {e}", file=sys.stderr)
+            return 1
+        print(f"Imported {count} routers")
+
+    else:
+        try:
+            fmt = args.format or (detect_format(args.file) if args.file != '-' else 'json')
+        except ValueError as e:
+            print(f"Export failed: {e}", file=sys.stderr)
+            return 1
+
+        out = sys.stdout if args.file == '-' else open(args.file, 'w', newline='')
+        try:
+            for chunk in export_configs(fmt):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,74 +1,195 @@
-from napalm import get_network_driver
 import sqlite3
+import json
 from prettytable import PrettyTable
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed, wait
+import contextvars
+import re
 import threading
 import time
 
-from tools import connectivity, validateIP
+from tools import connectivity, sessionpool, jobs, scheduler, metrics, factscache, addressplan, topology
 
 # Thread-safe lock for printing
 print_lock = threading.Lock()
 
+DB_PATH = 'ospf_config.db'
+
+# Seconds to wait for OSPF to converge after a push, and how often to poll
+CONVERGENCE_DEADLINE = 60
+CONVERGENCE_INTERVAL = 2
+
+# Routers committed at the same instant in a two-phase apply; bigger fleets
+# commit in waves of this size
+COMMIT_BURST = 64
+
+# Seconds the first commit wave waits for every router in it to be ready
+COMMIT_BARRIER_TIMEOUT = 30
+
+# "2.2.2.2   1   FULL/DR   00:00:33   10.0.0.2   FastEthernet0/0"
+OSPF_NEIGHBOR_RE = re.compile(r"^(\d+\.\d+\.\d+\.\d+)\s+\d+\s+(\w+)/", re.MULTILINE)
+
+# Any dotted quad standing on its own in "show ip route" output
+IPV4_RE = re.compile(r"(?<![\d.])\d{1,3}(?:\.\d{1,3}){3}(?![\d.])")
+
+# "Success rate is 100 percent (5/5), round-trip min/avg/max = 1/2/4 ms"
+PING_RATE_RE = re.compile(r"Success rate is (\d+) percent \((\d+)/(\d+)\)")
+PING_RTT_RE = re.compile(r"min/avg/max = (\d+)/(\d+)/(\d+)")
+
+# Thread-local SQLite connections, one per worker thread
+_db = threading.local()
+
+ROUTER_COLUMNS = ('router', 'hostname', 'ip_address', 'username', 'password',
+                  'ospf_process_id', 'router_id', 'loopback_ip', 'loopback_mask')
+
+def get_db():
+    """Returns this thread's connection to the OSPF config database"""
+    conn = getattr(_db, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        _db.conn = conn
+    return conn
+
 def init_db():
     """Initialize SQLite database"""
-    with sqlite3.connect('ospf_config.db') as conn:
-        c = conn.cursor()
-        c.execute('''CREATE TABLE IF NOT EXISTS router_configs
-                    (router TEXT PRIMARY KEY,
-                    hostname TEXT,
-                    ip_address TEXT,
-                    username TEXT,
-                    password TEXT,
-                    ospf_process_id INTEGER,
-                    router_id TEXT,
-                    loopback_ip TEXT,
-                    loopback_mask TEXT,
-                    interface1 TEXT,
-                    interface1_ip TEXT,
-                    interface1_mask TEXT,
-                    interface1_area TEXT,
-                    interface2 TEXT,
-                    interface2_ip TEXT,
-                    interface2_mask TEXT,
-                    interface2_area TEXT)''')
-        conn.commit()
+    conn = get_db()
+    with conn:
+        conn.execute('''CREATE TABLE IF NOT EXISTS areas
+                        (area_id TEXT PRIMARY KEY)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS routers
+                        (router TEXT PRIMARY KEY,
+                        hostname TEXT,
+                        ip_address TEXT,
+                        username TEXT,
+                        password TEXT,
+                        ospf_process_id INTEGER,
+                        router_id TEXT,
+                        loopback_ip TEXT,
+                        loopback_mask TEXT)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS interfaces
+                        (router TEXT NOT NULL REFERENCES routers (router) ON DELETE CASCADE,
+                        position INTEGER NOT NULL,
+                        name TEXT NOT NULL,
+                        ip_address TEXT,
+                        mask TEXT,
+                        area_id TEXT REFERENCES areas (area_id),
+                        PRIMARY KEY (router, position))''')
+        # What configure_ospf last committed to each router, so the next run
+        # only sends the difference, and when the fleet last converged on it
+        conn.execute('''CREATE TABLE IF NOT EXISTS applied_ospf
+                        (router TEXT PRIMARY KEY,
+                        ospf_process_id INTEGER,
+                        router_id TEXT,
+                        networks TEXT,
+                        applied_at REAL,
+                        converged_at REAL)''')
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(applied_ospf)')}
+        if 'converged_at' not in columns:
+            conn.execute('ALTER TABLE applied_ospf ADD COLUMN converged_at REAL')
+        conn.execute('CREATE INDEX IF NOT EXISTS routers_router_id ON routers (router_id)')
+        conn.execute('CREATE INDEX IF NOT EXISTS interfaces_ip ON interfaces (ip_address)')
+        conn.execute('CREATE INDEX IF NOT EXISTS interfaces_area ON interfaces (area_id)')
+
+    migrate_legacy_table()
+
+def migrate_legacy_table():
+    """Move rows from the old two-interface router_configs table into the new schema"""
+    conn = get_db()
+    legacy = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'router_configs'")
+    if legacy.fetchone() is None:
+        return
+
+    conn.row_factory = sqlite3.Row
+    try:
+        rows = conn.execute('SELECT * FROM router_configs').fetchall()
+    finally:
+        conn.row_factory = None
+
+    configs = []
+    for row in rows:
+        config = {col: row[col] for col in ROUTER_COLUMNS}
+        config['interfaces'] = [
+            {'name': row[f'interface{n}'], 'ip': row[f'interface{n}_ip'],
+             'mask': row[f'interface{n}_mask'], 'area': row[f'interface{n}_area']}
+            for n in (1, 2) if row[f'interface{n}'] and row[f'interface{n}_ip']
+        ]
+        configs.append(config)
+
+    upsert_routers(configs)
+    with conn:
+        conn.execute('DROP TABLE router_configs')
+
+def upsert_routers(configs):
+    """
+    Insert or update many routers and their interfaces in one transaction.
+    Each config is a dict of ROUTER_COLUMNS plus an 'interfaces' list of
+    {'name', 'ip', 'mask', 'area'} dicts, which replaces any stored ones.
+    """
+    configs = list(configs)
+    if not configs:
+        return 0
+
+    conn = get_db()
+    with conn:
+        conn.executemany(
+            'INSERT OR IGNORE INTO areas VALUES (?)',
+            {(str(iface['area']),) for c in configs for iface in c['interfaces']}
+        )
+        conn.executemany(
+            f'''INSERT INTO routers VALUES ({', '.join('?' * len(ROUTER_COLUMNS))})
+                ON CONFLICT (router) DO UPDATE SET
+                {', '.join(f'{col} = excluded.{col}' for col in ROUTER_COLUMNS[1:])}''',
+            [tuple(c.get(col) for col in ROUTER_COLUMNS) for c in configs]
+        )
+        conn.executemany(
+            'DELETE FROM interfaces WHERE router = ?',
+            [(c['router'],) for c in configs]
+        )
+        conn.executemany(
+            'INSERT INTO interfaces VALUES (?, ?, ?, ?, ?, ?)',
+            [(c['router'], pos, iface['name'], iface['ip'], iface['mask'], str(iface['area']))
+             for c in configs for pos, iface in enumerate(c['interfaces'])]
+        )
+
+    return len(configs)
+
+def form_to_config(router, form_data):
+    """Convert a wizard form submission into a router config dict"""
+    config = {col: form_data.get(col) for col in ROUTER_COLUMNS[1:]}
+    config['router'] = router
+    config['interfaces'] = []
+
+    n = 1
+    while f'interface{n}' in form_data:
+        if form_data.get(f'interface{n}') and form_data.get(f'interface{n}_ip'):
+            config['interfaces'].append({
+                'name': form_data.get(f'interface{n}'),
+                'ip': form_data.get(f'interface{n}_ip'),
+                'mask': form_data.get(f'interface{n}_mask'),
+                'area': form_data.get(f'interface{n}_area'),
+            })
+        n += 1
+
+    return config
 
 def save_router_config(router, form_data):
     """Save router configuration to database"""
-    with sqlite3.connect('ospf_config.db') as conn:
-        c = conn.cursor()
-        
-        c.execute('''INSERT OR REPLACE INTO router_configs VALUES 
-                    (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                (router,
-                form_data.get('hostname'),
-                form_data.get('ip_address'),
-                form_data.get('username'),
-                form_data.get('password'),
-                form_data.get('ospf_process_id'),
-                form_data.get('router_id'),
-                form_data.get('loopback_ip'),
-                form_data.get('loopback_mask'),
-                form_data.get('interface1'),
-                form_data.get('interface1_ip'),
-                form_data.get('interface1_mask'),
-                form_data.get('interface1_area'),
-                form_data.get('interface2', ''),
-                form_data.get('interface2_ip', ''),
-                form_data.get('interface2_mask', ''),
-                form_data.get('interface2_area', '')))
-        conn.commit()
+    upsert_routers([form_to_config(router, form_data)])
 
 def fetch_all_configs():
-    """Fetch all router configurations from database"""
-    with sqlite3.connect('ospf_config.db') as conn:
-        conn.row_factory = sqlite3.Row
-        c = conn.cursor()
-        c.execute('SELECT * FROM router_configs ORDER BY router')
-        rows = c.fetchall()
+    """Fetch all router configurations, each with its list of interfaces"""
+    conn = get_db()
+    routers = conn.execute(f'SELECT {", ".join(ROUTER_COLUMNS)} FROM routers ORDER BY router')
+    configs = {row[0]: dict(zip(ROUTER_COLUMNS, row), interfaces=[]) for row in routers}
+
+    interfaces = conn.execute('''SELECT router, name, ip_address, mask, area_id
+                                FROM interfaces ORDER BY router, position''')
+    for router, name, ip, mask, area in interfaces:
+        configs[router]['interfaces'].append({'name': name, 'ip': ip, 'mask': mask, 'area': area})
 
-    return rows
+    return list(configs.values())
 
 def get_router_template_data(router):
     """Returns router-specific configuration data for the template"""
@@ -221,102 +342,581 @@ def get_next_router(current):
     except ValueError:
         return None
 
-def ping_loopbacks_from_r1(configs):
-    """Ping all loopback IPs from R1"""
-    
-    r1_config = None
-    for config in configs:
-        if config['router'] == 'R1':
-            r1_config = config
+def expected_neighbors(configs):
+    """Map each router to the router IDs it should form an adjacency with"""
+    model = topology.Topology(configs)
+    return {config['router']: model.neighbor_ids(config['router']) for config in configs}
+
+def check_ospf_state(config, neighbor_ids, loopbacks):
+    """Poll one router for OSPF adjacencies and routes to the other loopbacks"""
+    commands = ["show ip ospf neighbor", "show ip route ospf"]
+
+    with sessionpool.session(
+        config['ip_address'],
+        config['username'],
+        config['password']
+    ) as device:
+        with metrics.span('ospf_state', config['ip_address']):
+            output = device.cli(commands)
+
+    # FULL, or 2WAY between two DROTHERs, is a settled adjacency
+    up = {nbr for nbr, state in OSPF_NEIGHBOR_RE.findall(output[commands[0]])
+          if state in ('FULL', '2WAY')}
+    # Collect every address in the table once rather than searching it per loopback
+    routed = set(IPV4_RE.findall(output[commands[1]]))
+
+    missing_neighbors = sorted(neighbor_ids - up)
+    missing_routes = [ip for ip in loopbacks if ip not in routed]
+
+    return {
+        'converged': not missing_neighbors and not missing_routes,
+        'missing_neighbors': missing_neighbors,
+        'missing_routes': missing_routes,
+    }
+
+def wait_for_convergence(configs, deadline=CONVERGENCE_DEADLINE, interval=CONVERGENCE_INTERVAL,
+                         progress=None, model=None):
+    """
+    Poll every router in parallel until the OSPF topology implied by the
+    stored configs is fully adjacent and every loopback it predicts is
+    routed, or the deadline passes. Routers that have converged are not
+    polled again.
+    """
+    model = model or topology.Topology(configs)
+    neighbors = {config['router']: model.neighbor_ids(config['router']) for config in configs}
+    loopbacks = {config['router']: config['loopback_ip'] for config in configs}
+    pending = {config['router']: config for config in configs}
+    state = {config['router']: {
+        'converged': False,
+        'elapsed': None,
+        'missing_neighbors': sorted(neighbors[config['router']]),
+        'missing_routes': [],
+        'error': None,
+    } for config in configs}
+
+    def poll(config):
+        routes = sorted(model.expected_routes(config['router']))
+        return check_ospf_state(config, neighbors[config['router']], [loopbacks[r] for r in routes])
+
+    start = time.monotonic()
+    while pending:
+        round_start = time.monotonic()
+        # Polls are repeated anyway, so don't retry them
+        futures = {scheduler.submit(config['ip_address'], poll, config, retries=0): router
+                   for router, config in pending.items()}
+
+        for future in as_completed(futures):
+            router = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                state[router]['error'] = str(e)
+                continue
+
+            state[router].update(result, error=None)
+            if result['converged']:
+                state[router]['elapsed'] = round(time.monotonic() - start, 2)
+                del pending[router]
+                jobs.report(progress, router, 'converged', elapsed=state[router]['elapsed'])
+
+        remaining = deadline - (time.monotonic() - start)
+        if not pending or remaining <= 0:
             break
-    
-    if not r1_config:
-        return {'success': False, 'results': [], 'error': 'R1 not found'}
-    
-    results = []
-    
+        time.sleep(min(remaining, max(0, interval - (time.monotonic() - round_start))))
+
+    return {
+        'converged': not pending,
+        'elapsed': round(time.monotonic() - start, 2),
+        'routers': state,
+    }
+
+def parse_ping(output):
+    """Parse IOS ping output into success rate and round-trip times (ms)"""
+    result = {'sent': 0, 'received': 0, 'loss': 1.0,
+              'rtt_min': None, 'rtt_avg': None, 'rtt_max': None}
+
+    rate = PING_RATE_RE.search(output)
+    if rate:
+        result['received'], result['sent'] = int(rate.group(2)), int(rate.group(3))
+        if result['sent']:
+            result['loss'] = 1 - result['received'] / result['sent']
+
+    rtt = PING_RTT_RE.search(output)
+    if rtt:
+        result['rtt_min'], result['rtt_avg'], result['rtt_max'] = (int(v) for v in rtt.groups())
+
+    return result
+
+def ping_loopbacks_from_source(source, configs, repeat=5, targets=None):
+    """
+    Ping every other router's loopback, or just the targets' if given, from
+    source in one batched CLI call
+    """
+    targets = [c for c in configs if c['router'] != source['router']
+               and (targets is None or c['router'] in targets)]
+    commands = [f"ping {c['loopback_ip']} repeat {repeat}" for c in targets]
+
     try:
-        driver = get_network_driver("ios")
-        device = driver(
-            hostname=r1_config['ip_address'],
-            username=r1_config['username'],
-            password=r1_config['password'],
+        with sessionpool.session(
+            source['ip_address'],
+            source['username'],
+            source['password'],
             optional_args={'read_timeout_override': 60}
+        ) as device:
+            with metrics.span('ping', source['ip_address']):
+                output = device.cli(commands)
+    except Exception as e:
+        return [{
+            'source': source['router'],
+            'router': c['router'],
+            'ip': c['loopback_ip'],
+            'status': 'Failed',
+            'error': str(e),
+        } for c in targets]
+
+    results = []
+    for config, cmd in zip(targets, commands):
+        ping = parse_ping(output[cmd])
+        results.append({
+            'source': source['router'],
+            'router': config['router'],
+            'ip': config['loopback_ip'],
+            'status': 'Success' if ping['sent'] and not ping['loss'] else 'Failed',
+            **ping,
+        })
+
+    return results
+
+def ping_loopback_matrix(configs, sources=None, repeat=5):
+    """
+    Ping every loopback from every source router (all routers by default).
+    Each source gets one batched CLI call, and all sources run in parallel.
+    """
+    sources = [c for c in configs if sources is None or c['router'] in sources]
+    if not sources:
+        return {'success': False, 'results': [], 'error': 'No source routers found'}
+
+    futures = [scheduler.submit(src['ip_address'], ping_loopbacks_from_source, src, configs, repeat)
+               for src in sources]
+    rows = [future.result() for future in futures]
+
+    return {'success': True, 'results': [r for source_rows in rows for r in source_rows]}
+
+def verify_reachability(configs, repeat=5, model=None):
+    """
+    Ping only the loopback pairs the topology model picks to cover its
+    predicted routes, in the same shape as ping_loopback_matrix. Pairs
+    naming a router that is not in configs are skipped.
+    """
+    model = model or topology.Topology(configs)
+    by_router = {config['router']: config for config in configs}
+
+    targets = {}
+    for source, target in model.probe_pairs():
+        if source in by_router and target in by_router:
+            targets.setdefault(source, set()).add(target)
+    if not targets:
+        return {'success': False, 'results': [], 'error': 'No routes to verify'}
+
+    futures = [scheduler.submit(by_router[source]['ip_address'], ping_loopbacks_from_source,
+                                by_router[source], configs, repeat, routers)
+               for source, routers in targets.items()]
+    rows = [future.result() for future in futures]
+
+    return {'success': True, 'results': [r for source_rows in rows for r in source_rows]}
+
+def ping_loopbacks_from_r1(configs):
+    """Ping all loopback IPs from R1"""
+    if not any(config['router'] == 'R1' for config in configs):
+        return {'success': False, 'results': [], 'error': 'R1 not found'}
+
+    return ping_loopback_matrix(configs, sources=['R1'])
+
+def ospf_intent(config):
+    """The OSPF state a router config asks for: process, router-id and network statements"""
+    # The loopback is advertised in the first interface's area
+    networks = [(config['loopback_ip'], '0.0.0.0', str(config['interfaces'][0]['area']))]
+    networks += [(iface['ip'], iface['mask'], str(iface['area'])) for iface in config['interfaces']]
+
+    return {
+        'ospf_process_id': int(config['ospf_process_id']),
+        'router_id': config['router_id'],
+        'networks': networks,
+    }
+
+def ospf_delta(applied, intent, replace=False):
+    """
+    The config lines that take a router from its last applied OSPF intent to
+    a new one. That is the whole stanza if nothing was applied yet, else
+    only the network statements that differ, removals first. Empty if
+    nothing changed.
+
+    A new process ID or router-id, or replace=True, removes the old process
+    and writes the whole stanza again. IOS only switches to a new router-id
+    once the process restarts, so setting it in place would not take effect.
+    """
+    if applied == intent and not replace:
+        return ""
+
+    process = intent['ospf_process_id']
+    if (replace or applied is None or applied['ospf_process_id'] != process
+            or applied['router_id'] != intent['router_id']):
+        lines = [] if applied is None else [f"no router ospf {applied['ospf_process_id']}"]
+        # Without a record, the process the device may already run is the one we want
+        if replace and (applied is None or applied['ospf_process_id'] != process):
+            lines.append(f"no router ospf {process}")
+        lines += [f"router ospf {process}", f" router-id {intent['router_id']}"]
+        lines += [f" network {ip} {mask} area {area}" for ip, mask, area in intent['networks']]
+        return "\n".join(lines) + "\n"
+
+    lines = [f"router ospf {process}"]
+    lines += [f" no network {ip} {mask} area {area}"
+              for ip, mask, area in applied['networks'] if (ip, mask, area) not in intent['networks']]
+    lines += [f" network {ip} {mask} area {area}"
+              for ip, mask, area in intent['networks'] if (ip, mask, area) not in applied['networks']]
+    return "\n".join(lines) + "\n"
+
+def render_ospf_config(config):
+    """Build the router ospf stanza for a router config"""
+    return ospf_delta(None, ospf_intent(config))
+
+def fetch_applied():
+    """The OSPF intent last applied to each router"""
+    rows = get_db().execute('SELECT router, ospf_process_id, router_id, networks FROM applied_ospf')
+    return {router: {
+        'ospf_process_id': process,
+        'router_id': router_id,
+        'networks': [tuple(network) for network in json.loads(networks)],
+    } for router, process, router_id, networks in rows}
+
+def save_applied(configs):
+    """
+    Record the OSPF intent of routers whose config was committed, in one
+    transaction. Their convergence is unknown until mark_converged().
+    """
+    now = time.time()
+    rows = []
+    for config in configs:
+        intent = ospf_intent(config)
+        rows.append((config['router'], intent['ospf_process_id'], intent['router_id'],
+                     json.dumps(intent['networks']), now))
+
+    conn = get_db()
+    with conn:
+        conn.executemany(
+            '''INSERT INTO applied_ospf VALUES (?, ?, ?, ?, ?, NULL)
+               ON CONFLICT (router) DO UPDATE SET
+               ospf_process_id = excluded.ospf_process_id, router_id = excluded.router_id,
+               networks = excluded.networks, applied_at = excluded.applied_at, converged_at = NULL''',
+            rows
         )
-        device.open()
-        
-        for config in configs:
-            if config['router'] != 'R1':
-                ping_cmd = f"ping {config['loopback_ip']} repeat 5"
-                output = device.cli([ping_cmd])[ping_cmd]
-                success = "100 percent" in output
-                
-                results.append({
-                    'router': config['router'],
-                    'ip': config['loopback_ip'],
-                    'status': 'Success' if success else 'Failed'
-                })
-        
-        device.close()
-        return {'success': True, 'results': results}
-        
+
+def mark_converged(routers):
+    """Record that routers reached their predicted adjacencies and routes"""
+    conn = get_db()
+    with conn:
+        conn.executemany('UPDATE applied_ospf SET converged_at = ? WHERE router = ?',
+                         [(time.time(), router) for router in routers])
+
+def plan_router(config):
+    """Load a router's OSPF config as a candidate and report the diff without committing"""
+    router = config['router']
+
+    try:
+        with sessionpool.session(
+            config['ip_address'],
+            config['username'],
+            config['password']
+        ) as device:
+            with metrics.span('load_candidate', config['ip_address']):
+                device.load_merge_candidate(config=render_ospf_config(config))
+            try:
+                with metrics.span('compare_config', config['ip_address']):
+                    diff = device.compare_config()
+            finally:
+                device.discard_config()
+
+        return {'router': router, 'changed': bool(diff.strip()), 'diff': diff, 'error': None}
+
     except Exception as e:
-        return {'success': False, 'results': [], 'error': str(e)}
+        return {'router': router, 'changed': None, 'diff': '', 'error': str(e)}
 
-def configure_single_router(config):
-    """Configure OSPF on a single router"""
+def plan_ospf(configs, progress=None):
+    """Dry run: compare every router's rendered OSPF config against the device in parallel"""
+    def run(config):
+        result = plan_router(config)
+        jobs.report(progress, config['router'], 'planned', changed=result['changed'])
+        return result
+
+    futures = scheduler.submit_all(lambda c: c['ip_address'], run, configs)
+    results = [future.result() for future in futures]
+
+    return {
+        'changed': [r['router'] for r in results if r['changed']],
+        'unchanged': [r['router'] for r in results if r['changed'] is False],
+        'errors': [r['router'] for r in results if r['error']],
+        'routers': results,
+    }
+
+def commit_router(config, device, ospf_config, progress=None):
+    """
+    Commit a candidate loaded by prepare_router() and hand the session back.
+    Returns True.
+    """
     router = config['router']
-    
+
     try:
-        with print_lock:
-            print(f"Configuring {router}...")
-        
-        # Configure with napalm
-        driver = get_network_driver("ios")
-        device = driver(
-            hostname=config['ip_address'],
-            username=config['username'],
-            password=config['password']
-        )
-        device.open()
-        
-        # Build OSPF configuration
-        ospf_config = (
-            f"router ospf {config['ospf_process_id']}\n"
-            f" router-id {config['router_id']}\n"
-            f" network {config['loopback_ip']} 0.0.0.0 area {config['interface1_area']}\n"
-            f" network {config['interface1_ip']} {config['interface1_mask']} area {config['interface1_area']}\n"
-        )
-        
-        # Add second interface if it exists
-        if config['interface2'] and config['interface2_ip']:
-            ospf_config += (
-                f" network {config['interface2_ip']} {config['interface2_mask']} "
-                f"area {config['interface2_area']}\n"
-            )
-        
-        with print_lock:
-            print(f"  Loading configuration for {router}...")
-        device.load_merge_candidate(config=ospf_config)
-        
         with print_lock:
             print(f"  Committing configuration for {router}...")
-        device.commit_config()
-        
-        device.close()
-        
-        with print_lock:
-            print(f"  ✓ {router} configured successfully\n")
-        
-        return {'router': router, 'success': True}
+        with metrics.span('commit', config['ip_address']):
+            device.commit_config()
+    except Exception:
+        sessionpool.pool.release(device, discard=True)
+        raise
+    sessionpool.pool.release(device)
+    factscache.cache.note_config(config['ip_address'], ospf_config)
+
+    with print_lock:
+        print(f"  ✓ {router} configured successfully\n")
+    jobs.report(progress, router, 'configured')
+
+    return True
+
+def push_ospf_config(config, progress=None, ospf_config=None):
+    """
+    Load a router's OSPF config, or just the ospf_config lines if given, and
+    commit it if the device config would change. The load and diff are
+    read-only and retried on transient errors like any scheduled task. The
+    commit is submitted with retries=0, since a commit that timed out may
+    still have been applied.
+
+    Returns a Future for True if a commit was made, False if nothing changed.
+    """
+    router = config['router']
+    jobs.report(progress, router, 'configuring')
+
+    with print_lock:
+        print(f"Configuring {router}...")
+
+    if ospf_config is None:
+        ospf_config = render_ospf_config(config)
+
+    result = Future()
+
+    def committed(future):
+        try:
+            result.set_result(future.result())
+        except BaseException as e:
+            result.set_exception(e)
+
+    def prepared(future):
+        try:
+            device = future.result()
+        except BaseException as e:
+            result.set_exception(e)
+            return
+        if device is None:
+            with print_lock:
+                print(f"  ✓ {router} already configured, nothing to commit\n")
+            result.set_result(False)
+            return
+        scheduler.submit(config['ip_address'], commit_router, config, device, ospf_config, progress,
+                         retries=0).add_done_callback(committed)
+
+    scheduler.submit(config['ip_address'], prepare_router, config, ospf_config,
+                     progress).add_done_callback(prepared)
+    return result
+
+def configure_result(config, future, progress=None):
+    """Wait for a push_ospf_config future and summarize its outcome"""
+    router = config['router']
+    
+    try:
+        changed = future.result()
+        return {'router': router, 'success': True, 'changed': changed}
         
     except Exception as e:
         with print_lock:
             print(f"  ✗ Error configuring {router}: {str(e)}\n")
-        return {'router': router, 'success': False}
+        jobs.report(progress, router, 'failed', error=str(e))
+        return {'router': router, 'success': False, 'changed': None}
+
+def configure_single_router(config, progress=None):
+    """Configure OSPF on a single router"""
+    future = push_ospf_config(config, progress)
+    return configure_result(config, future, progress)
+
+def prepare_router(config, ospf_config, progress=None):
+    """
+    First step of push_ospf_config() and phase one of a two-phase apply:
+    lease a session, load the candidate and diff it. The session stays
+    leased for the commit. Returns the device, or None if nothing would change.
+    """
+    router = config['router']
+    jobs.report(progress, router, 'preparing')
+
+    device = sessionpool.pool.acquire(config['ip_address'], config['username'], config['password'])
+    try:
+        with metrics.span('load_candidate', config['ip_address']):
+            device.load_merge_candidate(config=ospf_config)
+        with metrics.span('compare_config', config['ip_address']):
+            diff = device.compare_config()
+    except Exception:
+        sessionpool.pool.release(device, discard=True)
+        raise
 
-def configure_ospf(configs):
-    """Configure OSPF on the routers"""
+    if not diff.strip():
+        device.discard_config()
+        sessionpool.pool.release(device)
+        jobs.report(progress, router, 'unchanged')
+        return None
+
+    jobs.report(progress, router, 'prepared')
+    return device
+
+def commit_fleet(configs, deltas, progress=None):
+    """
+    Two-phase apply: load and diff candidates on every router in parallel,
+    then commit them together, so the fleet is half-configured only for the
+    length of one commit. Nothing is committed if any router fails to
+    prepare or the wave can't line up at the barrier. If a commit fails,
+    every router that committed or started to is rolled back in parallel.
+
+    Returns one result per router, as configure_result does.
+    """
+    by_router = {config['router']: config for config in configs}
+    results = {}
+    prepared = {}
+
+    # Phase one, through the scheduler like any other device work
+    futures = [scheduler.submit(config['ip_address'], prepare_router, config, deltas[config['router']],
+                                progress)
+               for config in configs]
+    for config, future in zip(configs, futures):
+        router = config['router']
+        try:
+            device = future.result()
+        except Exception as e:
+            with print_lock:
+                print(f"  ✗ Error preparing {router}: {str(e)}\n")
+            jobs.report(progress, router, 'failed', error=str(e))
+            results[router] = {'router': router, 'success': False, 'changed': None}
+            continue
+
+        if device is None:
+            results[router] = {'router': router, 'success': True, 'changed': False}
+        else:
+            prepared[router] = device
+
+    def release_all():
+        for device in prepared.values():
+            sessionpool.pool.release(device)
+
+    if any(not r['success'] for r in results.values()):
+        # Nothing is committed yet, dropping the candidates leaves the fleet as it was
+        for router, device in prepared.items():
+            try:
+                device.discard_config()
+            except Exception:
+                pass
+            jobs.report(progress, router, 'aborted')
+            results[router] = {'router': router, 'success': False, 'changed': False}
+        release_all()
+        print("ERROR: Not every router could be prepared, nothing was committed.\n")
+        return [results[config['router']] for config in configs]
+
+    # Phase two: the first wave waits at a barrier and commits at once
+    burst = min(len(prepared), COMMIT_BURST)
+    barrier = threading.Barrier(burst) if burst else None
+    failed = threading.Event()
+
+    def commit(index, router, device):
+        try:
+            if index < burst:
+                barrier.wait(COMMIT_BARRIER_TIMEOUT)
+        except Exception:
+            # A broken or timed out barrier means the wave won't commit together
+            failed.set()
+            return False
+        if failed.is_set():
+            return False
+        try:
+            with metrics.span('commit', by_router[router]['ip_address']):
+                device.commit_config()
+        except Exception:
+            failed.set()
+            raise
+        return True
+
+    print(f"Committing {len(prepared)} routers...\n")
+    with ThreadPoolExecutor(max_workers=burst or 1) as pool:
+        futures = {router: pool.submit(contextvars.copy_context().run, commit, index, router, device)
+                   for index, (router, device) in enumerate(prepared.items())}
+
+    committed = []
+    # Routers whose commit raised may have applied part of the candidate
+    partial = []
+    for router, future in futures.items():
+        try:
+            if future.result():
+                committed.append(router)
+                continue
+            results[router] = {'router': router, 'success': False, 'changed': False}
+            jobs.report(progress, router, 'aborted')
+        except Exception as e:
+            with print_lock:
+                print(f"  ✗ Error committing {router}: {str(e)}\n")
+            jobs.report(progress, router, 'failed', error=str(e))
+            results[router] = {'router': router, 'success': False, 'changed': None}
+            partial.append(router)
+
+        try:
+            prepared[router].discard_config()
+        except Exception:
+            pass
+
+    if not failed.is_set():
+        for router in committed:
+            jobs.report(progress, router, 'configured')
+            results[router] = {'router': router, 'success': True, 'changed': True}
+        release_all()
+        return [results[config['router']] for config in configs]
+
+    def rollback(router):
+        with metrics.span('rollback', by_router[router]['ip_address']):
+            prepared[router].rollback()
+
+    rolling_back = committed + partial
+    print(f"Rolling back {len(rolling_back)} committed routers...\n")
+    with ThreadPoolExecutor(max_workers=min(len(rolling_back), COMMIT_BURST) or 1) as pool:
+        futures = {router: pool.submit(contextvars.copy_context().run, rollback, router)
+                   for router in rolling_back}
+
+    for router, future in futures.items():
+        try:
+            future.result()
+            jobs.report(progress, router, 'rolled_back')
+            results[router] = {'router': router, 'success': False, 'changed': False}
+        except Exception as e:
+            with print_lock:
+                print(f"  ✗ Error rolling back {router}: {str(e)}\n")
+            jobs.report(progress, router, 'failed', error=f"rollback failed: {e}")
+            results[router] = {'router': router, 'success': False, 'changed': True}
+
+    release_all()
+    return [results[config['router']] for config in configs]
+
+def configure_ospf(configs, convergence_deadline=CONVERGENCE_DEADLINE, progress=None, full=False,
+                   two_phase=False):
+    """
+    Configure OSPF on the routers. Only the lines that changed since the
+    last commit are pushed, and only to routers with changes; pass full=True
+    to replace every router's whole stanza, e.g. after a device was changed
+    by hand. Each router's applied state is recorded as soon as its push
+    succeeds, and marked converged once the fleet reaches the predicted
+    adjacencies and routes. With two_phase=True the routers are committed
+    together or not at all, see commit_fleet().
+    """
     
     # Create PrettyTable for IP validation results
     ip_table = PrettyTable()
@@ -327,14 +927,70 @@ def configure_ospf(configs):
     print("VALIDATING IP ADDRESSES AND CHECKING REACHABILITY")
     print("="*80 + "\n")
     
+    applied = fetch_applied()
+    deltas = {config['router']: ospf_delta(applied.get(config['router']), ospf_intent(config), replace=full)
+              for config in configs}
+    pending = [config for config in configs if deltas[config['router']]]
+    needs_push = {config['router'] for config in pending}
+
+    by_ip = {}
+    for config in configs:
+        by_ip.setdefault(config['ip_address'], []).append(config)
+
+    # A router with changes gets its session opened and parked as soon as it
+    # answers a ping, while the rest of the fleet is still being checked. No
+    # session is opened until the address plan has passed; routers that
+    # answer before that are queued.
+    warming = {}
+    queued = []
+    plan_ok = None
+    warm_lock = threading.Lock()
+
+    def warm(config):
+        future = scheduler.submit(config['ip_address'], sessionpool.pool.warm, config['ip_address'],
+                                  config['username'], config['password'], retries=0)
+        with warm_lock:
+            warming[future] = config
+
+    def on_reachable(host, reachable):
+        for config in by_ip.get(host, ()):
+            jobs.report(progress, config['router'], 'validated', reachable=reachable)
+            if reachable and config['router'] in needs_push:
+                with warm_lock:
+                    if plan_ok is None:
+                        queued.append(config)
+                        continue
+                if plan_ok:
+                    warm(config)
+
+    # The whole plan is checked at once: bad addresses, duplicates, overlapping
+    # subnets and links split across areas. That runs in a thread while every
+    # management IP is pinged concurrently.
+    def check_plan():
+        nonlocal plan_ok
+        with metrics.span('validate_plan'):
+            problems = addressplan.validate_plan(configs)
+        with warm_lock:
+            plan_ok = not problems
+            ready = queued[:] if plan_ok else []
+        for config in ready:
+            warm(config)
+        return problems
+
+    with ThreadPoolExecutor(max_workers=1) as pool:
+        plan = pool.submit(contextvars.copy_context().run, check_plan)
+        with metrics.span('reachability'):
+            reach = connectivity.check_reachability(list(by_ip), on_result=on_reachable)
+        problems = plan.result()
+    invalid = {(p['router'], p['interface']) for p in problems}
+
     all_reachable = True
     
     for config in configs:
         router = config['router']
         
-        # Validate and check Management IP
-        mgmt_valid = validateIP.validate_ip(config['ip_address'])
-        reach = connectivity.check_reachability([config['ip_address']])
+        # Check Management IP
+        mgmt_valid = (router, 'Management') not in invalid
         mgmt_reachable = reach[config['ip_address']]
         
         ip_table.add_row([
@@ -349,8 +1005,8 @@ def configure_ospf(configs):
         if not mgmt_reachable:
             all_reachable = False
         
-        # Validate Loopback IP
-        loopback_valid = validateIP.validate_ip(config['loopback_ip'])
+        # Loopback IP
+        loopback_valid = (router, 'Loopback0') not in invalid
         ip_table.add_row([
             router,
             "Loopback0",
@@ -360,57 +1016,110 @@ def configure_ospf(configs):
             "N/A"
         ])
         
-        # Validate Interface 1 IP
-        int1_valid = validateIP.validate_ip(config['interface1_ip'])
-        ip_table.add_row([
-            router,
-            config['interface1'],
-            config['interface1_ip'],
-            config['interface1_mask'],
-            "✓" if int1_valid else "✗",
-            "N/A"
-        ])
-        
-        # Validate Interface 2 IP (if exists)
-        if config['interface2'] and config['interface2_ip']:
-            int2_valid = validateIP.validate_ip(config['interface2_ip'])
+        # Each interface IP
+        for iface in config['interfaces']:
+            iface_valid = (router, iface['name']) not in invalid
             ip_table.add_row([
                 router,
-                config['interface2'],
-                config['interface2_ip'],
-                config['interface2_mask'],
-                "✓" if int2_valid else "✗",
+                iface['name'],
+                iface['ip'],
+                iface['mask'],
+                "✓" if iface_valid else "✗",
                 "N/A"
             ])
     
     # Print the table
     print(ip_table)
     print("\n")
+
+    if problems:
+        problem_table = PrettyTable()
+        problem_table.field_names = ["Router", "Interface", "Problem"]
+        for p in problems:
+            problem_table.add_row([p['router'], p['interface'] or "-", p['error']])
+        print(problem_table)
+        print("\n")
+        print("ERROR: The address plan has problems. Cannot proceed with OSPF configuration.")
+        return False
     
     # Check if all management IPs are reachable before proceeding
     if not all_reachable:
+        # Drop the warm-ups that haven't started, the sessions already open are pooled
+        for future in list(warming):
+            future.cancel()
         print("ERROR: Not all routers are reachable. Cannot proceed with OSPF configuration.")
         return False
     
-    # Second pass: Configure OSPF on each router using ThreadPoolExecutor
+    # Predict the adjacencies and routes convergence should reach, from the
+    # configs being applied rather than whatever another request synced
+    model = topology.Topology(configs)
+    print(f"Predicted topology: {len(model.links())} links, {len(model.areas())} area(s), "
+          f"ABRs: {', '.join(model.abrs()) or 'none'}\n")
+
+    # Second pass: Configure OSPF on each router through the device scheduler
     print("="*80)
     print("CONFIGURING OSPF ON ROUTERS (PARALLEL)")
     print("="*80 + "\n")
     
-    # Use executor.map() - much simpler!
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        results = list(executor.map(configure_single_router, configs))
+    print(f"{len(pending)} of {len(configs)} routers have OSPF changes to push\n")
+
+    results = []
+    for config in configs:
+        if not deltas[config['router']]:
+            jobs.report(progress, config['router'], 'unchanged')
+            results.append({'router': config['router'], 'success': True, 'changed': False})
+
+    # The devices run what was committed whatever convergence shows, so
+    # each router's intent is recorded as soon as its push succeeds
+    by_router = {config['router']: config for config in pending}
+    if two_phase:
+        # Phase one leases every session at once, let the warm-ups finish first
+        wait(warming)
+        pushed = commit_fleet(pending, deltas, progress)
+        save_applied([by_router[r['router']] for r in pushed if r['success']])
+    else:
+        # Each push starts as soon as its router's session is warm
+        futures = {}
+        for future in as_completed(warming):
+            config = warming[future]
+            futures[push_ospf_config(config, progress, deltas[config['router']])] = config
+        pushed = []
+        for future in as_completed(futures):
+            result = configure_result(futures[future], future, progress)
+            if result['success']:
+                save_applied([futures[future]])
+            pushed.append(result)
+    results += pushed
     
     # Check if all succeeded
     all_success = all(r['success'] for r in results)
 
-    if all_success:
+    if all_success and not any(r['changed'] for r in results):
+        print("No router configs changed, skipping convergence wait\n")
+    elif all_success:
         # Wait for OSPF convergence
         print("Waiting for OSPF convergence...", end="", flush=True)
-        time.sleep(60)  # Wait 30 seconds
-        print(" Done!\n")
+        with metrics.span('convergence'):
+            convergence = wait_for_convergence(configs, deadline=convergence_deadline, progress=progress,
+                                               model=model)
+        print(" Done!\n" if convergence['converged'] else " Timed out!\n")
+
+        conv_table = PrettyTable()
+        conv_table.field_names = ["Router", "Converged", "Time (s)", "Missing Neighbors", "Missing Routes"]
+        for router, state in sorted(convergence['routers'].items()):
+            conv_table.add_row([
+                router,
+                "✓" if state['converged'] else "✗",
+                state['elapsed'] if state['elapsed'] is not None else "N/A",
+                ", ".join(state['missing_neighbors']) or "-",
+                ", ".join(state['missing_routes']) or "-",
+            ])
+        print(conv_table)
+        print("\n")
+
+        mark_converged(router for router, state in convergence['routers'].items() if state['converged'])
+        all_success = convergence['converged']
 
-    
     print("="*80)
     print("OSPF CONFIGURATION COMPLETE")
     print("="*80 + "\n")
@@ -0,0 +1,63 @@
+import copy
+import unittest
+
+from bench import run
+from tools import addressplan
+
+
+class ValidatePlanTest(unittest.TestCase):
+
+    def setUp(self):
+        self.configs = copy.deepcopy(run.build_configs(4))
+
+    def problems(self):
+        return {(p['router'], p['interface']): p['error'] for p in addressplan.validate_plan(self.configs)}
+
+    def test_consistent_plan(self):
+        self.assertEqual(addressplan.validate_plan(self.configs), [])
+
+    def test_duplicate_address(self):
+        self.configs[1]['interfaces'][0]['ip'] = self.configs[0]['interfaces'][0]['ip']
+
+        self.assertIn("already used by R1", self.problems()[('R2', 'FastEthernet0/0')])
+
+    def test_duplicate_router_id(self):
+        self.configs[1]['router_id'] = self.configs[0]['router_id']
+
+        self.assertIn("router-id", self.problems()[('R2', None)])
+
+    def test_invalid_mask(self):
+        self.configs[1]['interfaces'][0]['mask'] = '255.0.255.0'
+
+        self.assertEqual(self.problems(), {('R2', 'FastEthernet0/0'): "invalid mask 255.0.255.0"})
+
+    def test_link_split_across_areas(self):
+        self.configs[1]['interfaces'][1]['area'] = 1
+        problems = self.problems()
+
+        self.assertIn("areas 0, 1", problems[('R1', 'FastEthernet0/0')])
+        self.assertIn("areas 0, 1", problems[('R2', 'FastEthernet1/0')])
+
+    def test_area_spellings_are_the_same_area(self):
+        self.configs[0]['interfaces'][0]['area'] = '0.0.0.0'
+        self.configs[1]['interfaces'][1]['area'] = 0
+
+        self.assertEqual(addressplan.validate_plan(self.configs), [])
+
+    def test_invalid_area(self):
+        self.configs[1]['interfaces'][0]['area'] = 'backbone'
+
+        self.assertEqual(self.problems(), {('R2', 'FastEthernet0/0'): "invalid area backbone"})
+
+    def test_area_id(self):
+        self.assertEqual([addressplan.area_id(area) for area in (0, '0', '0.0.0.0', '0.0.1.1', '', 'x')],
+                         [0, 0, 0, 257, None, None])
+
+    def test_overlapping_subnets(self):
+        self.configs[1]['interfaces'][0].update(ip='172.16.0.2', mask='255.255.255.0')
+
+        self.assertIn("overlaps 172.16.0.0/24", self.problems()[('R3', 'FastEthernet1/0')])
+
+
+if __name__ == '__main__':
+    unittest.main()
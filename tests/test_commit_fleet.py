@@ -0,0 +1,216 @@
+import contextlib
+import io
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import ospfconfig
+from bench import fakeios, run
+
+
+def instant_profile():
+    return fakeios.Profile(open=0, cli=0, cli_per_command=0, get_config=0, get_facts=0, commit=0,
+                           config_lines=10, drift=0, jitter=0)
+
+
+class SimulatedFleetTest(unittest.TestCase):
+    """Runs against the simulated fleet from bench"""
+
+    def setUp(self):
+        self.configs = run.build_configs(6)
+        self.fleet = run.build_fleet(self.configs, instant_profile())
+        self.deltas = {config['router']: ospfconfig.render_ospf_config(config) for config in self.configs}
+        self.ips = {config['router']: config['ip_address'] for config in self.configs}
+        self.rolled_back = []
+
+        stack = contextlib.ExitStack()
+        self.addCleanup(stack.close)
+        root = stack.enter_context(tempfile.TemporaryDirectory())
+        stack.enter_context(run.simulated(root, self.fleet))
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+
+        lock = threading.Lock()
+
+        def rollback(driver):
+            with lock:
+                self.rolled_back.append(driver.hostname)
+        stack.enter_context(mock.patch.object(fakeios.BenchIOSDriver, 'rollback', rollback))
+
+    def fail_on(self, method, router):
+        """Make one router's driver method raise"""
+        original = getattr(fakeios.BenchIOSDriver, method)
+        ip = self.ips[router]
+
+        def patched(driver, *args, **kwargs):
+            if driver.hostname == ip:
+                raise RuntimeError(f"{method} failed")
+            return original(driver, *args, **kwargs)
+        patcher = mock.patch.object(fakeios.BenchIOSDriver, method, patched)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class CommitFleetTest(SimulatedFleetTest):
+    """commit_fleet against the simulated fleet from bench"""
+
+    def commit(self):
+        progress = mock.Mock()
+        results = ospfconfig.commit_fleet(self.configs, self.deltas, progress)
+        statuses = {}
+        for call in progress.call_args_list:
+            statuses[call.args[0]] = call.args[1]
+        return {r['router']: r for r in results}, statuses
+
+    def test_all_commit(self):
+        results, statuses = self.commit()
+
+        self.assertTrue(all(r['success'] and r['changed'] for r in results.values()))
+        self.assertEqual(self.fleet.commits, len(self.configs))
+        self.assertEqual(set(statuses.values()), {'configured'})
+        self.assertEqual(self.rolled_back, [])
+
+    def test_unchanged_routers_are_not_committed(self):
+        self.commit()
+        results, statuses = self.commit()
+
+        self.assertTrue(all(r['success'] and not r['changed'] for r in results.values()))
+        self.assertEqual(self.fleet.commits, len(self.configs))
+        self.assertEqual(set(statuses.values()), {'unchanged'})
+
+    def test_prepare_failure_commits_nothing(self):
+        self.fail_on('compare_config', 'R3')
+        results, statuses = self.commit()
+
+        self.assertEqual(self.fleet.commits, 0)
+        self.assertFalse(any(r['success'] for r in results.values()))
+        self.assertEqual(statuses['R3'], 'failed')
+        self.assertEqual({statuses[r] for r in results if r != 'R3'}, {'aborted'})
+        self.assertEqual(self.rolled_back, [])
+
+    def test_commit_failure_rolls_back_committed_and_partial(self):
+        self.fail_on('commit_config', 'R2')
+        results, statuses = self.commit()
+
+        self.assertFalse(any(r['success'] for r in results.values()))
+        # Every router still changed afterwards was either never committed or rolled back
+        committed = {router for router, status in statuses.items() if status == 'rolled_back'}
+        self.assertIn('R2', committed)
+        self.assertEqual(sorted(self.rolled_back), sorted(self.ips[router] for router in committed))
+        self.assertTrue(all(statuses[router] in ('aborted', 'rolled_back') for router in results))
+
+    def test_broken_barrier_commits_nothing(self):
+        class BrokenBarrier:
+            def __init__(self, parties):
+                pass
+
+            def wait(self, timeout=None):
+                raise threading.BrokenBarrierError
+
+        with mock.patch.object(ospfconfig.threading, 'Barrier', BrokenBarrier):
+            results, statuses = self.commit()
+
+        self.assertEqual(self.fleet.commits, 0)
+        self.assertFalse(any(r['success'] for r in results.values()))
+        self.assertEqual(set(statuses.values()), {'aborted'})
+        self.assertEqual(self.rolled_back, [])
+
+
+class PushOspfConfigTest(SimulatedFleetTest):
+    """Single-phase pushes, each a retried load and diff followed by one commit"""
+
+    def setUp(self):
+        super().setUp()
+        ospfconfig.scheduler.scheduler.backoff = 0.01
+        self.config = self.configs[0]
+        self.calls = []
+
+    def flaky(self, method, times, exc=TimeoutError):
+        """Make R1's driver method raise a transient error on its first calls"""
+        original = getattr(fakeios.BenchIOSDriver, method)
+
+        def patched(driver, *args, **kwargs):
+            if driver.hostname == self.config['ip_address']:
+                self.calls.append(method)
+                if self.calls.count(method) <= times:
+                    raise exc(f"{method} timed out")
+            return original(driver, *args, **kwargs)
+        patcher = mock.patch.object(fakeios.BenchIOSDriver, method, patched)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_push_then_unchanged(self):
+        self.assertTrue(ospfconfig.push_ospf_config(self.config).result(timeout=10))
+        self.assertFalse(ospfconfig.push_ospf_config(self.config).result(timeout=10))
+        self.assertEqual(self.fleet.commits, 1)
+
+    def test_diff_is_retried(self):
+        self.flaky('compare_config', 1)
+
+        self.assertTrue(ospfconfig.push_ospf_config(self.config).result(timeout=10))
+        self.assertEqual(self.calls, ['compare_config', 'compare_config'])
+        self.assertEqual(self.fleet.commits, 1)
+
+    def test_commit_is_not_retried(self):
+        self.flaky('commit_config', 1)
+
+        with self.assertRaises(TimeoutError):
+            ospfconfig.push_ospf_config(self.config).result(timeout=10)
+        self.assertEqual(self.calls, ['commit_config'])
+        self.assertEqual(ospfconfig.sessionpool.pool.stats()['leased'], 0)
+
+
+class AppliedStateTest(SimulatedFleetTest):
+    """configure_ospf records each router's intent when its push succeeds"""
+
+    def applied(self):
+        rows = ospfconfig.get_db().execute('SELECT router, applied_at, converged_at FROM applied_ospf')
+        return {router: (applied_at, converged_at) for router, applied_at, converged_at in rows}
+
+    def test_converged_fleet(self):
+        for two_phase in (False, True):
+            with self.subTest(two_phase=two_phase):
+                ospfconfig.get_db().execute('DELETE FROM applied_ospf')
+                self.fleet = run.build_fleet(self.configs, instant_profile())
+                fakeios.install(self.fleet)
+
+                self.assertTrue(ospfconfig.configure_ospf(self.configs, two_phase=two_phase))
+                applied = self.applied()
+                self.assertEqual(sorted(applied), sorted(self.ips))
+                self.assertTrue(all(converged_at for _, converged_at in applied.values()))
+
+    def test_failed_push_keeps_the_others(self):
+        self.fail_on('commit_config', 'R2')
+
+        self.assertFalse(ospfconfig.configure_ospf(self.configs, convergence_deadline=1))
+        applied = self.applied()
+        # The other routers run what was committed, but nobody waited for convergence
+        self.assertEqual(sorted(applied), sorted(router for router in self.ips if router != 'R2'))
+        self.assertTrue(all(converged_at is None for _, converged_at in applied.values()))
+        self.assertEqual(set(ospfconfig.fetch_applied()['R1']['networks']),
+                         set(ospfconfig.ospf_intent(self.configs[0])['networks']))
+
+    def test_new_push_clears_convergence(self):
+        ospfconfig.save_applied(self.configs[:2])
+        ospfconfig.mark_converged(['R1', 'R2'])
+        ospfconfig.save_applied(self.configs[:1])
+
+        applied = self.applied()
+        self.assertIsNone(applied['R1'][1])
+        self.assertIsNotNone(applied['R2'][1])
+
+    def test_init_db_adds_the_convergence_column(self):
+        conn = ospfconfig.get_db()
+        with conn:
+            conn.execute('DROP TABLE applied_ospf')
+            conn.execute('''CREATE TABLE applied_ospf (router TEXT PRIMARY KEY, ospf_process_id INTEGER,
+                            router_id TEXT, networks TEXT, applied_at REAL)''')
+        ospfconfig.init_db()
+
+        ospfconfig.save_applied(self.configs[:1])
+        ospfconfig.mark_converged(['R1'])
+        self.assertIsNotNone(self.applied()['R1'][1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+
+from tools import configdiff
+
+CONFIG = """hostname R1
+!
+interface FastEthernet0/0
+ ip address 10.0.0.1 255.255.255.252
+ no shutdown
+!
+router ospf 1
+ network 10.0.0.0 0.0.0.3 area 0
+!
+banner motd ^C
+Authorized access only
+^C
+line vty 0 4
+ login
+"""
+
+
+class SplitSectionsTest(unittest.TestCase):
+
+    def test_sections(self):
+        sections = configdiff.split_sections(CONFIG)
+
+        self.assertEqual(list(sections), ["hostname R1", "interface FastEthernet0/0", "router ospf 1",
+                                          "banner motd ^C", "line vty 0 4"])
+        self.assertEqual(sections["interface FastEthernet0/0"][1:],
+                         [" ip address 10.0.0.1 255.255.255.252", " no shutdown"])
+
+    def test_multi_line_banner_kept_together(self):
+        self.assertEqual(configdiff.split_sections(CONFIG)["banner motd ^C"],
+                         ["banner motd ^C", "Authorized access only", "^C"])
+
+    def test_repeated_top_level_lines(self):
+        sections = configdiff.split_sections("ip route 0.0.0.0 0.0.0.0 10.0.0.2\n" * 2)
+
+        self.assertEqual(list(sections), ["ip route 0.0.0.0 0.0.0.0 10.0.0.2",
+                                          "ip route 0.0.0.0 0.0.0.0 10.0.0.2 #2"])
+
+
+class DiffConfigsTest(unittest.TestCase):
+
+    def test_identical(self):
+        self.assertEqual(configdiff.diff_configs(CONFIG, CONFIG), "")
+        self.assertEqual(configdiff.diff_configs("ignored", CONFIG, old_digest=configdiff.digest(CONFIG)), "")
+
+    def test_only_separators_changed(self):
+        self.assertEqual(configdiff.diff_configs(CONFIG, CONFIG.replace("!\n", "")), "")
+
+    def test_changed_section_only(self):
+        new = CONFIG.replace(" no shutdown", " shutdown")
+        diff = configdiff.diff_configs(CONFIG, new, "before", "after")
+
+        self.assertEqual(diff, "--- before\n+++ after\n"
+                               "@@ interface FastEthernet0/0 @@\n"
+                               " interface FastEthernet0/0\n"
+                               "  ip address 10.0.0.1 255.255.255.252\n"
+                               "- no shutdown\n"
+                               "+ shutdown\n")
+
+    def test_added_and_removed_sections(self):
+        new = CONFIG.replace("router ospf 1\n network 10.0.0.0 0.0.0.3 area 0\n", "") + "ntp server 10.0.0.9\n"
+        diff = configdiff.diff_configs(CONFIG, new)
+
+        self.assertIn("@@ router ospf 1 @@\n-router ospf 1\n- network 10.0.0.0 0.0.0.3 area 0\n", diff)
+        self.assertIn("@@ ntp server 10.0.0.9 @@\n+ntp server 10.0.0.9\n", diff)
+        # Removed sections are shown where they were
+        self.assertLess(diff.index("router ospf 1"), diff.index("ntp server"))
+
+
+if __name__ == '__main__':
+    unittest.main()
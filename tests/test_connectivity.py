@@ -0,0 +1,47 @@
+import resource
+import unittest
+from unittest import mock
+
+from tools import connectivity
+
+
+class ExpandHostsTest(unittest.TestCase):
+
+    def test_prefixes_and_duplicates(self):
+        self.assertEqual(connectivity.expand_hosts(["10.0.0.1", "10.0.0.0/30", "10.0.0.2", "10.0.0.9/32"]),
+                         ["10.0.0.1", "10.0.0.2", "10.0.0.9"])
+
+    def test_slash_22_is_one_sweep(self):
+        self.assertLessEqual(len(connectivity.expand_hosts(["10.0.4.0/22"])), connectivity.MAX_CONCURRENCY)
+
+
+class RaiseFdLimitTest(unittest.TestCase):
+    """raise_fd_limit against a fake limit, the process's own is left alone"""
+
+    def limits(self, soft, hard):
+        self.set = []
+        self.addCleanup(mock.patch.stopall)
+        mock.patch.object(connectivity.resource, 'getrlimit', return_value=(soft, hard)).start()
+        mock.patch.object(connectivity.resource, 'setrlimit',
+                          lambda kind, limits: self.set.append(limits)).start()
+
+    def test_raises_soft_limit_to_fit(self):
+        self.limits(256, 100000)
+
+        self.assertEqual(connectivity.raise_fd_limit(1000), 1000)
+        self.assertEqual(self.set, [(1000 * connectivity.FDS_PER_PROBE + connectivity.RESERVED_FDS, 100000)])
+
+    def test_capped_by_hard_limit(self):
+        self.limits(256, connectivity.RESERVED_FDS + 10 * connectivity.FDS_PER_PROBE)
+
+        self.assertEqual(connectivity.raise_fd_limit(1000), 10)
+
+    def test_high_enough_already(self):
+        self.limits(resource.RLIM_INFINITY, resource.RLIM_INFINITY)
+
+        self.assertEqual(connectivity.raise_fd_limit(1000), 1000)
+        self.assertEqual(self.set, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import time
+import unittest
+from collections import deque
+
+from tools import countersampler
+
+
+class CounterDeltaTest(unittest.TestCase):
+
+    def test_increase(self):
+        self.assertEqual(countersampler.counter_delta(100, 250), 150)
+
+    def test_32_bit_wrap(self):
+        self.assertEqual(countersampler.counter_delta(2 ** 32 - 10, 5), 15)
+
+    def test_64_bit_wrap(self):
+        self.assertEqual(countersampler.counter_delta(2 ** 64 - 10, 5), 15)
+
+
+class RatesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sampler = countersampler.CounterSampler(interval=1, max_age=2)
+
+    def record(self, *samples):
+        now = time.monotonic()
+        self.sampler._series[('r1', 'Fa0/0')] = deque(
+            (now - age, {'rx_unicast_packets': rx, 'tx_unicast_packets': tx, 'rx_octets': rx * 100})
+            for age, rx, tx in samples)
+
+    def test_rates(self):
+        self.record((4, 0, 0), (2, 20, 200), (0, 40, 400))
+        rates = self.sampler.rates('r1', 'Fa0/0')
+
+        self.assertAlmostEqual(rates['rx_pps'], 10, places=3)
+        self.assertAlmostEqual(rates['tx_pps'], 100, places=3)
+        self.assertAlmostEqual(rates['rx_bps'], 8000, places=0)
+        self.assertTrue(self.sampler.is_idle('r1', 'Fa0/0', pps=200))
+        self.assertFalse(self.sampler.is_idle('r1', 'Fa0/0', pps=50))
+
+    def test_window_is_measured_from_now(self):
+        self.record((4, 0, 0), (1.5, 1000, 0), (0.5, 1000, 0))
+        rates = self.sampler.rates('r1', 'Fa0/0', window=2)
+
+        self.assertEqual(rates['rx_pps'], 0)
+
+    def test_stale_samples_are_unknown(self):
+        self.record((10, 0, 0), (8, 0, 0))
+
+        self.assertIsNone(self.sampler.rates('r1', 'Fa0/0'))
+        self.assertIsNone(self.sampler.is_idle('r1', 'Fa0/0'))
+
+    def test_no_samples(self):
+        self.assertIsNone(self.sampler.rates('r1', 'Fa0/0'))
+
+
+if __name__ == '__main__':
+    unittest.main()
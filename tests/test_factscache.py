@@ -0,0 +1,108 @@
+import json
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from tools import factscache
+from tools.factscache import FactsCache
+
+FACTS = {'hostname': 'R1', 'fqdn': 'R1.lab', 'uptime': 100}
+
+
+class HostnameFromConfigTest(unittest.TestCase):
+
+    def test_top_level_hostname(self):
+        self.assertEqual(factscache.hostname_from_config("!\nversion 15.2\nhostname R1\n!\n"), 'R1')
+
+    def test_no_hostname(self):
+        self.assertIsNone(factscache.hostname_from_config(" hostname indented\n"))
+        self.assertIsNone(factscache.hostname_from_config(None))
+
+
+class FactsCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = FactsCache(ttl=60)
+        self.device = mock.Mock()
+        self.device.get_facts.return_value = dict(FACTS)
+
+    def test_facts_are_fetched_once(self):
+        self.assertEqual(self.cache.facts('10.0.0.1', self.device), FACTS)
+        self.assertEqual(self.cache.facts('10.0.0.1', self.device), FACTS)
+        self.device.get_facts.assert_called_once()
+
+    def test_entries_expire(self):
+        self.cache.put('10.0.0.1', FACTS)
+        with mock.patch.object(factscache.time, 'time', return_value=time.time() + 61):
+            self.assertIsNone(self.cache.get('10.0.0.1'))
+
+    def test_invalidate(self):
+        self.cache.put('10.0.0.1', FACTS)
+        self.cache.invalidate('10.0.0.1')
+        self.assertIsNone(self.cache.get('10.0.0.1'))
+
+    def test_note_config_with_new_hostname_drops_other_facts(self):
+        self.cache.put('10.0.0.1', FACTS)
+
+        self.assertEqual(self.cache.note_config('10.0.0.1', "hostname R1-core\n"), 'R1-core')
+        self.assertIsNone(self.cache.get('10.0.0.1'))
+        self.assertEqual(self.cache.get('10.0.0.1', complete=False), {'hostname': 'R1-core'})
+
+    def test_note_config_with_same_hostname_keeps_facts(self):
+        self.cache.put('10.0.0.1', FACTS)
+
+        self.cache.note_config('10.0.0.1', "hostname R1\n")
+        self.assertEqual(self.cache.get('10.0.0.1'), FACTS)
+        self.assertIsNone(self.cache.note_config('10.0.0.1', "interface Gi0/0\n"))
+
+    def test_hostname_without_get_facts(self):
+        self.assertEqual(self.cache.hostname('10.0.0.1', self.device, "hostname R9\n"), 'R9')
+        self.assertEqual(self.cache.hostname('10.0.0.1', self.device), 'R9')
+        self.device.get_facts.assert_not_called()
+
+    def test_hostname_falls_back_to_get_facts(self):
+        self.assertEqual(self.cache.hostname('10.0.0.1', self.device, "interface Gi0/0\n"), 'R1')
+        self.device.get_facts.assert_called_once()
+
+
+class PersistedFactsCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / "facts.json"
+
+    def test_survives_a_restart(self):
+        cache = FactsCache(path=self.path)
+        cache.put('10.0.0.1', FACTS)
+        cache.note_config('10.0.0.2', "hostname R2\n")
+        cache.flush()
+
+        reloaded = FactsCache(path=self.path)
+        self.assertEqual(reloaded.get('10.0.0.1'), FACTS)
+        self.assertIsNone(reloaded.get('10.0.0.2'))
+        self.assertEqual(reloaded.get('10.0.0.2', complete=False), {'hostname': 'R2'})
+
+    def test_writes_are_batched(self):
+        cache = FactsCache(path=self.path)
+        cache.put('10.0.0.1', FACTS)
+        cache.put('10.0.0.2', FACTS)
+        self.assertEqual(list(json.loads(self.path.read_text())), ['10.0.0.1'])
+
+        cache.flush()
+        self.assertEqual(sorted(json.loads(self.path.read_text())), ['10.0.0.1', '10.0.0.2'])
+
+    def test_corrupt_file_starts_empty(self):
+        self.path.write_text("{not json")
+        cache = FactsCache(path=self.path)
+
+        with mock.patch('builtins.print'):
+            self.assertIsNone(cache.get('10.0.0.1'))
+        cache.put('10.0.0.1', FACTS)
+        self.assertEqual(cache.get('10.0.0.1'), FACTS)
+
+
+if __name__ == '__main__':
+    unittest.main()
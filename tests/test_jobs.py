@@ -0,0 +1,137 @@
+import contextlib
+import io
+import json
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+import lab4main
+from bench import fakeios, run
+from tools import jobs
+
+
+def wait_done(job, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not job.done and time.monotonic() < deadline:
+        job.wait_events(len(job.events), 0.1)
+    return job.done
+
+
+class JobManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.manager = jobs.JobManager(max_workers=2, max_finished=3)
+
+    def test_result_and_progress(self):
+        def work(count, progress=None):
+            for i in range(count):
+                jobs.report(progress, f"R{i}", 'done', result=i)
+            return count
+
+        job = self.manager.submit('test', work, 2)
+
+        self.assertTrue(wait_done(job))
+        self.assertEqual((job.status, job.result), ('done', 2))
+        self.assertEqual([(e['device'], e['status']) for e in job.events],
+                         [(None, 'started'), ('R0', 'done'), ('R1', 'done'), (None, 'done')])
+        self.assertEqual(job.events[1]['result'], 0)
+
+    def test_failure(self):
+        def work(progress=None):
+            raise ValueError("no routers")
+
+        job = self.manager.submit('test', work)
+
+        self.assertTrue(wait_done(job))
+        self.assertEqual((job.status, job.error), ('failed', "no routers"))
+        self.assertEqual(job.events[-1]['status'], 'failed')
+
+    def test_stream_resumes_and_ends(self):
+        release = threading.Event()
+
+        def work(progress=None):
+            progress('R1', 'running')
+            release.wait(5)
+            return 'ok'
+
+        job = self.manager.submit('test', work)
+        threading.Timer(0.1, release.set).start()
+        chunks = list(self.manager.stream(job.id, since=1, heartbeat=0.05))
+
+        self.assertTrue(chunks[0].startswith("id: 1\nevent: progress\n"))
+        self.assertTrue(chunks[-1].startswith("event: end\n"))
+        self.assertEqual(json.loads(chunks[-1].split("data: ", 1)[1])['result'], 'ok')
+        self.assertEqual(list(self.manager.stream('missing')), [])
+
+    def test_finished_jobs_are_pruned(self):
+        finished = [self.manager.submit('test', lambda progress=None: None) for _ in range(5)]
+        for job in finished:
+            wait_done(job)
+        self.manager.submit('test', lambda progress=None: None)
+
+        self.assertIsNone(self.manager.get(finished[0].id))
+        self.assertIsNotNone(self.manager.get(finished[-1].id))
+
+
+class JobRoutesTest(unittest.TestCase):
+    """Long routes hand their work to a job instead of running it in the request"""
+
+    def setUp(self):
+        configs = run.build_configs(4)
+        profile = fakeios.Profile(open=0, cli=0, cli_per_command=0, get_config=0, get_facts=0, commit=0,
+                                  config_lines=10, drift=0, jitter=0)
+
+        stack = contextlib.ExitStack()
+        self.addCleanup(stack.close)
+        root = stack.enter_context(tempfile.TemporaryDirectory())
+        (Path(root) / "config").mkdir()
+        (Path(root) / "config" / "sshInfo.json").write_text(json.dumps({'routers': [
+            {'host': c['ip_address'], 'username': c['username'], 'password': c['password']} for c in configs]}))
+        stack.enter_context(run.simulated(root, run.build_fleet(configs, profile)))
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+
+        self.client = lab4main.create_app().test_client()
+
+    def start(self, path, method='GET'):
+        response = self.client.open(path, method=method, headers={'Accept': 'application/json'})
+        self.assertEqual(response.status_code, 202)
+        job = jobs.manager.get(response.json['id'])
+        self.assertTrue(wait_done(job))
+        return response.json, job
+
+    def test_get_config_runs_as_job(self):
+        links, job = self.start('/get_config')
+
+        self.assertEqual(job.kind, 'get_config')
+        self.assertEqual(len(job.result), 4)
+        page = self.client.get(links['view_url'])
+        self.assertEqual(page.status_code, 200)
+        self.assertIn(job.result[0], page.get_data(as_text=True))
+
+    def test_diff_config_view(self):
+        self.start('/get_config')
+        links, job = self.start('/diff_config')
+
+        self.assertEqual(job.status, 'done')
+        self.assertIn("No changes detected", self.client.get(links['view_url']).get_data(as_text=True))
+
+    def test_browser_gets_progress_page(self):
+        response = self.client.get('/get_config', headers={'Accept': 'text/html'})
+
+        self.assertEqual(response.status_code, 202)
+        page = response.get_data(as_text=True)
+        self.assertIn("EventSource", page)
+        wait_done(jobs.manager.list()[0])
+
+    def test_failed_job_view_shows_error(self):
+        # No routers are stored, so the job fails
+        links, job = self.start('/jobs/apply_ospf_config', method='POST')
+
+        self.assertEqual(job.status, 'failed')
+        self.assertIn("Not all routers configured", self.client.get(links['view_url']).get_data(as_text=True))
+
+
+if __name__ == '__main__':
+    unittest.main()
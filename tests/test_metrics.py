@@ -0,0 +1,100 @@
+import contextvars
+import threading
+import unittest
+from unittest import mock
+
+from tools import metrics
+from tools.metrics import Registry
+
+
+class RegistryTest(unittest.TestCase):
+
+    def test_counter_and_gauge(self):
+        registry = Registry()
+        registry.inc('jobs_total', kind='get_config')
+        registry.inc('jobs_total', 2, kind='get_config')
+        registry.set('sessions', 3, help="Open sessions")
+
+        self.assertEqual(registry.render(),
+                         "# HELP jobs_total jobs_total\n"
+                         "# TYPE jobs_total counter\n"
+                         'jobs_total{kind="get_config"} 3\n'
+                         "# HELP sessions Open sessions\n"
+                         "# TYPE sessions gauge\n"
+                         "sessions 3\n")
+
+    def test_histogram_buckets_are_cumulative(self):
+        registry = Registry()
+        for value in (0.003, 0.02, 100, 1000):
+            registry.observe('stage_seconds', value, stage='commit')
+        lines = registry.render().splitlines()
+
+        self.assertIn('stage_seconds_bucket{stage="commit",le="0.005"} 1', lines)
+        self.assertIn('stage_seconds_bucket{stage="commit",le="0.025"} 2', lines)
+        self.assertIn('stage_seconds_bucket{stage="commit",le="120"} 3', lines)
+        self.assertIn('stage_seconds_bucket{stage="commit",le="+Inf"} 4', lines)
+        self.assertIn('stage_seconds_count{stage="commit"} 4', lines)
+
+    def test_label_values_are_escaped(self):
+        registry = Registry()
+        registry.set('up', 1, device='R1 "core"\\\n')
+        self.assertIn('up{device="R1 \\"core\\"\\\\\\n"} 1', registry.render())
+
+
+class SpanTest(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(metrics, 'registry', Registry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_records_duration_and_errors(self):
+        with metrics.span('commit', '10.0.0.1'):
+            pass
+        with self.assertRaises(ValueError), metrics.span('commit', '10.0.0.1'):
+            raise ValueError("rejected")
+        lines = metrics.render().splitlines()
+
+        self.assertIn('device_stage_seconds_count{stage="commit"} 2', lines)
+        self.assertIn('device_stage_errors_total{stage="commit"} 1', lines)
+        # Labelled by stage only, whatever the device
+        self.assertFalse(any('10.0.0.1' in line for line in lines))
+
+    def test_spans_follow_the_trace_into_other_threads(self):
+        trace, token = metrics.begin_trace('GET /get_config')
+        self.addCleanup(metrics.end_trace, token)
+
+        with metrics.span('connect', 'R1'):
+            pass
+        worker = threading.Thread(target=contextvars.copy_context().run, args=(self.traced, 'R3'))
+        worker.start()
+        worker.join()
+
+        spans = metrics.get_trace(trace.id).to_dict()['spans']
+        self.assertEqual([(s['stage'], s['device']) for s in spans], [('connect', 'R1'), ('get_config', 'R3')])
+        self.assertNotEqual(spans[0]['thread'], spans[1]['thread'])
+        self.assertIsNone(spans[0]['error'])
+
+    def traced(self, device):
+        with metrics.span('get_config', device):
+            pass
+
+    def test_no_trace_outside_a_request(self):
+        with metrics.span('connect', 'R1'):
+            pass
+        self.assertIsNone(metrics._current.get())
+
+    def test_old_traces_are_dropped(self):
+        with mock.patch.object(metrics, 'MAX_TRACES', 2):
+            traces = []
+            for i in range(3):
+                trace, token = metrics.begin_trace(f"request {i}")
+                metrics.end_trace(token)
+                traces.append(trace)
+
+        self.assertIsNone(metrics.get_trace(traces[0].id))
+        self.assertIs(metrics.get_trace(traces[2].id), traces[2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import contextlib
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import migration
+
+HOSTS = [{'host': f"192.168.50.{i}", 'username': 'u', 'password': 'p'} for i in (11, 14)]
+
+
+def plan(**changes):
+    return {
+        'targets': [{'device': '192.168.50.14', 'interface': 'FastEthernet1/0'}],
+        'steps': [{'name': 'shutdown', 'config': "interface {interface}\n shutdown\n"}],
+    } | changes
+
+
+class LoadPlanTest(unittest.TestCase):
+
+    def load(self, data):
+        fd, path = tempfile.mkstemp(suffix='.json')
+        self.addCleanup(os.unlink, path)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        return migration.load_plan(path, hosts=HOSTS)
+
+    def assertInvalid(self, data, message):
+        with self.assertRaisesRegex(ValueError, message):
+            self.load(data)
+
+    def test_defaults_and_devices(self):
+        loaded = self.load(plan(probe={'source': '192.168.50.11', 'target': '30.0.0.1'}))
+
+        self.assertEqual(loaded['targets'][0]['device'], HOSTS[1])
+        self.assertEqual(loaded['probe']['source'], HOSTS[0])
+        self.assertEqual(loaded['probe']['recovery_timeout'], migration.RECOVERY_TIMEOUT)
+        self.assertEqual(loaded['abort'], {'on_pre_check_failure': 'abort', 'max_outage': None})
+        self.assertEqual((loaded['pre_checks'], loaded['post_checks'], loaded['on_abort']), ([], [], []))
+
+    def test_shipped_plan_is_valid(self):
+        path = os.path.join(os.path.dirname(__file__), '..', migration.PLAN_PATH)
+        self.assertTrue(migration.load_plan(path, hosts=HOSTS)['steps'])
+
+    def test_needs_targets_and_steps(self):
+        self.assertInvalid(plan(targets=[]), "targets and steps")
+        self.assertInvalid(plan(steps=[]), "targets and steps")
+
+    def test_unknown_device(self):
+        self.assertInvalid(plan(targets=[{'device': '10.0.0.1', 'interface': 'Fa0/0'}]), "unknown device")
+        self.assertInvalid(plan(probe={'source': '10.0.0.1', 'target': '30.0.0.1'}), "unknown device")
+
+    def test_unknown_check(self):
+        self.assertInvalid(plan(pre_checks=['bogus']), "unknown check")
+
+    def test_probe_check_needs_probe_and_post(self):
+        self.assertInvalid(plan(post_checks=['probe_recovered']), "needs a probe")
+        self.assertInvalid(plan(pre_checks=['probe_recovered'],
+                                probe={'source': '192.168.50.11', 'target': '30.0.0.1'}), "post-check")
+
+    def test_bad_abort_policy(self):
+        self.assertInvalid(plan(abort={'on_pre_check_failure': 'ignore'}), "on_pre_check_failure")
+
+    def test_step_needs_config_or_wait(self):
+        self.assertInvalid(plan(steps=[{'name': 'both', 'config': "x\n", 'wait': 1}]), "either config or wait")
+        self.assertInvalid(plan(steps=[{'config': "x\n"}]), "either config or wait")
+        self.assertInvalid(plan(on_abort=[{'name': 'neither'}]), "either config or wait")
+
+    def test_step_types(self):
+        self.assertInvalid(plan(steps=[{'name': 'lines', 'config': ["x"]}]), "must be a string")
+        self.assertInvalid(plan(steps=[{'name': 'hold', 'wait': "10"}]), "number of seconds")
+        self.assertInvalid(plan(steps=[{'name': 'hold', 'wait': -1}]), "number of seconds")
+
+
+class RunStepTest(unittest.TestCase):
+
+    def setUp(self):
+        self.applied = {}
+        lock = threading.Lock()
+
+        def apply_config(device, config):
+            with lock:
+                self.applied[device['host']] = config
+
+        patcher = mock.patch.object(migration, 'apply_config', apply_config)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.targets = [{'device': HOSTS[1], 'interface': name} for name in ('Fa1/0', 'Fa1/1')]
+        self.targets.append({'device': HOSTS[0], 'interface': 'Fa0/0'})
+
+    def run_step(self, step, **kwargs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return migration.run_step(step, self.targets, **kwargs)
+
+    def test_one_commit_per_device(self):
+        outcome = self.run_step({'name': 'shutdown', 'config': "interface {interface}\n shutdown\n"})
+
+        self.assertEqual(outcome['failed'], {})
+        self.assertEqual(self.applied, {
+            '192.168.50.14': "interface Fa1/0\n shutdown\ninterface Fa1/1\n shutdown\n",
+            '192.168.50.11': "interface Fa0/0\n shutdown\n",
+        })
+
+    def test_device_wide_lines_once_and_braces_kept(self):
+        self.run_step({'name': 'banner', 'config': "banner motd ^Change {ticket}^\n"})
+
+        self.assertEqual(self.applied['192.168.50.14'], "banner motd ^Change {ticket}^\n")
+
+    def test_failures_by_device(self):
+        def apply_config(device, config):
+            raise RuntimeError("commit failed")
+
+        with mock.patch.object(migration, 'apply_config', apply_config):
+            outcome = self.run_step({'name': 'shutdown', 'config': "interface {interface}\n shutdown\n"})
+
+        self.assertEqual(set(outcome['failed']), {'192.168.50.11', '192.168.50.14'})
+
+    def test_wait_gives_up_on_abort(self):
+        outcome = self.run_step({'name': 'hold', 'wait': 30}, should_abort=lambda: True)
+
+        self.assertLess(outcome['elapsed'], 1)
+        self.assertEqual(self.applied, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
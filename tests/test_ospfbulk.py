@@ -0,0 +1,148 @@
+import io
+import json
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stderr
+from pathlib import Path
+from unittest import mock
+
+import ospfbulk
+import ospfconfig
+
+
+def router(name, octet, area='0'):
+    return {
+        'router': name, 'hostname': name, 'ip_address': f'192.168.1.{octet}',
+        'username': 'admin', 'password': 'secret', 'ospf_process_id': 1,
+        'router_id': f'{octet}.{octet}.{octet}.{octet}',
+        'loopback_ip': f'{octet}.{octet}.{octet}.{octet}', 'loopback_mask': '255.255.255.255',
+        'interfaces': [{'name': 'GigabitEthernet0/0', 'ip': f'10.0.0.{octet}',
+                        'mask': '255.255.255.0', 'area': area}],
+    }
+
+
+class DetectFormatTest(unittest.TestCase):
+
+    def test_extensions(self):
+        self.assertEqual(ospfbulk.detect_format('fleet.CSV'), 'csv')
+        self.assertEqual(ospfbulk.detect_format('fleet.yml'), 'yaml')
+        self.assertEqual(ospfbulk.detect_format('fleet.ndjson'), 'jsonl')
+        self.assertEqual(ospfbulk.detect_format('fleet.json'), 'json')
+
+    def test_unknown_extension(self):
+        with self.assertRaises(ValueError):
+            ospfbulk.detect_format('fleet.txt')
+
+
+class ReadJsonTest(unittest.TestCase):
+
+    def read(self, text):
+        return list(ospfbulk._read_json(io.StringIO(text)))
+
+    def test_array(self):
+        self.assertEqual(self.read('[{"router": "R1"}, {"router": "R2"}]'),
+                         [{'router': 'R1'}, {'router': 'R2'}])
+
+    def test_routers_key_after_other_keys(self):
+        self.assertEqual(self.read('{"site": {"name": "lab"}, "routers": [{"router": "R1"}], "x": 1}'),
+                         [{'router': 'R1'}])
+
+    def test_empty(self):
+        self.assertEqual(self.read(' [ ] '), [])
+        self.assertEqual(self.read('{"routers": []}'), [])
+
+    def test_values_split_across_chunks(self):
+        with mock.patch.object(ospfbulk, 'JSON_CHUNK', 3):
+            self.assertEqual(self.read('[{"router": "R1", "ids": [1, 2]}, 12345, true]'),
+                             [{'router': 'R1', 'ids': [1, 2]}, 12345, True])
+
+    def test_reads_lazily(self):
+        stream = io.StringIO('[' + ', '.join(['{"router": "R1"}'] * 1000) + ']')
+        with mock.patch.object(ospfbulk, 'JSON_CHUNK', 64):
+            next(ospfbulk._read_json(stream))
+        self.assertLess(stream.tell(), 1000)
+
+    def test_malformed(self):
+        for text in ('{"site": 1}', '{}', '[{"router": "R1"}', '[1 2]', '"R1"'):
+            with self.subTest(text=text), self.assertRaises(ValueError):
+                self.read(text)
+
+
+class ReadCsvTest(unittest.TestCase):
+
+    def test_rows_of_one_router_are_merged(self):
+        text = ("router,hostname,interface,interface_ip,interface_mask,interface_area\n"
+                "R1,r1,Gi0/0,10.0.0.1,255.255.255.252,0\n"
+                "R1,r1,Gi0/1,10.0.0.5,255.255.255.252,1\n"
+                "R2,r2,Gi0/0,10.0.0.2,255.255.255.252,0\n")
+        configs = list(ospfbulk._read_csv(io.StringIO(text)))
+
+        self.assertEqual([c['router'] for c in configs], ['R1', 'R2'])
+        self.assertEqual([i['name'] for i in configs[0]['interfaces']], ['Gi0/0', 'Gi0/1'])
+
+
+class ValidateConfigTest(unittest.TestCase):
+
+    def test_valid(self):
+        self.assertEqual(ospfbulk.validate_config(router('R1', 1)), [])
+
+    def test_problems(self):
+        config = router('R1', 1) | {'ip_address': '300.1.1.1', 'password': ''}
+        config['interfaces'][0].update(mask='255.0.255.0', area='')
+        errors = ospfbulk.validate_config(config)
+
+        self.assertIn("missing password", errors)
+        self.assertIn("invalid ip_address 300.1.1.1", errors)
+        self.assertIn("GigabitEthernet0/0: invalid mask 255.0.255.0", errors)
+        self.assertIn("GigabitEthernet0/0: missing area", errors)
+
+
+class ImportExportTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        for patch in (mock.patch.object(ospfconfig, 'DB_PATH', str(self.root / 'ospf_config.db')),
+                      mock.patch.object(ospfconfig, '_db', threading.local())):
+            patch.start()
+            self.addCleanup(patch.stop)
+        ospfconfig.init_db()
+
+    def export(self, fmt):
+        return ''.join(ospfbulk.export_configs(fmt))
+
+    def test_round_trip(self):
+        configs = [router('R1', 1), router('R2', 2)]
+        self.assertEqual(ospfbulk.import_configs(io.StringIO(json.dumps(configs)), 'json'), 2)
+
+        for fmt in ('json', 'jsonl', 'csv'):
+            with self.subTest(fmt=fmt):
+                exported = self.export(fmt)
+                self.assertEqual(ospfbulk.import_configs(io.StringIO(exported), fmt), 2)
+                self.assertEqual(ospfconfig.fetch_all_configs(),
+                                 [ospfbulk._normalize(c) | {'interfaces': c['interfaces']}
+                                  for c in configs])
+
+    def test_invalid_records_write_nothing(self):
+        configs = [router('R1', 1), router('R2', 2) | {'router_id': ''}, 'R3']
+
+        with self.assertRaises(ospfbulk.BulkImportError) as cm:
+            ospfbulk.import_configs(io.StringIO(json.dumps(configs)), 'json')
+
+        self.assertEqual([(e['record'], e['router']) for e in cm.exception.errors],
+                         [(2, 'R2'), (3, None)])
+        self.assertEqual(ospfconfig.fetch_all_configs(), [])
+
+    def test_parse_error(self):
+        with self.assertRaisesRegex(ValueError, "could not parse json input"):
+            ospfbulk.import_configs(io.StringIO('[{"router": '), 'json')
+
+    def test_cli_unknown_format(self):
+        for command in ('import', 'export'):
+            with self.subTest(command=command):
+                err = io.StringIO()
+                with redirect_stderr(err):
+                    self.assertEqual(ospfbulk.main([command, str(self.root / 'fleet.txt')]), 1)
+                self.assertIn(f"{command.capitalize()} failed: Cannot tell the format", err.getvalue())
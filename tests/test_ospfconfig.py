@@ -0,0 +1,72 @@
+import unittest
+
+import ospfconfig
+
+
+def intent(process=1, router_id='1.1.1.1', networks=(('1.1.1.1', '0.0.0.0', '0'),)):
+    return {'ospf_process_id': process, 'router_id': router_id, 'networks': list(networks)}
+
+
+class OspfDeltaTest(unittest.TestCase):
+
+    def test_unchanged(self):
+        self.assertEqual(ospfconfig.ospf_delta(intent(), intent()), "")
+
+    def test_first_apply_is_whole_stanza(self):
+        self.assertEqual(ospfconfig.ospf_delta(None, intent()),
+                         "router ospf 1\n router-id 1.1.1.1\n network 1.1.1.1 0.0.0.0 area 0\n")
+
+    def test_network_changes_remove_first(self):
+        new = intent(networks=[('1.1.1.1', '0.0.0.0', '0'), ('10.0.0.1', '255.255.255.252', '0')])
+        old = intent(networks=[('1.1.1.1', '0.0.0.0', '0'), ('10.0.0.5', '255.255.255.252', '0')])
+        self.assertEqual(ospfconfig.ospf_delta(old, new),
+                         "router ospf 1\n"
+                         " no network 10.0.0.5 255.255.255.252 area 0\n"
+                         " network 10.0.0.1 255.255.255.252 area 0\n")
+
+    def test_area_change_is_a_different_network(self):
+        delta = ospfconfig.ospf_delta(intent(), intent(networks=[('1.1.1.1', '0.0.0.0', '1')]))
+        self.assertIn(" no network 1.1.1.1 0.0.0.0 area 0\n", delta)
+        self.assertIn(" network 1.1.1.1 0.0.0.0 area 1\n", delta)
+
+    def test_process_change_replaces_process(self):
+        delta = ospfconfig.ospf_delta(intent(process=1), intent(process=2))
+        self.assertTrue(delta.startswith("no router ospf 1\nrouter ospf 2\n router-id 1.1.1.1\n"))
+
+    def test_router_id_change_replaces_process(self):
+        delta = ospfconfig.ospf_delta(intent(), intent(router_id='2.2.2.2'))
+        self.assertEqual(delta, "no router ospf 1\nrouter ospf 1\n router-id 2.2.2.2\n"
+                                " network 1.1.1.1 0.0.0.0 area 0\n")
+
+    def test_replace_rewrites_unchanged_stanza(self):
+        self.assertTrue(ospfconfig.ospf_delta(intent(), intent(), replace=True)
+                        .startswith("no router ospf 1\nrouter ospf 1\n"))
+
+    def test_replace_without_record_clears_wanted_process(self):
+        self.assertTrue(ospfconfig.ospf_delta(None, intent(), replace=True)
+                        .startswith("no router ospf 1\nrouter ospf 1\n"))
+
+    def test_replace_clears_recorded_and_wanted_process(self):
+        delta = ospfconfig.ospf_delta(intent(process=2), intent(process=1), replace=True)
+        self.assertTrue(delta.startswith("no router ospf 2\nno router ospf 1\nrouter ospf 1\n"))
+
+
+class OspfIntentTest(unittest.TestCase):
+
+    def test_loopback_in_first_interface_area(self):
+        config = {
+            'ospf_process_id': '10', 'router_id': '1.1.1.1', 'loopback_ip': '1.1.1.1',
+            'interfaces': [{'ip': '10.0.0.1', 'mask': '255.255.255.252', 'area': 1},
+                           {'ip': '10.0.0.5', 'mask': '255.255.255.252', 'area': 0}],
+        }
+        self.assertEqual(ospfconfig.ospf_intent(config), {
+            'ospf_process_id': 10,
+            'router_id': '1.1.1.1',
+            'networks': [('1.1.1.1', '0.0.0.0', '1'),
+                         ('10.0.0.1', '255.255.255.252', '1'),
+                         ('10.0.0.5', '255.255.255.252', '0')],
+        })
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import unittest
+from unittest import mock
+
+from tools import outage
+from tools.outage import ProbeRing, RemotePingSampler
+
+
+def burst_output(probes, rtt="min/avg/max = 1/2/4 ms"):
+    return ("Type escape sequence to abort.\n"
+            "Sending 10, 100-byte ICMP Echos to 30.0.0.1, timeout is 1 seconds:\n"
+            f"{probes}\n"
+            f"Success rate is 50 percent (5/10), round-trip {rtt}\n")
+
+
+class ProbeRingTest(unittest.TestCase):
+
+    def test_wraps_around(self):
+        ring = ProbeRing(capacity=3)
+        for ts in range(5):
+            ring.append(float(ts), 1.0)
+
+        self.assertEqual(len(ring), 3)
+        self.assertEqual([ts for ts, _ in ring.samples()], [2.0, 3.0, 4.0])
+
+    def test_outages(self):
+        ring = ProbeRing()
+        for ts, rtt in [(0, 1.0), (1, None), (2, None), (3, 1.0), (4, None)]:
+            ring.append(float(ts), rtt)
+
+        self.assertEqual(ring.outages(), [
+            {'start': 1.0, 'end': 3.0, 'duration': 2.0, 'lost': 2},
+            {'start': 4.0, 'end': None, 'duration': None, 'lost': 1},
+        ])
+
+        summary = ring.summary()
+        self.assertEqual((summary['probes'], summary['lost'], summary['loss']), (5, 3, 0.6))
+        self.assertEqual(summary['outage']['lost'], 1)
+        self.assertEqual(summary['rtt_avg'], 1.0)
+
+    def test_empty_summary(self):
+        summary = ProbeRing().summary()
+        self.assertEqual((summary['probes'], summary['loss'], summary['outage']), (0, None, None))
+
+
+class RemoteRecordTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sampler = RemotePingSampler({'host': 'R1'}, '30.0.0.1', timeout=1)
+
+    def test_probes_are_spread_over_the_burst(self):
+        self.sampler._record(burst_output("!!...!!!!!"), 100.0, 103.014)
+        samples = self.sampler.ring.samples()
+
+        self.assertEqual(len(samples), 10)
+        self.assertEqual([rtt for _, rtt in samples[:3]], [2.0, 2.0, None])
+        # Losses take the full timeout, replies the average RTT
+        self.assertAlmostEqual(samples[3][0] - samples[2][0], 1.0, places=3)
+        self.assertAlmostEqual(samples[1][0] - samples[0][0], 0.002, places=4)
+
+    def test_zero_average_rtt(self):
+        self.sampler._record(burst_output("!!!!!", rtt="min/avg/max = 0/0/1 ms"), 100.0, 100.01)
+        samples = self.sampler.ring.samples()
+
+        self.assertEqual([rtt for _, rtt in samples], [0.0] * 5)
+        self.assertEqual([ts for ts, _ in samples], sorted(ts for ts, _ in samples))
+        self.assertLess(samples[-1][0], 100.01)
+
+    def test_no_probe_line(self):
+        self.sampler._record("% Unrecognized host or address\n", 100.0, 100.1)
+        self.assertEqual(len(self.sampler.ring), 0)
+
+    def test_stop_summary(self):
+        self.sampler._record(burst_output("!.!"), 100.0, 101.0)
+        summary = self.sampler.stop()
+
+        self.assertEqual((summary['mode'], summary['target'], summary['lost']), ('remote', '30.0.0.1', 1))
+
+
+class SamplerForTest(unittest.TestCase):
+
+    def test_falls_back_to_remote(self):
+        unreachable = lambda targets: {t: {'reachable': False} for t in targets}
+        with mock.patch.object(outage.connectivity, 'sweep', unreachable):
+            self.assertIsInstance(outage.sampler_for({'host': 'R1'}, '30.0.0.1'), RemotePingSampler)
+
+
+if __name__ == '__main__':
+    unittest.main()
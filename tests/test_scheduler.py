@@ -0,0 +1,133 @@
+import threading
+import unittest
+
+from tools import scheduler
+from tools.scheduler import DeviceScheduler
+
+
+class Flaky:
+    """Raises exc on the first `failures` calls, then returns the call count"""
+
+    def __init__(self, failures, exc=TimeoutError, message="timed out"):
+        self.failures = failures
+        self.exc = exc
+        self.message = message
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.exc(self.message)
+        return self.calls
+
+
+class IsTransientTest(unittest.TestCase):
+
+    def test_by_class_and_message(self):
+        self.assertTrue(scheduler.is_transient(TimeoutError()))
+        self.assertTrue(scheduler.is_transient(ConnectionResetError()))
+        self.assertTrue(scheduler.is_transient(OSError("Pattern not detected: 'R1\\#' in output")))
+        self.assertFalse(scheduler.is_transient(ValueError("% Invalid input detected")))
+
+
+class DeviceSchedulerTest(unittest.TestCase):
+
+    def scheduler(self, **kwargs):
+        return DeviceScheduler(**{'backoff': 0.001, 'max_backoff': 0.01} | kwargs)
+
+    def blocked(self, sched, key):
+        """Submit a task that holds its slot until the returned event is set"""
+        started, release = threading.Event(), threading.Event()
+
+        def hold():
+            started.set()
+            release.wait(5)
+        future = sched.submit(key, hold)
+        self.assertTrue(started.wait(5))
+        return release, future
+
+    def test_result(self):
+        sched = self.scheduler()
+        self.assertEqual(sched.submit('R1', lambda a, b=0: a + b, 1, b=2).result(5), 3)
+        self.assertEqual([f.result(5) for f in sched.submit_all(str, abs, [-1, -2])], [1, 2])
+
+    def test_transient_errors_are_retried(self):
+        sched = self.scheduler(retries=3)
+        task = Flaky(2)
+
+        self.assertEqual(sched.submit('R1', task).result(5), 3)
+
+    def test_retries_run_out(self):
+        sched = self.scheduler(retries=2)
+        task = Flaky(5)
+
+        with self.assertRaises(TimeoutError):
+            sched.submit('R1', task).result(5)
+        self.assertEqual(task.calls, 3)
+
+    def test_retries_zero_runs_once(self):
+        sched = self.scheduler(retries=3)
+        task = Flaky(1)
+
+        with self.assertRaises(TimeoutError):
+            sched.submit('R1', task, retries=0).result(5)
+        self.assertEqual(task.calls, 1)
+
+    def test_other_errors_are_not_retried(self):
+        sched = self.scheduler(retries=3)
+        task = Flaky(1, exc=ValueError, message="% Invalid input detected")
+
+        with self.assertRaises(ValueError):
+            sched.submit('R1', task).result(5)
+        self.assertEqual(task.calls, 1)
+
+    def test_interactive_runs_before_bulk(self):
+        sched = self.scheduler(max_concurrency=1, min_concurrency=1)
+        release, first = self.blocked(sched, 'R1')
+
+        order = []
+        bulk = sched.submit('R2', order.append, 'bulk', priority=scheduler.BULK)
+        interactive = sched.submit('R3', order.append, 'interactive')
+        release.set()
+
+        for future in (first, bulk, interactive):
+            future.result(5)
+        self.assertEqual(order, ['interactive', 'bulk'])
+
+    def test_per_device_limit(self):
+        sched = self.scheduler(per_device=1)
+        release, first = self.blocked(sched, 'R1')
+
+        same = sched.submit('R1', lambda: 'same')
+        other = sched.submit('R2', lambda: 'other')
+        self.assertEqual(other.result(5), 'other')
+        self.assertFalse(same.done())
+
+        release.set()
+        self.assertEqual(same.result(5), 'same')
+
+    def test_cancelled_tasks_never_run(self):
+        sched = self.scheduler(per_device=1)
+        release, first = self.blocked(sched, 'R1')
+
+        ran = []
+        queued = sched.submit('R1', ran.append, 'queued')
+        self.assertTrue(queued.cancel())
+        release.set()
+
+        first.result(5)
+        sched.submit('R1', lambda: None).result(5)
+        self.assertEqual(ran, [])
+
+    def test_transient_failures_cut_the_limit(self):
+        sched = self.scheduler(max_concurrency=16, min_concurrency=2, retries=0)
+        before = sched.stats()['limit']
+
+        with self.assertRaises(TimeoutError):
+            sched.submit('R1', Flaky(1)).result(5)
+        self.assertLess(sched.stats()['limit'], before)
+        self.assertGreaterEqual(sched.stats()['limit'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import threading
+import time
+import unittest
+from unittest import mock
+
+from bench import fakeios
+from tools import sessionpool
+
+
+def instant_profile():
+    return fakeios.Profile(open=0, cli=0, cli_per_command=0, get_config=0, get_facts=0, commit=0,
+                           config_lines=1, drift=0, jitter=0)
+
+
+class SessionPoolTest(unittest.TestCase):
+    """SessionPool against the simulated fleet from bench"""
+
+    def setUp(self):
+        fleet = fakeios.Fleet(instant_profile())
+        fleet.add('10.0.0.1', 'R1')
+        fleet.add('10.0.0.2', 'R2')
+        self.pool = sessionpool.SessionPool(driver=fakeios.install(fleet), max_per_device=2)
+        self.addCleanup(self.pool.close_all)
+
+        self.opened = []
+        original = fakeios.BenchIOSDriver.open
+
+        def open(driver):
+            original(driver)
+            self.opened.append(driver.hostname)
+        patcher = mock.patch.object(fakeios.BenchIOSDriver, 'open', open)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_released_session_is_reused(self):
+        with self.pool.session('10.0.0.1', 'u', 'p') as first:
+            pass
+        with self.pool.session('10.0.0.1', 'u', 'p') as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(self.opened, ['10.0.0.1'])
+        self.assertEqual(self.pool.stats(), {'idle': 1, 'leased': 0})
+
+    def test_sessions_are_keyed_by_credentials_and_args(self):
+        with self.pool.session('10.0.0.1', 'u', 'p'):
+            pass
+        with self.pool.session('10.0.0.1', 'u', 'p', optional_args={'read_timeout_override': 60}):
+            pass
+
+        self.assertEqual(len(self.opened), 2)
+
+    def test_error_discards_session(self):
+        with self.assertRaises(RuntimeError):
+            with self.pool.session('10.0.0.1', 'u', 'p') as device:
+                raise RuntimeError("channel left mid-command")
+
+        self.assertFalse(device.alive)
+        self.assertEqual(self.pool.stats(), {'idle': 0, 'leased': 0})
+
+    def test_slot_limit_is_per_host(self):
+        held = [self.pool.acquire('10.0.0.1', 'u', 'p'),
+                self.pool.acquire('10.0.0.1', 'other', 'p', {'read_timeout_override': 60})]
+
+        with self.assertRaises(TimeoutError):
+            self.pool.acquire('10.0.0.1', 'u', 'p', timeout=0.05)
+        # Another device is not affected
+        self.pool.release(self.pool.acquire('10.0.0.2', 'u', 'p', timeout=0.05))
+
+        for device in held:
+            self.pool.release(device)
+
+    def test_acquire_blocks_until_release(self):
+        held = [self.pool.acquire('10.0.0.1', 'u', 'p') for _ in range(2)]
+        threading.Timer(0.1, self.pool.release, args=(held[0],)).start()
+
+        start = time.monotonic()
+        device = self.pool.acquire('10.0.0.1', 'u', 'p')
+
+        self.assertGreaterEqual(time.monotonic() - start, 0.05)
+        self.assertIs(device, held[0])
+        self.pool.release(device)
+        self.pool.release(held[1])
+
+    def test_failed_open_frees_the_slot(self):
+        with self.assertRaises(ConnectionRefusedError):
+            self.pool.acquire('10.0.0.9', 'u', 'p')
+        for _ in range(3):
+            with self.assertRaises(ConnectionRefusedError):
+                self.pool.acquire('10.0.0.9', 'u', 'p', timeout=0.05)
+
+    def test_warm_parks_one_session(self):
+        self.assertTrue(self.pool.warm('10.0.0.1', 'u', 'p'))
+        self.assertFalse(self.pool.warm('10.0.0.1', 'u', 'p'))
+
+        self.assertEqual(self.opened, ['10.0.0.1'])
+        self.assertEqual(self.pool.stats(), {'idle': 1, 'leased': 0})
+
+    def test_evict_idle_closes_stale_and_dead_sessions(self):
+        with self.pool.session('10.0.0.1', 'u', 'p') as dead:
+            pass
+        with self.pool.session('10.0.0.2', 'u', 'p'):
+            pass
+        dead.alive = False
+
+        self.pool.evict_idle()
+        self.assertEqual(self.pool.stats()['idle'], 1)
+
+        self.pool.idle_timeout = 0
+        time.sleep(0.01)
+        self.pool.evict_idle()
+        self.assertEqual(self.pool.stats()['idle'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+
+from tools.snapshotstore import SnapshotStore
+
+
+class SnapshotStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name)
+        self.store = SnapshotStore(self.root)
+
+    def objects(self):
+        return list((self.root / "objects").glob("*/*.gz"))
+
+    def test_round_trip(self):
+        ts, digest = self.store.put("R1", "hostname R1\n", "2024-01-01T00:00:00Z")
+
+        self.assertEqual(self.store.get(digest), "hostname R1\n")
+        self.assertEqual(self.store.latest("R1"), (ts, digest))
+        self.assertIsNone(self.store.latest("R2"))
+
+    def test_unchanged_config_is_stored_once(self):
+        for ts in ("2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z", "2024-01-03T00:00:00Z"):
+            self.store.put("R1", "hostname R1\n", ts)
+        self.store.put("R2", "hostname R1\n", "2024-01-01T00:00:00Z")
+
+        self.assertEqual(len(self.objects()), 1)
+        self.assertEqual(len(self.store.history("R1")), 3)
+
+    def test_latest_ignores_older_puts(self):
+        self.store.put("R1", "new\n", "2024-01-02T00:00:00Z")
+        self.store.put("R1", "old\n", "2024-01-01T00:00:00Z")
+
+        self.assertEqual(self.store.latest("R1")[0], "2024-01-02T00:00:00Z")
+        self.assertEqual(self.store.latest("R1"), SnapshotStore(self.root).latest("R1"))
+        self.assertEqual([ts for ts, _ in self.store.history("R1")],
+                         ["2024-01-01T00:00:00Z", "2024-01-02T00:00:00Z"])
+
+    def test_latest_sees_other_writers(self):
+        self.store.latest("R1")
+        SnapshotStore(self.root).put("R1", "hostname R1\n", "2024-01-01T00:00:00Z")
+
+        self.assertEqual(self.store.latest("R1")[0], "2024-01-01T00:00:00Z")
+
+    def test_legacy_files_are_imported_before_first_read(self):
+        for i in range(50):
+            (self.root / f"R{i}_2023-01-01T00:00:00Z.txt").write_text(f"hostname R{i}\n")
+
+        # Readers racing the first _ensure() must all see the imported files
+        seen = []
+        threads = [threading.Thread(target=lambda: seen.append(self.store.latest("R49"))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(seen), 8)
+        self.assertTrue(all(latest and latest[0] == "2023-01-01T00:00:00Z" for latest in seen))
+        self.assertEqual(self.store.get(self.store.latest("R7")[1]), "hostname R7\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import math
+import tempfile
+import unittest
+
+from tools import telemetry
+from tools.telemetry import TelemetryStore
+
+T0 = 1_700_000_040.0
+
+
+class PercentileTest(unittest.TestCase):
+
+    def test_interpolates_and_skips_nan(self):
+        self.assertEqual(telemetry.percentile([4, 1, math.nan, 3, 2], 50), 2.5)
+        self.assertEqual(telemetry.percentile([1, 2, 3], 100), 3)
+        self.assertIsNone(telemetry.percentile([math.nan], 50))
+
+
+class TelemetryStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+        self.store = self.open()
+
+    def open(self, **kwargs):
+        store = TelemetryStore(self.root, **{'interval': 60, 'slots': 10, 'capacity': 4} | kwargs)
+        self.addCleanup(store.close)
+        return store
+
+    def record_octets(self, values, device='R1', interface='Gi0/0'):
+        for i, value in enumerate(values):
+            self.store.record(T0 + i * 60 + 5, {(device, interface, 'rx_octets'): value})
+
+    def test_values_are_slot_aligned(self):
+        self.record_octets([100, 200, 300])
+
+        self.assertEqual(self.store.latest(), T0 + 120)
+        self.assertEqual(self.store.values('R1', 'Gi0/0', 'rx_octets'),
+                         [(T0, 100.0), (T0 + 60, 200.0), (T0 + 120, 300.0)])
+        self.assertEqual(self.store.values('R1', 'Gi0/0', 'rx_octets', window=60),
+                         [(T0 + 60, 200.0), (T0 + 120, 300.0)])
+        self.assertEqual(self.store.values('R1', 'Gi0/0', 'tx_octets'), [])
+
+    def test_rates(self):
+        self.record_octets([0, 600, 1800])
+
+        self.assertEqual(self.store.rates('rx_octets'), {('R1', 'Gi0/0'): 20.0})
+        self.assertEqual(self.store.rates('rx_octets', window=120), {('R1', 'Gi0/0'): 15.0})
+        self.assertEqual(self.store.percentile('rx_octets', 50, window=120,
+                                               device='R1', interface='Gi0/0'), 15.0)
+
+    def test_rate_across_counter_wrap(self):
+        self.record_octets([2 ** 32 - 60, 60])
+        self.assertEqual(self.store.rates('rx_octets'), {('R1', 'Gi0/0'): 2.0})
+
+    def test_missing_samples_are_left_out(self):
+        self.store.record(T0, {('R1', 'Gi0/0', 'rx_octets'): 0, ('R2', 'Gi0/0', 'rx_octets'): None})
+        self.store.record(T0 + 60, {('R1', 'Gi0/0', 'rx_octets'): 60, ('R2', 'Gi0/0', 'rx_octets'): 60})
+
+        self.assertEqual(self.store.rates('rx_octets'), {('R1', 'Gi0/0'): 1.0})
+
+    def test_wrapped_rows_read_as_missing(self):
+        self.record_octets(range(0, 1200, 100))
+
+        points = self.store.values('R1', 'Gi0/0', 'rx_octets')
+        self.assertEqual(len(points), 10)
+        self.assertEqual(points[0], (T0 + 120, 200.0))
+        self.assertEqual(self.store.rates('rx_octets', window=600), {})
+
+    def test_top(self):
+        for i, (r1, r2, r3) in enumerate([(0, 0, 0), (60, 600, 6000)]):
+            self.store.record(T0 + i * 60, {('R1', 'Gi0/0', 'rx_octets'): r1,
+                                            ('R2', 'Gi0/0', 'rx_octets'): r2,
+                                            ('R3', 'Gi0/0', 'rx_octets'): r3})
+
+        self.assertEqual(self.store.top('rx_octets', 2), [(('R3', 'Gi0/0'), 100.0), (('R2', 'Gi0/0'), 10.0)])
+
+    def test_grows_and_reopens(self):
+        self.record_octets([100, 200])
+        self.store.record(T0 + 120, {('R1', f'Gi0/{i}', 'rx_octets'): i for i in range(10)})
+        self.assertEqual(self.store.capacity, 16)
+        self.store.close()
+
+        reopened = self.open(capacity=4)
+        self.assertEqual(len(reopened.series(metric='rx_octets')), 10)
+        self.assertEqual(reopened.capacity, 16)
+        self.assertEqual(reopened.values('R1', 'Gi0/0', 'rx_octets'),
+                         [(T0, 100.0), (T0 + 60, 200.0), (T0 + 120, 0.0)])
+        self.assertEqual(reopened.values('R1', 'Gi0/9', 'rx_octets')[-1], (T0 + 120, 9.0))
+
+
+if __name__ == '__main__':
+    unittest.main()
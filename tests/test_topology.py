@@ -0,0 +1,83 @@
+import unittest
+
+from tools.topology import Topology
+
+
+def router(name, *links):
+    """A router config with one interface per (subnet octet, host, area)"""
+    number = name[1:]
+    return {
+        'router': name,
+        'router_id': f"10.255.0.{number}",
+        'loopback_ip': f"10.255.0.{number}",
+        'interfaces': [{'name': f"Gi0/{i}", 'ip': f"172.16.{octet}.{host}", 'mask': '255.255.255.252',
+                        'area': area}
+                       for i, (octet, host, area) in enumerate(links)],
+    }
+
+
+def fleet():
+    """
+    R1 -A- R2 -B- R3, A in the backbone and B in area 1, so R2 is the ABR.
+    R4 -C- R5 sit in area 2 with no way to the backbone, and the link D
+    from R1 to R6 has its ends in different areas.
+    """
+    return [
+        router('R1', (1, 1, 0), (4, 1, 0)),
+        router('R2', (1, 2, 0), (2, 1, 1)),
+        router('R3', (2, 2, '0.0.0.1')),
+        router('R4', (3, 1, 2)),
+        router('R5', (3, 2, 2)),
+        router('R6', (4, 2, 1)),
+    ]
+
+
+class TopologyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.configs = fleet()
+        self.model = Topology(self.configs)
+
+    def test_neighbors_need_matching_areas(self):
+        self.assertEqual(self.model.neighbors('R2'), {'R1', 'R3'})
+        self.assertEqual(self.model.neighbors('R1'), {'R2'})
+        self.assertEqual(self.model.neighbors('R6'), set())
+        self.assertEqual(self.model.neighbor_ids('R1'), {'10.255.0.2'})
+
+    def test_links_and_areas(self):
+        links = {link['subnet']: link for link in self.model.links()}
+
+        self.assertTrue(links['172.16.2.0/30']['adjacent'])
+        self.assertEqual(links['172.16.4.0/30']['areas'], ['0', '1'])
+        self.assertFalse(links['172.16.4.0/30']['adjacent'])
+        self.assertEqual(self.model.areas(), {0: ['R1', 'R2'], 1: ['R2', 'R3', 'R6'], 2: ['R4', 'R5']})
+        self.assertEqual(self.model.abrs(), ['R2'])
+
+    def test_expected_routes(self):
+        self.assertEqual(self.model.expected_routes('R1'), {'R2': 'intra', 'R3': 'inter'})
+        self.assertEqual(self.model.expected_routes('R2'), {'R1': 'intra', 'R3': 'intra'})
+        self.assertEqual(self.model.expected_routes('R3'), {'R1': 'inter', 'R2': 'inter'})
+        # No path to the backbone, and no adjacency at all
+        self.assertEqual(self.model.expected_routes('R4'), {'R5': 'intra'})
+        self.assertEqual(self.model.expected_routes('R6'), {})
+
+    def test_probe_pairs_start_from_the_abr(self):
+        self.assertEqual(self.model.probe_pairs(), [('R2', 'R1'), ('R2', 'R3'), ('R4', 'R5')])
+
+    def test_sync_reindexes_changed_and_removed_routers(self):
+        self.model.expected_routes('R1')
+        self.configs = [config for config in self.configs if config['router'] != 'R5']
+        self.configs[1]['interfaces'][1]['area'] = 0
+        self.configs[2]['interfaces'][0]['area'] = 0
+
+        self.model.sync(self.configs)
+
+        self.assertEqual(self.model.routers(), ['R1', 'R2', 'R3', 'R4', 'R6'])
+        self.assertEqual(self.model.neighbors('R4'), set())
+        self.assertEqual(self.model.expected_routes('R1'), {'R2': 'intra', 'R3': 'intra'})
+        self.assertEqual(self.model.abrs(), [])
+        self.assertEqual(self.model.to_dict()['areas'], {'0': ['R1', 'R2', 'R3'], '1': ['R6'], '2': ['R4']})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+import bisect
+import functools
+import ipaddress
+import itertools
+import operator
+import socket
+import sys
+from array import array
+
+MAX_ADDRESS = 0xFFFFFFFF
+
+
+def to_int(address):
+    """Dotted quad to integer, None if it isn't one (leading zeros are rejected)"""
+    try:
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, str(address)), 'big')
+    except (OSError, ValueError):
+        return None
+
+
+_pton = functools.partial(socket.inet_pton, socket.AF_INET)
+
+
+def to_ints(addresses):
+    """
+    Convert many dotted quads at once, None where one is invalid. Valid
+    input is packed into one buffer and read back as an unsigned int array.
+    """
+    addresses = list(map(str, addresses))
+    try:
+        packed = b"".join(map(_pton, addresses))
+    except (OSError, ValueError):
+        return [to_int(address) for address in addresses]
+
+    ints = array('I', packed)
+    if sys.byteorder == 'little':
+        ints.byteswap()
+    return ints.tolist()
+
+
+def area_id(area):
+    """An OSPF area as an integer, from "1" or "0.0.0.1", None if unset or invalid"""
+    if area in (None, ''):
+        return None
+    try:
+        return int(area)
+    except (TypeError, ValueError):
+        return to_int(area)
+
+
+def to_str(address):
+    return str(ipaddress.IPv4Address(address))
+
+
+def prefix(network, hostmask):
+    return f"{to_str(network)}/{32 - hostmask.bit_length()}"
+
+
+def usable(address):
+    """Same ranges as validateIP.validate_ip: no loopback, link-local, multicast or reserved"""
+    first = address >> 24
+    return first != 127 and first < 224 and address >> 16 != 0xA9FE
+
+
+def valid_mask(mask):
+    inverse = mask ^ MAX_ADDRESS
+    return mask != 0 and inverse & (inverse + 1) == 0
+
+
+def validate_plan(configs):
+    """
+    Check a whole fleet's addressing in one pass before any device is touched.
+
+    Every address and mask is converted to an integer once. Sorting those
+    finds duplicate addresses, subnets that overlap without being the same
+    link, and links whose ends are in different OSPF areas. Router IDs and
+    management addresses must be unique too.
+
+    Args:
+        configs: router configs as returned by ospfconfig.fetch_all_configs()
+
+    Returns:
+        A list of problems, each a dict with router, interface and error,
+        empty if the plan is consistent.
+    """
+    problems = []
+
+    def problem(router, interface, error):
+        problems.append({'router': router, 'interface': interface, 'error': error})
+
+    # Router-wide addresses
+    routers = [config['router'] for config in configs]
+    router_ids = to_ints(config.get('router_id') for config in configs)
+    management = to_ints(config.get('ip_address') for config in configs)
+
+    # Walk the routers only if some address is missing, repeated or unusable
+    clean = (None not in router_ids and len(set(router_ids)) == len(router_ids)
+             and None not in management and len(set(management)) == len(management)
+             and all(map(usable, management)))
+
+    seen_ids = {}
+    seen_mgmt = {}
+    for config, router, rid, mgmt in ([] if clean else zip(configs, routers, router_ids, management)):
+        if rid is None:
+            problem(router, None, f"invalid router-id {config.get('router_id')}")
+        elif rid in seen_ids:
+            problem(router, None, f"router-id {config['router_id']} already used by {seen_ids[rid]}")
+        else:
+            seen_ids[rid] = router
+
+        if mgmt is None or not usable(mgmt):
+            problem(router, 'Management', f"invalid address {config.get('ip_address')}")
+        elif mgmt in seen_mgmt:
+            problem(router, 'Management', f"{config['ip_address']} already used by {seen_mgmt[mgmt]}")
+        else:
+            seen_mgmt[mgmt] = router
+
+    # Loopbacks and interfaces, one row each. Areas are compared as
+    # integers, so 0 and 0.0.0.0 are the same area.
+    area_of = {}
+    owners = []
+    raw_addresses = []
+    raw_masks = []
+    areas = []
+    for config in configs:
+        router = config['router']
+        owners.append((router, 'Loopback0'))
+        raw_addresses.append(config.get('loopback_ip'))
+        raw_masks.append(config.get('loopback_mask') or '255.255.255.255')
+        areas.append(None)
+        for iface in config.get('interfaces') or []:
+            owners.append((router, iface['name']))
+            raw_addresses.append(iface['ip'])
+            raw_masks.append(iface['mask'])
+            area = iface['area']
+            if area not in area_of:
+                area_of[area] = area_id(area)
+            areas.append(area_of[area])
+            if area_of[area] is None and area not in (None, ''):
+                problem(router, iface['name'], f"invalid area {area}")
+
+    # A fleet uses a handful of distinct masks, convert each once
+    hostmask_of = {}
+    for mask in set(map(str, raw_masks)):
+        netmask = to_int(mask)
+        hostmask_of[mask] = netmask ^ MAX_ADDRESS if netmask is not None and valid_mask(netmask) else None
+    parsed = to_ints(raw_addresses)
+    parsed_hostmasks = [hostmask_of[mask] for mask in map(str, raw_masks)]
+
+    # usable() inlined, it runs once per address
+    bad = [i for i, (ip, hostmask) in enumerate(zip(parsed, parsed_hostmasks))
+           if ip is None or hostmask is None or ip >> 24 == 127 or ip >= 0xE0000000 or ip >> 16 == 0xA9FE]
+    for i in bad:
+        if parsed[i] is None or not usable(parsed[i]):
+            problem(*owners[i], f"invalid address {raw_addresses[i]}")
+        else:
+            problem(*owners[i], f"invalid mask {raw_masks[i]}")
+
+    if bad:
+        bad = set(bad)
+        keep = [i for i in range(len(parsed)) if i not in bad]
+        owners = [owners[i] for i in keep]
+        areas = [areas[i] for i in keep]
+        parsed = [parsed[i] for i in keep]
+        parsed_hostmasks = [parsed_hostmasks[i] for i in keep]
+
+    addresses = array('I', parsed)
+    hostmasks = array('I', parsed_hostmasks)
+    networks = array('I', [ip & ~hostmask for ip, hostmask in zip(addresses, hostmasks)])
+
+    # Subnets of /30 and shorter can't use their network or broadcast address
+    for i, (ip, net, hostmask) in enumerate(zip(addresses, networks, hostmasks)):
+        if hostmask > 1 and (ip == net or ip == net | hostmask):
+            problem(*owners[i], f"{to_str(ip)} is the {'network' if ip == net else 'broadcast'} "
+                                f"address of {prefix(net, hostmask)}")
+
+    # Duplicate addresses sit next to each other once sorted, only sort if there are any
+    if len(set(addresses)) != len(addresses):
+        order = sorted(range(len(addresses)), key=addresses.__getitem__)
+        for prev, cur in zip(order, order[1:]):
+            if addresses[prev] == addresses[cur]:
+                problem(*owners[cur], f"{to_str(addresses[cur])} already used by {' '.join(owners[prev])}")
+
+    # One integer per subnet, start address then widest first, so interfaces
+    # on the same link share a key
+    keys = [net << 32 | hostmask ^ MAX_ADDRESS for net, hostmask in zip(networks, hostmasks)]
+    members_of = None
+
+    def members(key):
+        nonlocal members_of
+        if members_of is None:
+            members_of = {}
+            for i, k in enumerate(keys):
+                members_of.setdefault(k, []).append(i)
+        return members_of[key]
+
+    def subnet(key):
+        return prefix(key >> 32, (key & MAX_ADDRESS) ^ MAX_ADDRESS)
+
+    # A link is split if its key pairs with more than one area. Usually no
+    # key does, and the pairs are no more than the keys.
+    subnets = sorted(set(keys))
+    link_areas = set(zip(keys, areas))
+    if len(link_areas) > len(subnets):
+        by_key = {}
+        for key, area in link_areas:
+            if area is not None:
+                by_key.setdefault(key, []).append(area)
+        for key in sorted(key for key, found in by_key.items() if len(found) > 1):
+            names = ', '.join(map(str, sorted(by_key[key])))
+            for i in members(key):
+                problem(*owners[i], f"link {subnet(key)} has ends in areas {names}")
+
+    # Any other intersection shows up as a subnet starting at or before the
+    # furthest end of the subnets sorted ahead of it
+    starts = [key >> 32 for key in subnets]
+    reach = list(itertools.accumulate(
+        (start | (key & MAX_ADDRESS) ^ MAX_ADDRESS for start, key in zip(starts, subnets)), max))
+    for j in itertools.compress(range(1, len(subnets)), map(operator.le, starts[1:], reach)):
+        # The first subnet to reach that far
+        other = subnets[bisect.bisect_left(reach, reach[j - 1])]
+        where = f"{subnet(other)} on {' '.join(owners[members(other)[0]])}"
+        for i in members(subnets[j]):
+            problem(*owners[i], f"{subnet(subnets[j])} overlaps {where}")
+
+    return problems
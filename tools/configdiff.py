@@ -0,0 +1,136 @@
+import difflib
+
+from tools.snapshotstore import SnapshotStore
+
+digest = SnapshotStore.digest
+
+
+def _banner_delimiter(line):
+    # "banner motd ^C text ^C" - the delimiter is the first token after the banner type
+    parts = line.split(None, 2)
+    if len(parts) < 3:
+        return None
+    text = parts[2]
+    return "^C" if text.startswith("^C") else text[0]
+
+
+def split_sections(config: str) -> dict:
+    """
+    Splits an IOS config into top-level sections.
+
+    A section is a top-level line plus every indented line under it, keyed
+    by the top-level line, e.g. "interface FastEthernet0/0" or
+    "router ospf 1". Bare "!" separators are dropped and multi-line banners
+    are kept together. Repeated top-level lines get a "#n" suffix so every
+    key is unique.
+
+    Args:
+        config: IOS configuration text
+
+    Returns:
+        Ordered dictionary of section key to list of lines.
+    """
+    sections = {}
+    lines = iter(config.splitlines())
+    current = None
+
+    for line in lines:
+        if not line.strip() or line.strip() == "!":
+            current = None
+            continue
+
+        if line[0] in " \t" and current is not None:
+            current.append(line)
+            continue
+
+        key = line.rstrip()
+        count = 1
+        while key in sections:
+            count += 1
+            key = f"{line.rstrip()} #{count}"
+
+        current = [line]
+        sections[key] = current
+
+        if line.startswith("banner "):
+            delim = _banner_delimiter(line)
+            body = line.split(delim, 1)[1] if delim and delim in line else ""
+            if delim and delim not in body:
+                for banner_line in lines:
+                    current.append(banner_line)
+                    if delim in banner_line:
+                        break
+            current = None
+
+    return sections
+
+
+def _section_hunk(key, old, new):
+    out = [f"@@ {key} @@\n"]
+    matcher = difflib.SequenceMatcher(None, old, new, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            out.extend(f" {line}\n" for line in old[i1:i2])
+            continue
+        out.extend(f"-{line}\n" for line in old[i1:i2])
+        out.extend(f"+{line}\n" for line in new[j1:j2])
+    return out
+
+
+def diff_configs(old: str, new: str, fromfile: str = "old", tofile: str = "new",
+                 old_digest: str = None) -> str:
+    """
+    Diffs two IOS configs section by section.
+
+    Identical configs are detected by hash and return immediately. Otherwise
+    both configs are split into sections, sections are matched by key, and
+    only sections whose lines differ are diffed. Removed sections are shown
+    where they sat in the old config.
+
+    Args:
+        old: baseline config text
+        new: current config text
+        fromfile: label for the baseline
+        tofile: label for the current config
+        old_digest: SHA-256 of old if already known, saves hashing it again
+
+    Returns:
+        Unified-diff style text with one "@@ <section> @@" hunk per changed
+        section, or an empty string if the configs are identical.
+    """
+    if (old_digest or digest(old)) == digest(new):
+        return ""
+
+    old_sections = split_sections(old)
+    new_sections = split_sections(new)
+
+    out = []
+    old_keys = list(old_sections)
+    old_index = {key: i for i, key in enumerate(old_keys)}
+    old_pos = 0
+
+    for key, new_lines in new_sections.items():
+        old_lines = old_sections.get(key)
+
+        if old_lines is not None:
+            # Emit sections removed between the previous match and this one
+            idx = old_index[key]
+            for removed in old_keys[old_pos:idx]:
+                if removed not in new_sections:
+                    out.extend(_section_hunk(removed, old_sections[removed], []))
+            old_pos = max(old_pos, idx + 1)
+
+            if old_lines != new_lines:
+                out.extend(_section_hunk(key, old_lines, new_lines))
+        else:
+            out.extend(_section_hunk(key, [], new_lines))
+
+    for removed in old_keys[old_pos:]:
+        if removed not in new_sections:
+            out.extend(_section_hunk(removed, old_sections[removed], []))
+
+    if not out:
+        # Only whitespace or "!" separators changed
+        return ""
+
+    return "".join([f"--- {fromfile}\n", f"+++ {tofile}\n"] + out)
@@ -1,35 +1,174 @@
-import subprocess
-from subprocess import CalledProcessError, TimeoutExpired
+import asyncio
+import ipaddress
+import re
+import resource
 
+# Upper bound on ping subprocesses in flight during a sweep, enough for a
+# /22 in one timeout window. The soft open-file limit is raised to fit.
+MAX_CONCURRENCY = 1024
 
-def check_reachability(hosts: list) -> dict:
+# File descriptors a probe holds while in flight (pipe, child watcher), and
+# how many to leave for everything else in the process
+FDS_PER_PROBE = 3
+RESERVED_FDS = 64
+
+_RTT_RE = re.compile(r"= [\d.]+/([\d.]+)/[\d.]+")
+_LOSS_RE = re.compile(r"(\d+) packets transmitted, (\d+) received")
+
+
+def expand_hosts(targets: list) -> list:
+    """
+    Expands CIDR prefixes in a list of targets into their host addresses.
+
+    Args:
+        targets: hosts or prefixes, e.g. ["10.0.0.1", "10.0.4.0/22"]
+
+    Returns:
+        List of hosts with duplicates removed, in input order.
+    """
+    hosts = {}
+    for target in targets:
+        if "/" in target:
+            net = ipaddress.ip_network(target, strict=False)
+            for addr in (net.hosts() if net.num_addresses > 1 else [net.network_address]):
+                hosts[str(addr)] = None
+        else:
+            hosts[target] = None
+    return list(hosts)
+
+
+def raise_fd_limit(concurrency=MAX_CONCURRENCY):
+    """
+    Raise the soft open-file limit so concurrency probes fit, without going
+    past the hard limit.
+
+    Returns:
+        The number of probes that fit in the limit now in force.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = concurrency * FDS_PER_PROBE + RESERVED_FDS
+
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        new = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (new, hard))
+            soft = new
+        except (ValueError, OSError) as e:
+            print("could not raise the open file limit:", e)
+
+    if soft == resource.RLIM_INFINITY:
+        return concurrency
+    return max(1, min(concurrency, (soft - RESERVED_FDS) // FDS_PER_PROBE))
+
+
+async def _probe(host, count, timeout, sem):
+    deadline = timeout + (count - 1) * 0.2
+    result = {'reachable': False, 'rtt_ms': None, 'loss': 1.0, 'error': None}
+
+    async with sem:
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                "ping", "-n", "-q", "-c", str(count), "-i", "0.2",
+                "-W", str(timeout), "-w", str(int(deadline + 0.999)), host,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.DEVNULL,
+            )
+        except OSError as e:
+            # Not the host's fault (no ping binary, out of file descriptors),
+            # so it is neither reachable nor unreachable
+            result.update(reachable=None, loss=None, error=str(e))
+            return host, result
+
+        try:
+            stdout, _ = await asyncio.wait_for(proc.communicate(), deadline + 1)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            return host, result
+
+    output = stdout.decode(errors="replace")
+
+    loss = _LOSS_RE.search(output)
+    if loss:
+        sent, received = int(loss.group(1)), int(loss.group(2))
+        result['loss'] = 1 - received / sent if sent else 1.0
+        result['reachable'] = received > 0
+
+    rtt = _RTT_RE.search(output)
+    if rtt:
+        result['rtt_ms'] = float(rtt.group(1))
+
+    return host, result
+
+
+async def _sweep(hosts, count, timeout, concurrency, on_result):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def probe(host):
+        host, result = await _probe(host, count, timeout, sem)
+        if on_result is not None:
+            on_result(host, result)
+        return host, result
+
+    results = await asyncio.gather(*(probe(h) for h in hosts))
+    return dict(results)
+
+
+def sweep(targets: list, count: int = 1, timeout: int = 2,
+          concurrency: int = MAX_CONCURRENCY, on_result=None) -> dict:
+    """
+    Pings many hosts concurrently.
+
+    Every host is probed by its own ping subprocess, with at most
+    `concurrency` of them in flight, so a sweep takes roughly one timeout
+    window as long as the host count does not exceed the concurrency limit.
+
+    Args:
+        targets: hosts or CIDR prefixes to probe
+        count: echo requests sent to each host
+        timeout: seconds to wait for a reply
+        concurrency: maximum number of probes in flight, lowered if the
+            open-file limit can't be raised to fit it
+        on_result: called with (host, result) as each probe finishes, so
+            callers can start on a host before the slowest one answers
+
+    Returns:
+        Dictionary of host to {'reachable', 'rtt_ms', 'loss', 'error'}, where
+        rtt_ms is the average round-trip time (None if nothing came back) and
+        loss is the fraction of echo requests lost. If the probe could not be
+        started, reachable and loss are None and error says why.
+    """
+    hosts = expand_hosts(targets)
+    if not hosts:
+        return {}
+    concurrency = raise_fd_limit(max(1, min(concurrency, len(hosts))))
+    return asyncio.run(_sweep(hosts, count, timeout, concurrency, on_result))
+
+
+def check_reachability(hosts: list, on_result=None) -> dict:
     """
     Checks if hosts are reachable via ping.
 
     Args:
         hosts: a list of hosts to check
+        on_result: called with (host, reachable) as each host is checked
 
     Returns:
-        Dictionary of hosts reachable via ping.
+        Dictionary of hosts reachable via ping, None for hosts that could
+        not be probed.
     """
     results = {}
+    report = None
+    if on_result is not None:
+        def report(host, probe):
+            on_result(host, probe['reachable'])
 
-    for host in hosts:
-        try:
-            subprocess.run(
-                ["ping", "-c", "1", host],
-                check=True,
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-                timeout=2,
-            )
-            results[host] = True
-        except CalledProcessError:
-            results[host] = False
+    for host, probe in sweep(hosts, on_result=report).items():
+        results[host] = probe['reachable']
+        if probe['error']:
+            print(f'{host} could not be probed: {probe["error"]}')
+        elif not probe['reachable']:
             print(f'{host} unreachable')
-        except TimeoutExpired:
-            results[host] = False
-            print(f'{host} timed out')
 
     return results
 
@@ -42,4 +181,3 @@ if __name__ == '__main__':
         "198.51.100.3",
     ]
     print(check_reachability(hosts))
-
@@ -0,0 +1,205 @@
+import threading
+import time
+from collections import deque
+
+from tools import sessionpool, scheduler, metrics
+
+# Seconds between counter polls, and how much history each interface keeps
+INTERVAL = 2
+WINDOW = 30
+
+# Samples older than this many polls say nothing about the interface now
+MAX_AGE = 2 * INTERVAL
+
+# Below this many packets per second in each direction an interface is idle
+IDLE_PPS = 10
+
+PACKET_COUNTERS = {
+    'rx': ('rx_unicast_packets', 'rx_multicast_packets', 'rx_broadcast_packets'),
+    'tx': ('tx_unicast_packets', 'tx_multicast_packets', 'tx_broadcast_packets'),
+}
+OCTET_COUNTERS = {'rx': 'rx_octets', 'tx': 'tx_octets'}
+
+
+def counter_delta(prev, cur):
+    """Difference between two counter readings, allowing for 32- or 64-bit wrap"""
+    if cur >= prev:
+        return cur - prev
+    # A 32-bit counter can't have been above 2**32, assume it wrapped there
+    width = 2 ** 32 if prev < 2 ** 32 else 2 ** 64
+    return cur + width - prev
+
+
+class CounterSampler:
+    """
+    Polls get_interfaces_counters() on a set of devices in the background and
+    keeps a sliding window of samples per interface, so rate and idle checks
+    are answered from data already collected.
+    """
+
+    def __init__(self, interval=INTERVAL, window=WINDOW, max_age=MAX_AGE):
+        self.interval = interval
+        self.window = window
+        self.max_age = max_age
+        self._targets = {}   # host -> (device, set of interfaces or None for all)
+        self._series = {}    # (host, interface) -> deque of (ts, counters)
+        self._lock = threading.Lock()
+        self._updated = threading.Condition(self._lock)
+        self._thread = None
+        self._stop = threading.Event()
+
+    def watch(self, device, interfaces=None):
+        """
+        Start sampling a device.
+
+        Args:
+            device: dict with host, username and password
+            interfaces: interface names to keep, None for all of them
+        """
+        with self._lock:
+            current = self._targets.get(device['host'])
+            if current and current[1] is not None and interfaces is not None:
+                interfaces = current[1] | set(interfaces)
+            elif current and current[1] is None:
+                interfaces = None
+            self._targets[device['host']] = (device, set(interfaces) if interfaces else None)
+
+            if self._thread is None:
+                # Each polling thread gets its own event, so a stop() racing
+                # with a new watch() can't leave the old thread running
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._loop, args=(self._stop,), daemon=True)
+                self._thread.start()
+
+    def unwatch(self, host, interfaces=None):
+        """
+        Stop sampling some interfaces of a device, or the whole device, and
+        drop their history. Polling stops once nothing is watched.
+        """
+        with self._lock:
+            current = self._targets.get(host)
+            if current is None:
+                return
+            device, watched = current
+            if interfaces is not None and watched is not None and set(watched) - set(interfaces):
+                self._targets[host] = (device, watched - set(interfaces))
+            else:
+                interfaces = None
+                del self._targets[host]
+
+            for key in [key for key in self._series
+                        if key[0] == host and (interfaces is None or key[1] in interfaces)]:
+                del self._series[key]
+
+    def stop(self, timeout=None):
+        """Stop polling every device, waiting up to timeout for a poll in progress"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stop.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout)
+
+    def _loop(self, stop):
+        while not stop.is_set():
+            start = time.monotonic()
+            self.poll()
+            with self._lock:
+                if not self._targets and self._thread is threading.current_thread():
+                    self._thread = None
+                    return
+            stop.wait(max(0, self.interval - (time.monotonic() - start)))
+
+    def poll(self):
+        """Take one sample of every watched device, in parallel"""
+        with self._lock:
+            targets = list(self._targets.values())
+
+        futures = [scheduler.submit(device['host'], self._poll_device, device, interfaces,
+                                    priority=scheduler.BULK, retries=0)
+                   for device, interfaces in targets]
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print("failed to poll interface counters", e)
+
+    def _poll_device(self, device, interfaces):
+        with sessionpool.session(device['host'], device['username'], device['password']) as dev:
+            with metrics.span('interface_counters', device['host']):
+                counters = dev.get_interfaces_counters()
+        ts = time.monotonic()
+
+        maxlen = int(self.window / self.interval) + 1
+        with self._lock:
+            if device['host'] not in self._targets:
+                return
+            for name, values in counters.items():
+                if interfaces is not None and name not in interfaces:
+                    continue
+                series = self._series.setdefault((device['host'], name), deque(maxlen=maxlen))
+                series.append((ts, values))
+            self._updated.notify_all()
+
+    def samples(self, host, interface):
+        with self._lock:
+            return list(self._series.get((host, interface), ()))
+
+    def wait_for_samples(self, host, interface, count=2, timeout=None, since=None):
+        """
+        Block until an interface has at least count samples, the newest taken
+        after since (a time.monotonic() value) if given. Returns False on timeout.
+        """
+        timeout = self.interval * (count + 1) + 30 if timeout is None else timeout
+
+        def ready():
+            series = self._series.get((host, interface), ())
+            return len(series) >= count and (since is None or series[-1][0] >= since)
+
+        with self._lock:
+            return self._updated.wait_for(ready, timeout)
+
+    def rates(self, host, interface, window=None):
+        """
+        Packet and bit rates of an interface over the last `window` seconds
+        (the whole history by default).
+
+        Returns:
+            Dict of rx_pps, tx_pps, rx_bps, tx_bps and the seconds covered,
+            or None if fewer than two samples are available or the newest
+            is older than max_age, e.g. because polling the device fails.
+        """
+        samples = self.samples(host, interface)
+        now = time.monotonic()
+        if not samples or now - samples[-1][0] > self.max_age:
+            return None
+        if window is not None:
+            samples = [s for s in samples if s[0] >= now - window]
+        if len(samples) < 2:
+            return None
+
+        totals = {'rx_packets': 0, 'tx_packets': 0, 'rx_octets': 0, 'tx_octets': 0}
+        for (_, prev), (_, cur) in zip(samples, samples[1:]):
+            for direction in ('rx', 'tx'):
+                totals[f'{direction}_packets'] += sum(
+                    counter_delta(prev.get(c, 0), cur.get(c, 0)) for c in PACKET_COUNTERS[direction])
+                octets = OCTET_COUNTERS[direction]
+                totals[f'{direction}_octets'] += counter_delta(prev.get(octets, 0), cur.get(octets, 0))
+
+        elapsed = samples[-1][0] - samples[0][0]
+        return {
+            'rx_pps': totals['rx_packets'] / elapsed,
+            'tx_pps': totals['tx_packets'] / elapsed,
+            'rx_bps': totals['rx_octets'] * 8 / elapsed,
+            'tx_bps': totals['tx_octets'] * 8 / elapsed,
+            'seconds': elapsed,
+        }
+
+    def is_idle(self, host, interface, pps=IDLE_PPS, window=None):
+        """True/False if the interface is below pps both ways, None if there's no recent data"""
+        rates = self.rates(host, interface, window)
+        if rates is None:
+            return None
+        return rates['rx_pps'] < pps and rates['tx_pps'] < pps
+
+
+sampler = CounterSampler()
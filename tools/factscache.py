@@ -0,0 +1,146 @@
+import atexit
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Seconds cached facts stay valid
+TTL = 3600
+
+# Minimum seconds between writes of a persisted cache, the rest wait for flush()
+SAVE_INTERVAL = 5
+
+# "hostname R1" at the top level of an IOS config
+HOSTNAME_RE = re.compile(r"^hostname (\S+)", re.MULTILINE)
+
+
+def hostname_from_config(config):
+    """The hostname set by a config text, None if it doesn't set one"""
+    match = HOSTNAME_RE.search(config or "")
+    return match.group(1) if match else None
+
+
+class FactsCache:
+    """
+    get_facts() results keyed by management IP.
+
+    Entries expire after ttl seconds. A config read that shows a different
+    hostname, or a change about to be committed that sets one, replaces the
+    cached hostname and drops the other facts. Pass a path to keep the
+    cache across runs; it is written at most every SAVE_INTERVAL seconds
+    and on exit.
+    """
+
+    def __init__(self, ttl=TTL, path=None):
+        self.ttl = ttl
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        self._facts = {}  # host -> (fetched, facts, complete), fetched is wall-clock time
+        self._loaded = False
+        self._dirty = False
+        self._saved = 0
+        if self.path is not None:
+            atexit.register(self.flush)
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if self.path is None or not self.path.is_file():
+            return
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError) as e:
+            print("failed to load facts cache", e)
+            return
+        self._facts = {host: (entry['fetched'], entry['facts'], entry.get('complete', True))
+                       for host, entry in data.items()}
+
+    def _save(self, force=False):
+        if self.path is None:
+            return
+        if not force and time.time() - self._saved < SAVE_INTERVAL:
+            self._dirty = True
+            return
+
+        data = {host: {'fetched': fetched, 'facts': facts, 'complete': complete}
+                for host, (fetched, facts, complete) in self._facts.items()}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', dir=self.path.parent, delete=False) as tmp:
+            json.dump(data, tmp)
+        os.replace(tmp.name, self.path)
+        self._dirty = False
+        self._saved = time.time()
+
+    def flush(self):
+        with self._lock:
+            if self._dirty:
+                self._save(force=True)
+
+    def get(self, host, complete=True):
+        """
+        Cached facts for a device, None if missing or expired. With
+        complete=False a hostname-only entry from note_config() will do.
+        """
+        with self._lock:
+            self._load()
+            entry = self._facts.get(host)
+        if entry is None or time.time() - entry[0] > self.ttl or (complete and not entry[2]):
+            return None
+        return entry[1]
+
+    def put(self, host, facts, complete=True):
+        with self._lock:
+            self._load()
+            self._facts[host] = (time.time(), dict(facts), complete)
+            self._save()
+
+    def invalidate(self, host):
+        with self._lock:
+            self._load()
+            if self._facts.pop(host, None) is not None:
+                self._save()
+
+    def facts(self, host, device):
+        """Cached facts, or a fresh get_facts() from the open device"""
+        facts = self.get(host)
+        if facts is None:
+            facts = device.get_facts()
+            self.put(host, facts)
+        return facts
+
+    def note_config(self, host, config):
+        """
+        Reconcile the cache with a config read from, or about to be
+        committed to, a device. Returns the hostname the config sets, if any.
+        """
+        hostname = hostname_from_config(config)
+        if hostname is None:
+            return None
+
+        cached = self.get(host, complete=False)
+        if cached is None or cached.get('hostname') != hostname:
+            # The other facts (fqdn, etc.) may have changed with it
+            self.put(host, {'hostname': hostname}, complete=False)
+        return hostname
+
+    def hostname(self, host, device, running_config=None):
+        """
+        A device's hostname without a get_facts() round-trip when possible:
+        from the running config if one was already read, else the cache.
+        """
+        if running_config is not None:
+            hostname = self.note_config(host, running_config)
+            if hostname:
+                return hostname
+
+        cached = self.get(host, complete=False)
+        if cached is not None:
+            return cached['hostname']
+        return self.facts(host, device)['hostname']
+
+
+cache = FactsCache()
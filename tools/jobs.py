@@ -0,0 +1,163 @@
+import contextvars
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+# Jobs running at once, further submissions queue behind them
+MAX_WORKERS = 8
+
+# Finished jobs kept around for status queries before the oldest are dropped
+MAX_FINISHED_JOBS = 200
+
+
+class Job:
+    """A unit of long-running work and the progress events it has emitted."""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+        self.events = []
+        self._cond = threading.Condition()
+
+    @property
+    def done(self):
+        return self.status in ('done', 'failed')
+
+    def emit(self, device=None, status=None, **detail):
+        """Records a progress event and wakes any event stream readers."""
+        with self._cond:
+            self.events.append({
+                'seq': len(self.events),
+                'ts': time.time(),
+                'device': device,
+                'status': status,
+                **detail,
+            })
+            self._cond.notify_all()
+
+    def _finish(self, status, result=None, error=None):
+        with self._cond:
+            self.status = status
+            self.result = result
+            self.error = error
+            self.finished = time.time()
+            self._cond.notify_all()
+
+    def wait_events(self, since, timeout):
+        """Blocks until events past `since` exist or the job ends, then returns them."""
+        with self._cond:
+            self._cond.wait_for(lambda: len(self.events) > since or self.done, timeout)
+            return self.events[since:]
+
+    def to_dict(self, include_result=True):
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created': self.created,
+            'started': self.started,
+            'finished': self.finished,
+            'progress': self.events[-1] if self.events else None,
+            'error': self.error,
+        }
+        if include_result:
+            data['result'] = self.result
+        return data
+
+
+class JobManager:
+    """
+    Runs long device operations on a bounded executor.
+
+    Work functions are called with a `progress` keyword argument, a callable
+    taking (device, status, **detail), which they use to report per-device
+    progress.
+    """
+
+    def __init__(self, max_workers=MAX_WORKERS, max_finished=MAX_FINISHED_JOBS):
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn, *args, **kwargs):
+        """Queues fn(*args, progress=..., **kwargs) and returns its Job."""
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+
+        # Carry the submitting request's context (e.g. its trace) into the job
+        context = contextvars.copy_context()
+        self._executor.submit(context.run, self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job, fn, args, kwargs):
+        job.status = 'running'
+        job.started = time.time()
+        job.emit(status='started')
+
+        try:
+            result = fn(*args, progress=job.emit, **kwargs)
+        except Exception as e:
+            job.emit(status='failed', error=str(e))
+            job._finish('failed', error=str(e))
+        else:
+            job.emit(status='done')
+            job._finish('done', result=result)
+
+    def _prune(self):
+        finished = [job for job in self._jobs.values() if job.done]
+        for job in sorted(finished, key=lambda j: j.finished)[:-self.max_finished or None]:
+            del self._jobs[job.id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return sorted(self._jobs.values(), key=lambda j: j.created, reverse=True)
+
+    def stream(self, job_id, since=0, heartbeat=15):
+        """
+        Yields a job's progress as Server-Sent Events until it finishes.
+
+        Args:
+            job_id: job to follow
+            since: number of events the client has already seen
+            heartbeat: seconds between keep-alive comments while idle
+        """
+        job = self.get(job_id)
+        if job is None:
+            return
+
+        seq = since
+        while True:
+            events = job.wait_events(seq, heartbeat)
+            for event in events:
+                yield f"id: {event['seq']}\nevent: progress\ndata: {json.dumps(event, default=str)}\n\n"
+            seq += len(events)
+
+            if job.done and seq >= len(job.events):
+                yield f"event: end\ndata: {json.dumps(job.to_dict(), default=str)}\n\n"
+                return
+            if not events:
+                yield ": keep-alive\n\n"
+
+
+def report(progress, device, status, **detail):
+    """Calls a progress callback if one was given."""
+    if progress is not None:
+        progress(device, status, **detail)
+
+
+manager = JobManager()
@@ -0,0 +1,179 @@
+import bisect
+import contextvars
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Histogram bucket bounds in seconds, from a fast CLI read to a slow commit
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Request traces kept for /traces/<id> before the oldest are dropped
+MAX_TRACES = 100
+
+STAGE_SECONDS = 'device_stage_seconds'
+STAGE_ERRORS = 'device_stage_errors_total'
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+               for _, v in items)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(items, escaped)) + "}"
+
+
+class Registry:
+    """
+    Process-wide histograms, counters and gauges, rendered in the
+    Prometheus text exposition format.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = OrderedDict()  # name -> (type, help, {labels: value})
+
+    def _series(self, name, kind, help, labels):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = (kind, help or name, {})
+        return metric[2], tuple(sorted(labels.items()))
+
+    def observe(self, name, value, help=None, **labels):
+        with self._lock:
+            series, key = self._series(name, 'histogram', help, labels)
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    def inc(self, name, value=1, help=None, **labels):
+        with self._lock:
+            series, key = self._series(name, 'counter', help, labels)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, help=None, **labels):
+        with self._lock:
+            series, key = self._series(name, 'gauge', help, labels)
+            series[key] = value
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (kind, help, series) in self._metrics.items():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in series.items():
+                    if kind != 'histogram':
+                        lines.append(f"{name}{_labels(labels)} {value}")
+                        continue
+
+                    cumulative = 0
+                    for bound, count in zip(value.buckets + ('+Inf',), value.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels, ('le', bound))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {value.sum}")
+                    lines.append(f"{name}_count{_labels(labels)} {value.count}")
+        return "\n".join(lines) + "\n"
+
+
+class Trace:
+    """The spans recorded while serving one request, including work it handed off"""
+
+    def __init__(self, name):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.started = time.time()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, span):
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self):
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s['start'])
+        return {'id': self.id, 'name': self.name, 'started': self.started, 'spans': spans}
+
+
+registry = Registry()
+
+# Trace of the request being served, carried into scheduler and job threads
+# by the contexts they copy
+_current = contextvars.ContextVar('trace', default=None)
+_traces = OrderedDict()
+_traces_lock = threading.Lock()
+
+
+def begin_trace(name):
+    """Start collecting spans for the current context. Returns the trace and a reset token."""
+    trace = Trace(name)
+    with _traces_lock:
+        _traces[trace.id] = trace
+        while len(_traces) > MAX_TRACES:
+            _traces.popitem(last=False)
+    return trace, _current.set(trace)
+
+
+def end_trace(token):
+    _current.reset(token)
+
+
+def get_trace(trace_id):
+    with _traces_lock:
+        return _traces.get(trace_id)
+
+
+@contextmanager
+def span(stage, device=None):
+    """
+    Time one stage of a device operation.
+
+    The duration goes into the device_stage_seconds histogram, labelled by
+    stage only so the series count doesn't grow with the fleet, and into
+    the current request trace, if any, along with the device.
+    """
+    start = time.time()
+    begin = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = str(e)
+        raise
+    finally:
+        elapsed = time.perf_counter() - begin
+        registry.observe(STAGE_SECONDS, elapsed, "Time spent in each stage of a device operation",
+                         stage=stage)
+        if error is not None:
+            registry.inc(STAGE_ERRORS, 1, "Device operation stages that raised", stage=stage)
+
+        trace = _current.get()
+        if trace is not None:
+            trace.add({
+                'stage': stage,
+                'device': device,
+                'start': start,
+                'duration': round(elapsed, 6),
+                'thread': threading.current_thread().name,
+                'error': error,
+            })
+
+
+def render():
+    return registry.render()
@@ -0,0 +1,235 @@
+import math
+import re
+import subprocess
+import threading
+import time
+from array import array
+
+from tools import connectivity, sessionpool
+
+# Probes kept per sampler, about 17 minutes at 5 probes a second
+RING_CAPACITY = 5000
+
+# Echo requests per remote "ping ... repeat N timeout T" burst. IOS only
+# answers at the end of a burst, so this bounds how stale the ring gets and
+# how long a remote sampler keeps its session after stop().
+BURST_SIZE = 10
+
+# Seconds an echo may take before it counts as lost
+PROBE_TIMEOUT = 1
+
+# Seconds between local echo requests (iputils' unprivileged minimum is 0.2)
+LOCAL_INTERVAL = 0.2
+
+# Seconds stop() waits for the sampling thread before returning the summary
+# of what it has so far. The thread finishes its current burst on its own.
+STOP_TIMEOUT = 2
+
+# "[1700000000.123456] 64 bytes from 30.0.0.1: icmp_seq=1 ttl=64 time=0.045 ms"
+LOCAL_REPLY_RE = re.compile(r"^\[(\d+\.\d+)\].*icmp_seq=(\d+).*time=([\d.]+) ms")
+# "[1700000000.123456] no answer yet for icmp_seq=2"
+LOCAL_LOST_RE = re.compile(r"^\[(\d+\.\d+)\] no answer yet for icmp_seq=(\d+)")
+
+# IOS ping result characters, "!" is a reply, anything else a failed probe
+IOS_PROBE_RE = re.compile(r"^[!.UQMA?&]+$")
+IOS_RTT_RE = re.compile(r"min/avg/max = \d+/(\d+)/\d+")
+
+
+class ProbeRing:
+    """
+    Fixed-size ring buffer of probe results.
+
+    Timestamps and RTTs are kept in two flat arrays, with NaN marking a lost
+    probe, so a long sampling run costs 12 bytes per probe and no Python
+    objects.
+    """
+
+    def __init__(self, capacity=RING_CAPACITY):
+        self.capacity = capacity
+        self._ts = array('d', bytes(8 * capacity))
+        self._rtt = array('f', bytes(4 * capacity))
+        self._head = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def append(self, ts, rtt_ms=None):
+        """Record a probe sent at ts, rtt_ms is None if it was lost"""
+        with self._lock:
+            self._ts[self._head] = ts
+            self._rtt[self._head] = math.nan if rtt_ms is None else rtt_ms
+            self._head = (self._head + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def samples(self):
+        """Returns [(ts, rtt_ms or None)] oldest first"""
+        with self._lock:
+            start = (self._head - self._count) % self.capacity
+            idx = [(start + i) % self.capacity for i in range(self._count)]
+            return [(self._ts[i], None if math.isnan(self._rtt[i]) else self._rtt[i]) for i in idx]
+
+    def outages(self):
+        """
+        Returns every run of lost probes as a dict with the time of the first
+        lost probe (start), of the first reply after it (end, None if still
+        down), the duration and the number of probes lost.
+        """
+        outages = []
+        current = None
+
+        for ts, rtt in self.samples():
+            if rtt is None:
+                if current is None:
+                    current = {'start': ts, 'end': None, 'duration': None, 'lost': 0}
+                current['lost'] += 1
+            elif current is not None:
+                current['end'] = ts
+                current['duration'] = round(ts - current['start'], 3)
+                outages.append(current)
+                current = None
+
+        if current is not None:
+            outages.append(current)
+
+        return outages
+
+    def summary(self):
+        """Probe counts, loss and the longest outage seen"""
+        samples = self.samples()
+        lost = sum(1 for _, rtt in samples if rtt is None)
+        rtts = sorted(rtt for _, rtt in samples if rtt is not None)
+        outages = self.outages()
+        longest = max(outages, key=lambda o: o['duration'] or math.inf, default=None)
+
+        return {
+            'probes': len(samples),
+            'lost': lost,
+            'loss': round(lost / len(samples), 4) if samples else None,
+            'rtt_avg': round(sum(rtts) / len(rtts), 3) if rtts else None,
+            'rtt_max': rtts[-1] if rtts else None,
+            'outages': outages,
+            'outage': longest,
+        }
+
+
+class _Sampler:
+    def __init__(self, target, capacity=RING_CAPACITY):
+        self.target = target
+        self.ring = ProbeRing(capacity)
+        self._stop = threading.Event()
+        self._thread = None
+        self.error = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._guarded_run, daemon=True)
+        self._thread.start()
+        return self
+
+    def _guarded_run(self):
+        try:
+            self._run()
+        except Exception as e:
+            self.error = str(e)
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return dict(self.ring.summary(), mode=self.mode, target=self.target, error=self.error)
+
+
+class LocalPingSampler(_Sampler):
+    """Probes the target from this host with one long-running ping process"""
+
+    mode = 'local'
+
+    def __init__(self, target, interval=LOCAL_INTERVAL, timeout=PROBE_TIMEOUT, capacity=RING_CAPACITY):
+        super().__init__(target, capacity)
+        self.interval = interval
+        self.timeout = timeout
+
+    def _run(self):
+        # -D timestamps every line, -O reports each unanswered probe
+        proc = subprocess.Popen(
+            ["ping", "-n", "-D", "-O", "-i", str(self.interval), "-W", str(self.timeout), self.target],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        )
+        threading.Thread(target=lambda: (self._stop.wait(), proc.terminate()), daemon=True).start()
+
+        for line in proc.stdout:
+            reply = LOCAL_REPLY_RE.match(line)
+            if reply:
+                # Reply lines are stamped on arrival, back-date to when the probe was sent
+                rtt = float(reply.group(3))
+                self.ring.append(float(reply.group(1)) - rtt / 1000, rtt)
+                continue
+
+            lost = LOCAL_LOST_RE.match(line)
+            if lost:
+                self.ring.append(float(lost.group(1)) - self.interval, None)
+
+        proc.wait()
+
+
+class RemotePingSampler(_Sampler):
+    """
+    Probes the target from a router with back-to-back
+    "ping <target> repeat N timeout T" bursts over a pooled session.
+
+    IOS only returns a burst's results when it ends, so each probe's send
+    time is reconstructed by spreading the burst's measured wall time over
+    its probes: a reply takes about the average RTT, a loss the full
+    timeout.
+    """
+
+    mode = 'remote'
+
+    def __init__(self, device, target, burst=BURST_SIZE, timeout=PROBE_TIMEOUT, capacity=RING_CAPACITY):
+        super().__init__(target, capacity)
+        self.device = device
+        self.burst = burst
+        self.timeout = timeout
+
+    def _run(self):
+        cmd = f"ping {self.target} repeat {self.burst} timeout {self.timeout}"
+
+        with sessionpool.session(
+            self.device['host'],
+            self.device['username'],
+            self.device['password'],
+            optional_args={'read_timeout_override': self.burst * self.timeout * 2 + 30}
+        ) as device:
+            while not self._stop.is_set():
+                start = time.time()
+                output = device.cli([cmd])[cmd]
+                end = time.time()
+                self._record(output, start, end)
+
+    def _record(self, output, start, end):
+        probes = "".join(line.strip() for line in output.splitlines()
+                         if IOS_PROBE_RE.match(line.strip()))
+        if not probes:
+            return
+
+        rtt = IOS_RTT_RE.search(output)
+        rtt_ms = float(rtt.group(1)) if rtt else 1.0
+
+        # IOS rounds to whole milliseconds, an average of 0 means under 1 ms
+        weights = [max(rtt_ms, 1.0) / 1000 if p == "!" else self.timeout for p in probes]
+        scale = (end - start) / sum(weights)
+
+        ts = start
+        for probe, weight in zip(probes, weights):
+            self.ring.append(ts, rtt_ms if probe == "!" else None)
+            ts += weight * scale
+
+
+def sampler_for(device, target, timeout=PROBE_TIMEOUT, capacity=RING_CAPACITY):
+    """A local sampler if this host can reach the target, otherwise one running on device"""
+    if connectivity.sweep([target])[target]['reachable']:
+        return LocalPingSampler(target, timeout=timeout, capacity=capacity)
+    return RemotePingSampler(device, target, timeout=timeout, capacity=capacity)
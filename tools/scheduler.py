@@ -0,0 +1,247 @@
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from tools import sessionpool
+
+# Priority classes, lower runs first
+INTERACTIVE = 0
+BULK = 1
+
+# Hard cap on device tasks running at once across the whole process
+MAX_CONCURRENCY = 64
+
+# The adaptive limit never drops below this
+MIN_CONCURRENCY = 4
+
+# Tasks running at once against one device, matches the session pool
+PER_DEVICE_LIMIT = sessionpool.MAX_SESSIONS_PER_DEVICE
+
+# Retries for transient SSH errors, with exponential backoff in seconds
+RETRIES = 3
+BACKOFF = 1.0
+MAX_BACKOFF = 30.0
+
+# Back off when a task type runs this many times slower than its best average
+LATENCY_TOLERANCE = 2.0
+
+# Exception class names and message fragments that are worth retrying,
+# e.g. Netmiko's "Pattern not detected: 'R1\#' in output"
+TRANSIENT_ERRORS = (
+    'NetmikoTimeoutException', 'ReadTimeout', 'SSHException', 'TimeoutError',
+    'timeout', 'ConnectionResetError', 'ConnectionAbortedError', 'EOFError',
+)
+TRANSIENT_MESSAGES = (
+    'Pattern not detected', 'timed out', 'Timed-out', 'Connection reset',
+    'Socket is closed', 'No existing session', 'Error reading SSH protocol banner',
+)
+
+
+def is_transient(exc):
+    """True if an exception looks like a transient SSH or timeout failure"""
+    names = {cls.__name__ for cls in type(exc).__mro__}
+    if names.intersection(TRANSIENT_ERRORS):
+        return True
+    message = str(exc)
+    return any(fragment in message for fragment in TRANSIENT_MESSAGES)
+
+
+class _Task:
+    __slots__ = ('key', 'fn', 'args', 'kwargs', 'priority', 'retries', 'attempt', 'future', 'name',
+                 'context')
+
+    def __init__(self, key, fn, args, kwargs, priority, retries):
+        self.key = key
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.retries = retries
+        self.attempt = 0
+        self.future = Future()
+        self.name = getattr(fn, '__qualname__', repr(fn))
+        # Run in the submitter's context so request traces follow the task
+        self.context = contextvars.copy_context()
+
+
+class DeviceScheduler:
+    """
+    Single queue for every task that talks to a device.
+
+    Tasks are dispatched by priority class, then submission order, subject to
+    a global concurrency limit and a per-device limit. Transient failures are
+    retried with jittered exponential backoff without holding a worker. The
+    global limit adapts AIMD-style: it creeps up while each task type runs
+    near its best observed latency and is cut back when devices slow down or
+    fail transiently.
+    """
+
+    def __init__(self, max_concurrency=MAX_CONCURRENCY, min_concurrency=MIN_CONCURRENCY,
+                 per_device=PER_DEVICE_LIMIT, retries=RETRIES, backoff=BACKOFF,
+                 max_backoff=MAX_BACKOFF):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min(min_concurrency, max_concurrency)
+        self.per_device = per_device
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.limit = float(max(self.min_concurrency, max_concurrency // 2))
+
+        self._cond = threading.Condition()
+        self._ready = []     # heap of (priority, seq, task)
+        self._delayed = []   # heap of (ready_at, seq, task)
+        self._seq = itertools.count()
+        self._active = 0
+        self._device_active = defaultdict(int)
+        self._ewma = {}      # task name -> smoothed latency
+        self._best = {}      # task name -> lowest smoothed latency seen
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="device")
+        self._dispatcher = None
+
+    def submit(self, key, fn, *args, priority=INTERACTIVE, retries=None, **kwargs):
+        """
+        Queue fn(*args, **kwargs) to run against a device.
+
+        Args:
+            key: device the task talks to, usually its management IP
+            fn: callable to run, should raise on failure
+            priority: INTERACTIVE or BULK
+            retries: transient-error retries, defaults to the scheduler's
+
+        Returns:
+            A concurrent.futures.Future for the result.
+        """
+        task = _Task(key, fn, args, kwargs, priority,
+                     self.retries if retries is None else retries)
+        with self._cond:
+            heapq.heappush(self._ready, (priority, next(self._seq), task))
+            self._start_dispatcher()
+            self._cond.notify_all()
+        return task.future
+
+    def submit_all(self, key, fn, items, priority=INTERACTIVE, retries=None):
+        """Submit fn(item) for every item, keyed by key(item). Returns futures in order."""
+        return [self.submit(key(item), fn, item, priority=priority, retries=retries)
+                for item in items]
+
+    def stats(self):
+        with self._cond:
+            return {
+                'limit': round(self.limit, 2),
+                'active': self._active,
+                'queued': len(self._ready),
+                'retrying': len(self._delayed),
+            }
+
+    def _start_dispatcher(self):
+        if self._dispatcher is None:
+            self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+            self._dispatcher.start()
+
+    def _next_runnable(self):
+        if self._active >= int(self.limit):
+            return None
+
+        skipped = []
+        task = None
+        while self._ready:
+            entry = heapq.heappop(self._ready)
+            if entry[2].future.cancelled():
+                continue
+            if self._device_active[entry[2].key] < self.per_device:
+                task = entry[2]
+                break
+            skipped.append(entry)
+
+        for entry in skipped:
+            heapq.heappush(self._ready, entry)
+        return task
+
+    def _dispatch(self):
+        while True:
+            with self._cond:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, seq, task = heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (task.priority, seq, task))
+
+                task = self._next_runnable()
+                if task is None:
+                    timeout = self._delayed[0][0] - now if self._delayed else None
+                    self._cond.wait(timeout)
+                    continue
+
+                self._active += 1
+                self._device_active[task.key] += 1
+
+            if task.attempt == 0 and not task.future.set_running_or_notify_cancel():
+                self._finish(task)
+                continue
+            self._executor.submit(self._run, task)
+
+    def _run(self, task):
+        start = time.monotonic()
+        try:
+            result = task.context.run(task.fn, *task.args, **task.kwargs)
+        except BaseException as e:
+            transient = is_transient(e)
+            self._finish(task, time.monotonic() - start, ok=False, transient=transient)
+
+            if transient and task.attempt < task.retries:
+                delay = min(self.max_backoff, self.backoff * 2 ** task.attempt)
+                delay *= random.uniform(0.5, 1.0)
+                task.attempt += 1
+                with self._cond:
+                    heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), task))
+                    self._cond.notify_all()
+            else:
+                task.future.set_exception(e)
+        else:
+            self._finish(task, time.monotonic() - start, ok=True)
+            task.future.set_result(result)
+
+    def _finish(self, task, elapsed=None, ok=False, transient=False):
+        with self._cond:
+            self._active -= 1
+            self._device_active[task.key] -= 1
+            if not self._device_active[task.key]:
+                del self._device_active[task.key]
+
+            if elapsed is not None:
+                self._adapt(task.name, elapsed, ok, transient)
+            self._cond.notify_all()
+
+    def _adapt(self, name, elapsed, ok, transient):
+        if transient:
+            self.limit = max(self.min_concurrency, self.limit * 0.75)
+            return
+        if not ok:
+            return
+
+        ewma = self._ewma.get(name)
+        ewma = elapsed if ewma is None else 0.8 * ewma + 0.2 * elapsed
+        self._ewma[name] = ewma
+        best = self._best[name] = min(self._best.get(name, ewma), ewma)
+
+        if ewma > LATENCY_TOLERANCE * best:
+            self.limit = max(self.min_concurrency, self.limit * 0.9)
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+
+scheduler = DeviceScheduler()
+
+
+def submit(key, fn, *args, priority=INTERACTIVE, retries=None, **kwargs):
+    """Queue a device task on the shared scheduler."""
+    return scheduler.submit(key, fn, *args, priority=priority, retries=retries, **kwargs)
+
+
+def submit_all(key, fn, items, priority=INTERACTIVE, retries=None):
+    """Queue fn(item) for every item on the shared scheduler."""
+    return scheduler.submit_all(key, fn, items, priority=priority, retries=retries)
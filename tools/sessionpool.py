@@ -0,0 +1,248 @@
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+
+import napalm
+
+from tools import metrics
+
+# NAPALM driver used for every pooled session
+DRIVER = "ios"
+
+# Idle sessions are closed after this many seconds, well inside the IOS
+# default exec-timeout of 10 minutes
+IDLE_TIMEOUT = 300
+
+# SSH keepalive interval handed to Netmiko, and how often the reaper runs
+KEEPALIVE_INTERVAL = 30
+
+# Maximum number of concurrent sessions to a single device (IOS has 5 vty lines)
+MAX_SESSIONS_PER_DEVICE = 2
+
+
+class SessionPool:
+    """
+    Process-wide pool of open NAPALM sessions.
+
+    Sessions are keyed by management IP, credentials and driver optional
+    arguments. A leased session is used by exactly one thread at a time and
+    is handed back to the pool when released, so later operations against
+    the same device skip the SSH handshake and prompt detection.
+    """
+
+    def __init__(self, driver=DRIVER, idle_timeout=IDLE_TIMEOUT,
+                 keepalive_interval=KEEPALIVE_INTERVAL,
+                 max_per_device=MAX_SESSIONS_PER_DEVICE):
+        self.driver = driver
+        self.idle_timeout = idle_timeout
+        self.keepalive_interval = keepalive_interval
+        self.max_per_device = max_per_device
+
+        self._lock = threading.Lock()
+        self._idle = {}     # key -> list of (device, last_used)
+        self._limits = {}   # host -> BoundedSemaphore
+        self._leased = {}   # id(device) -> key
+        self._reaper = None
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _key(host, username, password, optional_args):
+        return (host, username, password, tuple(sorted((optional_args or {}).items())))
+
+    def _limit(self, key):
+        # Slots are per device, whatever credentials or driver arguments a session uses
+        host = key[0]
+        with self._lock:
+            sem = self._limits.get(host)
+            if sem is None:
+                sem = threading.BoundedSemaphore(self.max_per_device)
+                self._limits[host] = sem
+            return sem
+
+    def _open(self, key):
+        host, username, password, optional_args = key
+        args = {'keepalive': self.keepalive_interval}
+        args.update(dict(optional_args))
+
+        driver = napalm.get_network_driver(self.driver)
+        device = driver(
+            hostname=host,
+            username=username,
+            password=password,
+            optional_args=args,
+        )
+        with metrics.span('connect', host):
+            device.open()
+        return device
+
+    @staticmethod
+    def _healthy(device):
+        try:
+            return device.is_alive().get('is_alive', False)
+        except Exception:
+            return False
+
+    @staticmethod
+    def _close(device):
+        try:
+            device.close()
+        except Exception:
+            pass
+
+    def _checkout(self, key):
+        """Pop a healthy idle session for key, closing any dead ones found."""
+        while True:
+            with self._lock:
+                idle = self._idle.get(key)
+                if not idle:
+                    return None
+                device, _ = idle.pop()
+
+            if self._healthy(device):
+                return device
+            self._close(device)
+
+    def acquire(self, host, username, password, optional_args=None, timeout=None):
+        """
+        Lease a session to a device, opening a new one if none is idle.
+
+        Args:
+            host: management IP of the device
+            username: SSH username
+            password: SSH password
+            optional_args: extra NAPALM driver arguments
+            timeout: seconds to wait for a free slot on the device
+
+        Returns:
+            An open NAPALM device, which must be handed back with release().
+        """
+        key = self._key(host, username, password, optional_args)
+        sem = self._limit(key)
+        acquired = sem.acquire() if timeout is None else sem.acquire(timeout=timeout)
+        if not acquired:
+            raise TimeoutError(f"No free session slot for {host}")
+
+        try:
+            device = self._checkout(key) or self._open(key)
+        except Exception:
+            sem.release()
+            raise
+
+        with self._lock:
+            self._leased[id(device)] = key
+        self._start_reaper()
+        return device
+
+    def release(self, device, discard=False):
+        """Return a leased session to the pool, or close it if discard is set."""
+        with self._lock:
+            key = self._leased.pop(id(device), None)
+        if key is None:
+            return
+
+        if discard or not self._healthy(device):
+            self._close(device)
+        else:
+            with self._lock:
+                self._idle.setdefault(key, []).append((device, time.monotonic()))
+
+        self._limit(key).release()
+
+    def warm(self, host, username, password, optional_args=None):
+        """
+        Open a session and park it idle, so the next acquire() for the device
+        skips the handshake. Does nothing if one is already idle.
+        """
+        key = self._key(host, username, password, optional_args)
+        with self._lock:
+            if self._idle.get(key):
+                return False
+
+        device = self.acquire(host, username, password, optional_args)
+        self.release(device)
+        return True
+
+    @contextmanager
+    def session(self, host, username, password, optional_args=None, timeout=None):
+        """Context manager that leases a session and always releases it."""
+        device = self.acquire(host, username, password, optional_args, timeout)
+        try:
+            yield device
+        except Exception:
+            # The channel may be left mid-command, don't hand it to someone else
+            self.release(device, discard=True)
+            raise
+        else:
+            self.release(device)
+
+    def evict_idle(self):
+        """Close sessions idle for longer than idle_timeout or no longer alive."""
+        now = time.monotonic()
+        stale = []
+
+        with self._lock:
+            for key, idle in self._idle.items():
+                keep = []
+                for device, last_used in idle:
+                    if now - last_used > self.idle_timeout:
+                        stale.append(device)
+                    else:
+                        keep.append((device, last_used))
+                self._idle[key] = keep
+            snapshot = [(key, list(idle)) for key, idle in self._idle.items()]
+
+        for device in stale:
+            self._close(device)
+
+        # Health check the survivors outside the lock
+        for key, idle in snapshot:
+            for device, last_used in idle:
+                if self._healthy(device):
+                    continue
+                with self._lock:
+                    entries = self._idle.get(key, [])
+                    if (device, last_used) in entries:
+                        entries.remove((device, last_used))
+                    else:
+                        continue
+                self._close(device)
+
+    def close_all(self):
+        """Close every idle session and stop the reaper."""
+        self._stop.set()
+        with self._lock:
+            idle = [device for entries in self._idle.values() for device, _ in entries]
+            self._idle.clear()
+        for device in idle:
+            self._close(device)
+
+    def stats(self):
+        """Number of idle and leased sessions in the pool."""
+        with self._lock:
+            return {
+                'idle': sum(len(entries) for entries in self._idle.values()),
+                'leased': len(self._leased),
+            }
+
+    def _start_reaper(self):
+        if self._reaper is not None:
+            return
+        with self._lock:
+            if self._reaper is not None:
+                return
+            self._reaper = threading.Thread(target=self._reap, daemon=True)
+        self._reaper.start()
+
+    def _reap(self):
+        while not self._stop.wait(self.keepalive_interval):
+            self.evict_idle()
+
+
+pool = SessionPool()
+atexit.register(pool.close_all)
+
+
+def session(host, username, password, optional_args=None, timeout=None):
+    """Lease a session from the shared pool."""
+    return pool.session(host, username, password, optional_args, timeout)
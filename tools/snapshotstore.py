@@ -0,0 +1,180 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Directory holding the snapshot index and compressed config objects
+SNAPSHOT_DIR = "configs"
+
+TS_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+
+class SnapshotStore:
+    """
+    Content-addressed store for running configurations.
+
+    Each distinct config is written once, gzip-compressed, under
+    objects/<sha256[:2]>/<sha256[2:]>.gz. Every poll only adds a
+    (device, timestamp, hash) row to the SQLite index, so polling an
+    unchanged fleet costs a few bytes per device.
+
+    The newest snapshot of each device is also kept in a `latest` table,
+    updated in the same transaction as the poll row, and mirrored in an
+    in-memory map loaded on first use, so latest() never scans history.
+    """
+
+    def __init__(self, root=SNAPSHOT_DIR):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.db_path = self.root / "snapshots.db"
+        self._init_lock = threading.Lock()
+        self._ready = False
+        self._latest_lock = threading.Lock()
+        self._latest = {}  # device -> (ts, hash)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _ensure(self):
+        if self._ready:
+            return
+        with self._init_lock:
+            if self._ready:
+                return
+
+            self.objects.mkdir(parents=True, exist_ok=True)
+            new_db = not self.db_path.exists()
+
+            with closing(self._connect()) as conn:
+                conn.execute('''CREATE TABLE IF NOT EXISTS snapshots
+                                (device TEXT NOT NULL,
+                                ts TEXT NOT NULL,
+                                hash TEXT NOT NULL)''')
+                conn.execute('''CREATE INDEX IF NOT EXISTS snapshots_device_ts
+                                ON snapshots (device, ts)''')
+                conn.execute('''CREATE TABLE IF NOT EXISTS latest
+                                (device TEXT PRIMARY KEY,
+                                ts TEXT NOT NULL,
+                                hash TEXT NOT NULL)''')
+                # Backfill stores created before the latest table existed
+                if conn.execute('SELECT 1 FROM latest LIMIT 1').fetchone() is None:
+                    conn.execute('''INSERT INTO latest
+                                    SELECT device, MAX(ts), hash FROM snapshots GROUP BY device''')
+                conn.commit()
+
+                rows = conn.execute('SELECT device, ts, hash FROM latest').fetchall()
+
+            with self._latest_lock:
+                self._latest = {device: (ts, digest) for device, ts, digest in rows}
+
+            # Only publish the store once legacy files are in it, otherwise a
+            # caller that skips the lock could read an empty history
+            if new_db:
+                self.import_legacy()
+
+            self._ready = True
+
+    @staticmethod
+    def digest(config: str) -> str:
+        return hashlib.sha256(config.encode()).hexdigest()
+
+    def _object_path(self, digest):
+        return self.objects / digest[:2] / f"{digest[2:]}.gz"
+
+    def _write_object(self, digest, config):
+        path = self._object_path(digest)
+        if path.exists():
+            return
+
+        path.parent.mkdir(exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial object
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(gzip.compress(config.encode()))
+            os.replace(tmp, path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+    def put(self, device: str, config: str, ts: str = None) -> tuple:
+        """
+        Records a snapshot of a device's running config.
+
+        Args:
+            device: device hostname
+            config: running configuration text
+            ts: ISO8601 UTC timestamp, defaults to now
+
+        Returns:
+            Tuple of (timestamp, hash) for the recorded snapshot.
+        """
+        self._ensure()
+        return self._put(device, config, ts)
+
+    def _put(self, device, config, ts=None):
+        ts = ts or datetime.now(timezone.utc).strftime(TS_FORMAT)
+        digest = self.digest(config)
+        self._write_object(digest, config)
+
+        with closing(self._connect()) as conn:
+            conn.execute('INSERT INTO snapshots VALUES (?, ?, ?)', (device, ts, digest))
+            conn.execute('''INSERT INTO latest VALUES (?, ?, ?)
+                            ON CONFLICT (device) DO UPDATE SET ts = excluded.ts, hash = excluded.hash
+                            WHERE excluded.ts >= latest.ts''', (device, ts, digest))
+            conn.commit()
+
+        with self._latest_lock:
+            current = self._latest.get(device)
+            if current is None or ts >= current[0]:
+                self._latest[device] = (ts, digest)
+
+        return ts, digest
+
+    def get(self, digest: str) -> str:
+        """Returns the config text stored under a hash."""
+        with open(self._object_path(digest), "rb") as f:
+            return gzip.decompress(f.read()).decode()
+
+    def latest(self, device: str):
+        """Returns (timestamp, hash) of the newest snapshot for a device, or None."""
+        self._ensure()
+
+        with self._latest_lock:
+            latest = self._latest.get(device)
+        if latest is not None:
+            return latest
+
+        # Another process may have polled this device since we loaded the map
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT ts, hash FROM latest WHERE device = ?', (device,)).fetchone()
+        if row is None:
+            return None
+
+        with self._latest_lock:
+            self._latest.setdefault(device, tuple(row))
+            return self._latest[device]
+
+    def history(self, device: str) -> list:
+        """Returns every (timestamp, hash) recorded for a device, oldest first."""
+        self._ensure()
+
+        with closing(self._connect()) as conn:
+            rows = conn.execute('''SELECT ts, hash FROM snapshots WHERE device = ?
+                                   ORDER BY ts''', (device,)).fetchall()
+
+        return [tuple(row) for row in rows]
+
+    def import_legacy(self):
+        """Imports <hostname>_<timestamp>.txt files written by older versions."""
+        for path in sorted(self.root.glob("*_*.txt")):
+            device, _, ts = path.stem.rpartition("_")
+            self._put(device, path.read_text(), ts)
+
+
+store = SnapshotStore()
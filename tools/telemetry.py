@@ -0,0 +1,375 @@
+import heapq
+import json
+import math
+import mmap
+import os
+import tempfile
+import threading
+import time
+from array import array
+from pathlib import Path
+
+from tools import connectivity, countersampler, factscache, scheduler, sessionpool, sshInfo
+
+# Seconds per slot and slots kept, one day at one-minute resolution
+INTERVAL = 60
+SLOTS = 1440
+
+# Series the data file has room for before it is grown
+CAPACITY = 4096
+
+INTERFACE_METRICS = (
+    'rx_octets', 'tx_octets',
+    'rx_unicast_packets', 'tx_unicast_packets',
+    'rx_errors', 'tx_errors',
+    'rx_discards', 'tx_discards',
+)
+
+# Device-wide series are stored under this interface name
+DEVICE = ''
+
+NAN = math.nan
+
+
+def percentile(values, q):
+    """q-th percentile (0-100) of values by linear interpolation, None if empty"""
+    values = sorted(v for v in values if not math.isnan(v))
+    if not values:
+        return None
+    pos = (len(values) - 1) * q / 100
+    low = math.floor(pos)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (pos - low)
+
+
+class TelemetryStore:
+    """
+    Fixed-interval time series for every (device, interface, metric).
+
+    Samples live in one memory-mapped file of doubles laid out slot-major:
+    each slot is a row holding the slot's start time followed by one column
+    per series, so a polling round writes one contiguous row and fleet-wide
+    queries read whole rows instead of touching per-series objects. Rows are
+    reused round-robin; a row whose start time doesn't match the slot asked
+    for is stale and reads as missing. Missing samples are NaN.
+    """
+
+    def __init__(self, root="telemetry", interval=INTERVAL, slots=SLOTS, capacity=CAPACITY):
+        self.root = Path(root)
+        self.data_path = self.root / "series.dat"
+        self.meta_path = self.root / "meta.json"
+        self.interval = interval
+        self.slots = slots
+        self.capacity = capacity
+        self._series = []   # column -> (device, interface, metric)
+        self._index = {}    # (device, interface, metric) -> column
+        self._lock = threading.RLock()
+        self._mm = None
+        self._mv = None
+
+    # -- storage ----------------------------------------------------------
+
+    def _ensure(self):
+        if self._mm is not None:
+            return
+
+        self.root.mkdir(parents=True, exist_ok=True)
+        if self.meta_path.is_file() and self.data_path.is_file():
+            meta = json.loads(self.meta_path.read_text())
+            self.interval = meta['interval']
+            self.slots = meta['slots']
+            self.capacity = meta['capacity']
+            self._series = [tuple(key) for key in meta['series']]
+            self._index = {key: col for col, key in enumerate(self._series)}
+        else:
+            with open(self.data_path, 'wb') as f:
+                f.truncate(self._row_size() * self.slots * 8)
+            self._save_meta()
+
+        self._map()
+
+    def _row_size(self):
+        return self.capacity + 1
+
+    def _map(self):
+        with open(self.data_path, 'r+b') as f:
+            self._mm = mmap.mmap(f.fileno(), 0)
+        self._mv = memoryview(self._mm).cast('d')
+
+    def _unmap(self):
+        if self._mm is not None:
+            self._mv.release()
+            self._mm.close()
+            self._mv = self._mm = None
+
+    def _save_meta(self):
+        meta = {
+            'interval': self.interval,
+            'slots': self.slots,
+            'capacity': self.capacity,
+            'series': self._series,
+        }
+        with tempfile.NamedTemporaryFile('w', dir=self.root, delete=False) as tmp:
+            json.dump(meta, tmp)
+        os.replace(tmp.name, self.meta_path)
+
+    def _grow(self, capacity):
+        """Rewrite the data file with room for `capacity` series"""
+        old_row = self._row_size()
+        self._mm.flush()
+        self._unmap()
+
+        new_path = self.data_path.with_suffix(".tmp")
+        padding = array('d', [NAN]) * (capacity - self.capacity)
+        with open(self.data_path, 'rb') as old, open(new_path, 'wb') as new:
+            for _ in range(self.slots):
+                new.write(old.read(old_row * 8))
+                padding.tofile(new)
+        os.replace(new_path, self.data_path)
+
+        self.capacity = capacity
+        self._save_meta()
+        self._map()
+
+    def close(self):
+        with self._lock:
+            if self._mm is not None:
+                self._mm.flush()
+            self._unmap()
+
+    # -- slots --------------------------------------------------------------
+
+    def slot_start(self, ts):
+        return ts // self.interval * self.interval
+
+    def _row(self, start):
+        """Offset of the row for the slot starting at start"""
+        return int(start // self.interval) % self.slots * self._row_size()
+
+    def _read_row(self, start, columns=None):
+        """Values of a slot as a list, all NaN if the row holds another slot"""
+        base = self._row(start)
+        if self._mv[base] != start:
+            return [NAN] * (len(self._series) if columns is None else len(columns))
+        row = self._mv[base + 1:base + 1 + len(self._series)].tolist()
+        return row if columns is None else [row[col] for col in columns]
+
+    def latest(self):
+        """Start time of the newest slot written, None if empty"""
+        with self._lock:
+            self._ensure()
+            starts = self._mv[::self._row_size()].tolist()
+            latest = max(starts)
+            return latest if latest > 0 else None
+
+    # -- writing -----------------------------------------------------------
+
+    def _add_series(self, keys):
+        """Assign columns to series not seen before, growing the file if needed"""
+        new = [key for key in dict.fromkeys(keys) if key not in self._index]
+        if not new:
+            return
+
+        capacity = self.capacity
+        while len(self._series) + len(new) > capacity:
+            capacity *= 2
+        if capacity != self.capacity:
+            self._grow(capacity)
+
+        for key in new:
+            self._index[key] = len(self._series)
+            self._series.append(key)
+        self._save_meta()
+
+    def record(self, ts, samples):
+        """
+        Store one polling round.
+
+        Args:
+            ts: time the samples were taken
+            samples: {(device, interface, metric): value}
+        """
+        with self._lock:
+            self._ensure()
+            self._add_series(samples)
+            columns = [(self._index[key], value) for key, value in samples.items()]
+
+            start = self.slot_start(ts)
+            base = self._row(start)
+            if self._mv[base] != start:
+                # First write to this slot since it wrapped, clear the old round
+                self._mv[base + 1:base + self._row_size()] = array('d', [NAN]) * self.capacity
+                self._mv[base] = start
+
+            for col, value in columns:
+                self._mv[base + 1 + col] = NAN if value is None else float(value)
+
+    def flush(self):
+        with self._lock:
+            if self._mm is not None:
+                self._mm.flush()
+
+    # -- queries -------------------------------------------------------------
+
+    def series(self, metric=None, device=None):
+        """Keys of the stored series, optionally filtered"""
+        with self._lock:
+            self._ensure()
+            return [key for key in self._series
+                    if (metric is None or key[2] == metric) and (device is None or key[0] == device)]
+
+    def values(self, device, interface, metric, window=None):
+        """[(slot start, value)] for one series over the last `window` seconds, oldest first"""
+        with self._lock:
+            self._ensure()
+            col = self._index.get((device, interface, metric))
+            end = self.latest()
+            if col is None or end is None:
+                return []
+
+            count = self.slots if window is None else min(self.slots, int(window // self.interval) + 1)
+            points = []
+            for i in range(count - 1, -1, -1):
+                start = end - i * self.interval
+                base = self._row(start)
+                if self._mv[base] == start:
+                    points.append((start, self._mv[base + 1 + col]))
+            return points
+
+    def rates(self, metric, window=None, device=None):
+        """
+        Per-second rate of a counter metric for every series over the last
+        `window` seconds (one interval by default), handling counter wrap.
+
+        Returns:
+            {(device, interface): rate}, series without both samples left out.
+        """
+        window = max(window or self.interval, self.interval)
+        with self._lock:
+            self._ensure()
+            end = self.latest()
+            if end is None:
+                return {}
+            start = end - window // self.interval * self.interval
+
+            keys = [key for key in self._series
+                    if key[2] == metric and (device is None or key[0] == device)]
+            columns = [self._index[key] for key in keys]
+            first = self._read_row(start, columns)
+            last = self._read_row(end, columns)
+
+        elapsed = end - start
+        return {
+            key[:2]: countersampler.counter_delta(a, b) / elapsed
+            for key, a, b in zip(keys, first, last)
+            if elapsed and not (math.isnan(a) or math.isnan(b))
+        }
+
+    def top(self, metric, n=10, window=None):
+        """The n busiest (device, interface) pairs by rate of metric"""
+        rates = self.rates(metric, window)
+        return heapq.nlargest(n, rates.items(), key=lambda item: item[1])
+
+    def percentile(self, metric, q, window=None, device=None, interface=None):
+        """
+        q-th percentile of a metric's rate.
+
+        Across the fleet by default; for one series, across its per-slot
+        rates within the window.
+        """
+        if interface is None:
+            return percentile(self.rates(metric, window, device).values(), q)
+
+        points = self.values(device, interface, metric, window)
+        rates = [countersampler.counter_delta(a, b) / (tb - ta)
+                 for (ta, a), (tb, b) in zip(points, points[1:])
+                 if not (math.isnan(a) or math.isnan(b))]
+        return percentile(rates, q)
+
+
+class TelemetryCollector:
+    """
+    Polls every router in the inventory once per store interval: ping to the
+    management address, get_interfaces_counters() and uptime from
+    get_facts(), all written into a TelemetryStore.
+    """
+
+    def __init__(self, store, inventory="config/sshInfo.json"):
+        self.store = store
+        self.inventory = inventory
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.store.flush()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            start = time.time()
+            try:
+                self.poll()
+            except Exception as e:
+                print("telemetry poll failed", e)
+            # Wake at the start of the next slot
+            next_slot = self.store.slot_start(start) + self.store.interval
+            self._stop.wait(max(0, next_slot - time.time()))
+
+    def poll(self):
+        """Sample the whole fleet once and record it as one slot"""
+        ts = time.time()
+        devices = sshInfo.load_ssh_info(self.inventory)
+        hosts = [device['host'] for device in devices]
+
+        samples = {}
+        ping = connectivity.sweep(hosts)
+        for host in hosts:
+            samples[(host, DEVICE, 'rtt_ms')] = ping[host]['rtt_ms']
+            samples[(host, DEVICE, 'loss')] = ping[host]['loss']
+
+        reachable = [device for device in devices if ping[device['host']]['reachable']]
+        futures = scheduler.submit_all(lambda d: d['host'], _poll_device, reachable,
+                                       priority=scheduler.BULK, retries=0)
+        for device, future in zip(reachable, futures):
+            try:
+                samples.update(future.result())
+            except Exception as e:
+                print(f"{device['host']} telemetry error: {e}")
+
+        self.store.record(ts, samples)
+        return len(samples)
+
+
+def _poll_device(device):
+    with sessionpool.session(device['host'], device['username'], device['password']) as dev:
+        counters = dev.get_interfaces_counters()
+        facts = dev.get_facts()
+
+    host = device['host']
+    factscache.cache.put(host, facts)
+    samples = {(host, DEVICE, 'uptime'): facts.get('uptime')}
+    for name, values in counters.items():
+        for metric in INTERFACE_METRICS:
+            samples[(host, name, metric)] = values.get(metric)
+    return samples
+
+
+store = TelemetryStore()
+
+
+if __name__ == "__main__":
+    collector = TelemetryCollector(store).start()
+    try:
+        while True:
+            time.sleep(store.interval)
+            for (host, name), rate in store.top('rx_octets', 5):
+                print(f"{host} {name}: {rate * 8 / 1000:.1f} kbps")
+    except KeyboardInterrupt:
+        collector.stop()
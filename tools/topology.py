@@ -0,0 +1,231 @@
+import threading
+from collections import deque
+
+from tools import addressplan
+
+BACKBONE = 0
+
+
+def copy_config(config):
+    return dict(config, interfaces=[dict(iface) for iface in config.get('interfaces') or []])
+
+
+class Topology:
+    """
+    The OSPF topology implied by the stored router configs, without
+    touching a device.
+
+    Interfaces sharing a subnet form a link, and the routers on a link are
+    predicted to become adjacent if their ends are in the same area. Each
+    loopback is advertised in its router's first interface area (see
+    ospfconfig.render_ospf_config), so a router learns it intra-area if the
+    two are connected inside that area, or inter-area if both sides reach
+    the same backbone through an ABR.
+
+    Changing one router re-indexes only that router's links. Per-area
+    components are rebuilt on the next query, and only for the areas the
+    change touched.
+    """
+
+    def __init__(self, configs=()):
+        self._lock = threading.RLock()
+        self._configs = {}       # router -> config
+        self._links = {}         # (network, hostmask) -> {router: area}
+        self._router_links = {}  # router -> [(network, hostmask)]
+        self._components = {}    # area -> {router: component number}
+        self._dirty = set()      # areas whose components need rebuilding
+        self._backbone = {}      # (area, component) -> backbone components it reaches
+        self._origins = {}       # (loopback area, component) -> routers
+        for config in configs:
+            self.update(config)
+
+    def update(self, config):
+        """Add a router, or replace it after its row changed"""
+        with self._lock:
+            router = config['router']
+            self._remove(router)
+            self._configs[router] = copy_config(config)
+
+            keys = []
+            for iface in config.get('interfaces') or []:
+                ip, netmask = addressplan.to_int(iface['ip']), addressplan.to_int(iface['mask'])
+                if ip is None or netmask is None or not addressplan.valid_mask(netmask):
+                    continue
+                hostmask = netmask ^ addressplan.MAX_ADDRESS
+                key = (ip & ~hostmask, hostmask)
+                area = addressplan.area_id(iface['area'])
+                self._links.setdefault(key, {})[router] = area
+                self._dirty.add(area)
+                keys.append(key)
+            self._router_links[router] = keys
+
+    def remove(self, router):
+        with self._lock:
+            self._remove(router)
+
+    def _remove(self, router):
+        self._configs.pop(router, None)
+        for key in self._router_links.pop(router, ()):
+            members = self._links[key]
+            self._dirty.add(members.pop(router, None))
+            if not members:
+                del self._links[key]
+
+    def sync(self, configs):
+        """Bring the model in line with configs, re-indexing only the routers that changed"""
+        with self._lock:
+            routers = {config['router'] for config in configs}
+            for router in set(self._configs) - routers:
+                self._remove(router)
+            for config in configs:
+                if self._configs.get(config['router']) != config:
+                    self.update(config)
+
+    def routers(self):
+        with self._lock:
+            return sorted(self._configs)
+
+    def neighbors(self, router):
+        """Routers predicted to form an adjacency with router"""
+        with self._lock:
+            peers = set()
+            for key in self._router_links.get(router, ()):
+                members = self._links[key]
+                area = members[router]
+                peers.update(peer for peer, peer_area in members.items()
+                             if peer != router and peer_area == area)
+            return peers
+
+    def neighbor_ids(self, router):
+        """Router IDs router should see in "show ip ospf neighbor" """
+        with self._lock:
+            return {self._configs[peer]['router_id'] for peer in self.neighbors(router)}
+
+    def links(self):
+        """Subnets shared by more than one router"""
+        with self._lock:
+            return [{
+                'subnet': addressplan.prefix(*key),
+                'routers': sorted(members),
+                'areas': sorted({str(area) for area in members.values()}),
+                'adjacent': len(set(members.values())) == 1,
+            } for key, members in sorted(self._links.items()) if len(members) > 1]
+
+    def areas(self):
+        with self._lock:
+            areas = {}
+            for members in self._links.values():
+                for router, area in members.items():
+                    areas.setdefault(area, set()).add(router)
+            return {area: sorted(routers) for area, routers in areas.items() if area is not None}
+
+    def abrs(self):
+        """Routers with interfaces in the backbone and another area"""
+        areas = self.areas()
+        others = {router for area, routers in areas.items() if area != BACKBONE for router in routers}
+        return sorted(others & set(areas.get(BACKBONE, ())))
+
+    def _refresh(self):
+        if not self._dirty:
+            return
+
+        graphs = {area: {} for area in self._dirty}
+        for members in self._links.values():
+            for router, area in members.items():
+                if area in graphs:
+                    graphs[area].setdefault(router, set()).update(
+                        peer for peer, peer_area in members.items() if peer != router and peer_area == area)
+
+        for area, graph in graphs.items():
+            components = {}
+            for start in graph:
+                if start in components:
+                    continue
+                number = len(components)
+                components[start] = number
+                queue = deque([start])
+                while queue:
+                    for peer in graph[queue.popleft()]:
+                        if peer not in components:
+                            components[peer] = number
+                            queue.append(peer)
+            if components:
+                self._components[area] = components
+            else:
+                self._components.pop(area, None)
+        self._dirty.clear()
+
+        # Which backbone components each area component reaches through its ABRs
+        backbone = self._components.get(BACKBONE, {})
+        self._backbone = {}
+        for area, components in self._components.items():
+            for router, number in components.items():
+                reached = self._backbone.setdefault((area, number), set())
+                if router in backbone:
+                    reached.add(backbone[router])
+
+        self._origins = {}
+        for router, config in self._configs.items():
+            interfaces = config.get('interfaces')
+            area = addressplan.area_id(interfaces[0]['area']) if interfaces else None
+            number = self._components.get(area, {}).get(router)
+            if number is not None:
+                self._origins.setdefault((area, number), []).append(router)
+
+    def expected_routes(self, router):
+        """
+        The routers whose loopbacks router should learn, each mapped to
+        'intra' or 'inter' for the kind of route it should be.
+        """
+        with self._lock:
+            self._refresh()
+            mine = {area: components[router] for area, components in self._components.items()
+                    if router in components}
+            reached = set().union(*(self._backbone[area, number] for area, number in mine.items()))
+
+            routes = {}
+            for (area, number), members in self._origins.items():
+                if mine.get(area) == number:
+                    kind = 'intra'
+                elif self._backbone[area, number] & reached:
+                    kind = 'inter'
+                else:
+                    continue
+                routes.update((member, kind) for member in members if member != router)
+            return routes
+
+    def probe_pairs(self):
+        """
+        The (source, target) loopback pings that verify the predicted
+        routes: from the best connected router to every router it should
+        reach, then the same for any routers left over, instead of every
+        router to every other.
+        """
+        with self._lock:
+            abrs = set(self.abrs())
+            degree = {router: len(self.neighbors(router)) for router in self._configs}
+
+            remaining = set(self._configs)
+            pairs = []
+            while remaining:
+                root = max(sorted(remaining), key=lambda r: (r in abrs, degree[r]))
+                targets = sorted(set(self.expected_routes(root)) & remaining)
+                pairs.extend((root, target) for target in targets)
+                remaining -= {root, *targets}
+            return pairs
+
+    def to_dict(self):
+        with self._lock:
+            return {
+                'routers': self.routers(),
+                'areas': {str(area): routers for area, routers in sorted(self.areas().items())},
+                'abrs': self.abrs(),
+                'links': self.links(),
+                'adjacencies': {router: sorted(self.neighbors(router)) for router in self.routers()},
+                'routes': {router: dict(sorted(self.expected_routes(router).items()))
+                           for router in self.routers()},
+                'probe_pairs': self.probe_pairs(),
+            }
+
+
+model = Topology()